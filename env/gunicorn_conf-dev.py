@@ -60,3 +60,9 @@ def on_starting(server):
 
             atexit.register(lambda: scheduler.shutdown())
             atexit.register(lambda: task.delete())
+
+def post_worker_init(worker):
+    from searcch.importer.server.scheduler import get_import_scheduler
+
+    # Start this worker's import pool, and resume any queued imports.
+    get_import_scheduler()
@@ -2,18 +2,28 @@
 from __future__ import print_function
 import os
 import sys
+import time
 import logging
 import json
 import datetime
 import alembic
 import sqlalchemy
 import fileinput
+import collections
+import concurrent.futures
+from sqlalchemy.orm import sessionmaker
 
 from searcch.importer.util.config import find_configfile,get_config_parser
 from searcch.importer.util.log import configure_logging
 from searcch.importer.util.sql import object_from_json
-from searcch.importer.importer import (get_importer,get_importer_names,ImportSession)
+from searcch.importer.importer import (
+    get_importer,get_importer_names,canonical_url,find_artifact,ImportSession,
+    extract_all_batch,save_extraction_results)
 from searcch.importer.exporter import get_exporter
+from searcch.importer.extractor.registry import (
+    get_resource_dir,fetch_resources,check_resources)
+from searcch.importer.util.retrieve.cache import get_blob_cache
+from searcch.importer.util.httpcache import ResponseCache
 from searcch.importer.db import (get_db_session,get_db_engine)
 from searcch.importer.db.migration import (check_at_head,upgrade)
 from searcch.importer.util.applicable import (
@@ -22,7 +32,7 @@ from searcch.importer.util.applicable import (
     DefaultSubcommandArgumentParser)
 from searcch.importer.db.model import (
     Base,Artifact,Person,User,ArtifactTag,ArtifactMetadata,
-    ArtifactPublication,ArtifactCuration,License,
+    ArtifactPublication,ArtifactCuration,License,Importer,
     ArtifactRelationship,ExportedObject,
     CandidateArtifact,CandidateArtifactRelationship,
     ARTIFACT_RELATIONS)
@@ -243,10 +253,15 @@ class Client(object):
             raise ImporterInternalError("error while getting importer",exc_info=sys.exc_info())
         if not imp:
             raise ImporterNotFound("no importer can import %r" % (candidate.url,))
-        return imp.import_artifact(candidate)
+        ret = imp.import_artifact(candidate)
+        if isinstance(ret,Artifact):
+            ret.canonical_url = canonical_url(candidate.url,name=imp.name)
+        return ret
 
-    def artifact_import_post(self,artifact,fetch=True,remove=True,extract=True):
-        imp_session = ImportSession(self.config,self.session,artifact)
+    def artifact_import_post(self,artifact,fetch=True,remove=True,extract=True,
+                             defer_results=False):
+        imp_session = ImportSession(self.config,self.session,artifact,
+                                    defer_results=defer_results)
         if fetch:
             imp_session.retrieve_all()
         if extract:
@@ -254,22 +269,147 @@ class Client(object):
         if remove:
             imp_session.remove_all()
         imp_session.finalize()
-        artifact.set_import_session(artifact)
+        artifact.set_import_session(imp_session)
+
+    def artifact_import_post_batch(self,artifacts,fetch=True,remove=True,
+                                   extract=True):
+        """Like artifact_import_post, for several artifacts at once: keyword extraction runs over the documents of all of them as one batch (see extract_all_batch)."""
+        imp_sessions = [ImportSession(self.config,self.session,artifact)
+                        for artifact in artifacts]
+        if fetch:
+            for imp_session in imp_sessions:
+                imp_session.retrieve_all()
+        if extract:
+            extract_all_batch(imp_sessions)
+        for (artifact,imp_session) in zip(artifacts,imp_sessions):
+            if remove:
+                imp_session.remove_all()
+            imp_session.finalize()
+            artifact.set_import_session(imp_session)
 
     def artifact_import_one(self,candidate,importer=None,fetch=True,remove=True,
-                            extract=True):
+                            extract=True,defer_results=False):
         ret = self.artifact_import_core(candidate,importer=importer)
         if isinstance(ret,Artifact):
             self.artifact_import_post(
-                ret,fetch=fetch,remove=remove,extract=extract)
+                ret,fetch=fetch,remove=remove,extract=extract,
+                defer_results=defer_results)
+        return ret
+
+    def _follow_import_detached(self,bind,url,fetch=True,remove=True,
+                                extract=True):
+        """Imports the candidate at `url` in a private session, which only reads from the database: its objects are never flushed, and its extraction results are returned instead of saved.  Returns the (detached) Artifact, or None, and the results (see ImportSession.results).  Runs in a follow worker thread."""
+        session = sessionmaker(bind=bind)(autoflush=False)
+        try:
+            client = Client(self.options,self.config,session=session,
+                            logger=self.logger)
+            artifact = client.artifact_import_one(
+                CandidateArtifact(url=url),fetch=fetch,remove=remove,
+                extract=extract,defer_results=True)
+            results = dict()
+            if isinstance(artifact,Artifact):
+                results = artifact.import_session.results
+            return (artifact,results)
+        finally:
+            session.rollback()
+            session.close()
+
+    def _merge_detached(self,artifact):
+        """Merges an Artifact imported in another session into ours.  A new Importer, owner or License created by that session is replaced by an equivalent one we already have, since that session cannot see our uncommitted objects, and concurrent imports may each have created one."""
+        self.session.flush()
+        with self.session.no_autoflush:
+            ret = self.session.merge(artifact)
+            imp = ret.importer
+            if imp is not None and imp.id is None:
+                existing = self.session.query(Importer).\
+                    filter(Importer.name == imp.name).\
+                    filter(Importer.version == imp.version).\
+                    first()
+                if existing:
+                    ret.importer = existing
+                    self.session.expunge(imp)
+            owner = ret.owner
+            if owner is not None and owner.id is None and owner.person is not None:
+                existing = self.session.query(User).join(User.person).\
+                    filter(Person.name == owner.person.name).\
+                    filter(Person.email == owner.person.email).\
+                    first()
+                if existing:
+                    ret.owner = existing
+                    self.session.expunge(owner)
+                    if owner.person.id is None:
+                        self.session.expunge(owner.person)
+            license = ret.license
+            if license is not None and license.id is None:
+                existing = self.session.query(License).\
+                    filter(License.short_name == license.short_name).\
+                    first()
+                if existing:
+                    ret.license = existing
+                    self.session.expunge(license)
+        return ret
+
+    def _follow_import(self,todo,fetch=True,remove=True,extract=True):
+        """Imports each candidate in `todo` (a dict of url to a list of (artifact,candidate relationship)); returns a dict of url to Artifact.  With [importer] follow_workers > 1, candidates are imported concurrently, each in its own read-only session, and merged (with their extraction results) into ours (see _merge_detached); we do not commit, so that the caller commits the main artifact together with its followers.  Otherwise, with [extract] batch_artifacts > 1, candidates are retrieved and extracted in chunks of that many, with batched keyword extraction."""
+        ret = dict()
+        workers = min(len(todo),self.config["importer"].getint("follow_workers"))
+        if workers <= 1:
+            batch = self.config["extract"].getint("batch_artifacts")
+            if batch <= 1:
+                for (curl,refs) in todo.items():
+                    ret[curl] = self.artifact_import_one(
+                        refs[0][1].related_candidate,fetch=fetch,remove=remove,
+                        extract=extract)
+                return ret
+            # Import metadata for each chunk of candidates, then retrieve
+            # and extract the chunk together.
+            urls = list(todo.keys())
+            for i in range(0,len(urls),batch):
+                artifacts = []
+                for curl in urls[i:i + batch]:
+                    ret[curl] = self.artifact_import_core(
+                        todo[curl][0][1].related_candidate)
+                    if isinstance(ret[curl],Artifact):
+                        artifacts.append(ret[curl])
+                self.artifact_import_post_batch(
+                    artifacts,fetch=fetch,remove=remove,extract=extract)
+            return ret
+        bind = self.session.get_bind()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (curl,executor.submit(
+                    self._follow_import_detached,bind,curl,fetch=fetch,
+                    remove=remove,extract=extract))
+                for curl in todo]
+            for (curl,future) in futures:
+                (artifact,results) = future.result()
+                try:
+                    save_extraction_results(self.session,results)
+                except:
+                    self.logger.warning(
+                        "failed to save extraction results",exc_info=True)
+                if artifact is not None:
+                    ret[curl] = self._merge_detached(artifact)
         return ret
 
     def artifact_import_all(self,candidate,importer=None,fetch=True,remove=True,
-                            follow=True,extract=True,candidates=[]):
-        imported = dict()
+                            follow=True,extract=True,candidates=[],force=False):
+        if not force:
+            existing = find_artifact(self.session,candidate.url,name=importer or None)
+            if existing:
+                raise AlreadyImportedError("artifact",id=existing.id,url=candidate.url)
         ret = self.artifact_import_one(
             candidate,importer=importer,fetch=fetch,remove=remove,
             extract=extract)
+        return self._artifact_import_follow(
+            candidate,ret,fetch=fetch,remove=remove,follow=follow,
+            extract=extract,candidates=candidates,force=force)
+
+    def _artifact_import_follow(self,candidate,ret,fetch=True,remove=True,
+                                follow=True,extract=True,candidates=[],
+                                force=False,commit=True):
+        """Completes the import of `candidate`, whose artifact `ret` has been imported (see artifact_import_one): follows its related candidates (see artifact_import_all), and commits unless `commit` is False."""
+        imported = dict()
         if not ret:
             return None
         else:
@@ -284,35 +424,52 @@ class Client(object):
                                    owner=ret.owner)
             ret.candidate_relationships.append(
                 CandidateArtifactRelationship(relation=crelation,related_candidate=ca))
-        while follow and len(pending) > 0:
-            p = pending.pop(0)
-            for car in p.candidate_relationships:
-                if car.related_candidate.imported_artifact:
-                    continue
-                ca = car.related_candidate
-                curl = ca.url
-                if curl in imported:
-                    ca.imported_artifact = imported[curl]
-                    self.session.add(ca)
-                    ar = ArtifactRelationship(
-                        artifact=p,relation=car.relation,
-                        related_artifact=ca.imported_artifact)
-                    p.relationships.append(ar)
-                    continue
-                else:
-                    ret = self.artifact_import_one(
-                        ca,fetch=fetch,remove=remove,extract=extract)
-                    if not ret:
-                        self.logger.warn("failed to import candidate %r",ca)
+        depth = 0
+        max_depth = self.config["importer"].getint("follow_max_depth")
+        while follow and pending and (not max_depth or depth < max_depth):
+            depth += 1
+            # Link candidates we have already imported (or that already
+            # exist); collect the rest, once per URL.
+            todo = collections.OrderedDict()
+            for p in pending:
+                for car in p.candidate_relationships:
+                    if car.related_candidate.imported_artifact:
                         continue
-                    car.related_candidate.imported_artifact = ret
+                    ca = car.related_candidate
+                    curl = ca.url
+                    existing = imported.get(curl)
+                    if not existing and not force and not curl in todo:
+                        existing = find_artifact(self.session,curl)
+                        if existing:
+                            self.logger.info("candidate %r already imported as artifact %r" % (curl,existing.id))
+                    if existing:
+                        ca.imported_artifact = existing
+                        self.session.add(ca)
+                        ar = ArtifactRelationship(
+                            artifact=p,relation=car.relation,
+                            related_artifact=existing)
+                        p.relationships.append(ar)
+                        imported[curl] = existing
+                        continue
+                    todo.setdefault(curl,[]).append((p,car))
+            results = self._follow_import(
+                todo,fetch=fetch,remove=remove,extract=extract)
+            pending = []
+            for (curl,refs) in todo.items():
+                related = results.get(curl)
+                if not related:
+                    self.logger.warn("failed to import candidate %r",curl)
+                    continue
+                for (p,car) in refs:
+                    car.related_candidate.imported_artifact = related
                     self.session.add(car.related_candidate)
                     ar = ArtifactRelationship(
-                        relation=car.relation,related_artifact=ret)
+                        relation=car.relation,related_artifact=related)
                     p.relationships.append(ar)
-                    self.session.add(ret)
-                    imported[ret.url] = ret
-                    pending.append(ret)
+                self.session.add(related)
+                imported[curl] = related
+                imported[related.url] = related
+                pending.append(related)
         # If other artifacts had possible relationships to this candidate,
         # recast them as real ArtifactRelationships at this point.
         for car in candidate.candidate_artifact_relationships:
@@ -323,12 +480,17 @@ class Client(object):
         # Update the candidate to reflect the new import.
         candidate.imported_artifact = ret
         candidate.mtime = datetime.datetime.now()
-        self.session.commit()
+        if commit:
+            self.session.commit()
 
-        if len(imported) > 1:
-            return list(imported.values())
+        artifacts = []
+        for a in imported.values():
+            if not any(a is x for x in artifacts):
+                artifacts.append(a)
+        if len(artifacts) > 1:
+            return artifacts
         else:
-            return list(imported.values())[0]
+            return artifacts[0]
 
     def _parse_candidates(x):
         ret = []
@@ -352,10 +514,11 @@ class Client(object):
             dict(name="noremove",action="store_true",default=False),
             dict(name="nofollow",action="store_true",default=False),
             dict(name="noextract",action="store_true",default=False),
-            dict(name="candidates",type=_parse_candidates,default=[])])
+            dict(name="candidates",type=_parse_candidates,default=[]),
+            dict(name="force",action="store_true",default=False)])
     def artifact_import(self,url,importer="",sessionid=None,
                         nofetch=False,noremove=False,nofollow=False,
-                        noextract=False,candidates=[]):
+                        noextract=False,candidates=[],force=False):
         """
         Import an artifact from a URL.
 
@@ -366,11 +529,190 @@ class Client(object):
         :param noremove: do not remove downloaded artifact files
         :param nofollow: do not automatically follow suggested artifacts
         :param candidates: a semicolon-separated list of relation,url tuples that specifies a URL that is related to the main artifact
+        :param force: import the artifact even if an artifact with the same canonical URL already exists
         """
         return self.artifact_import_all(
             CandidateArtifact(url=url),importer=importer,
             fetch=not nofetch,remove=not noremove,follow=not nofollow,
-            extract=not noextract,candidates=candidates)
+            extract=not noextract,candidates=candidates,force=force)
+
+    def _batch_import_chunk(self,bind,urls,importer="",fetch=True,remove=True,
+                            follow=True,extract=True,force=False):
+        """Imports `urls` in one session, retrieving and extracting their artifacts together (see artifact_import_post_batch), and committing them together; returns a list of journal records.  If any import fails, the chunk is rolled back and each URL is imported on its own (see _batch_import_one).  Runs in a batch worker thread."""
+        if len(urls) == 1:
+            return [self._batch_import_one(
+                bind,urls[0],importer=importer,fetch=fetch,remove=remove,
+                follow=follow,extract=extract,force=force)]
+        session = sessionmaker(bind=bind)()
+        t = time.time()
+        recs = []
+        try:
+            client = Client(self.options,self.config,session=session,
+                            logger=self.logger)
+            imported = []
+            for url in urls:
+                candidate = CandidateArtifact(url=url)
+                existing = None
+                if not force:
+                    existing = find_artifact(session,url,name=importer or None)
+                if existing:
+                    recs.append(dict(url=url,status="exists",artifact_id=existing.id))
+                    continue
+                ret = client.artifact_import_core(candidate,importer=importer)
+                if not isinstance(ret,Artifact):
+                    raise ImporterInternalError("import produced no artifact")
+                imported.append((url,candidate,ret))
+            client.artifact_import_post_batch(
+                [x[2] for x in imported],fetch=fetch,remove=remove,
+                extract=extract)
+            for (url,candidate,artifact) in imported:
+                client._artifact_import_follow(
+                    candidate,artifact,fetch=fetch,remove=remove,
+                    follow=follow,extract=extract,force=force,commit=False)
+            session.commit()
+            for (url,candidate,artifact) in imported:
+                recs.append(dict(url=url,status="imported",artifact_id=artifact.id))
+        except Exception:
+            self.logger.debug("failed to import chunk %r; importing its URLs one at a time",
+                              urls,exc_info=True)
+            recs = None
+        finally:
+            session.rollback()
+            session.close()
+        if recs is None:
+            return [self._batch_import_one(
+                bind,url,importer=importer,fetch=fetch,remove=remove,
+                follow=follow,extract=extract,force=force)
+                    for url in urls]
+        now = datetime.datetime.now().isoformat()
+        elapsed = round((time.time() - t) / len(urls),3)
+        for rec in recs:
+            rec.update(time=now,elapsed=elapsed)
+        return recs
+
+    def _batch_import_one(self,bind,url,importer="",fetch=True,remove=True,
+                          follow=True,extract=True,force=False):
+        """Imports `url` in its own session; returns a journal record.  Runs in a batch worker thread."""
+        session = sessionmaker(bind=bind)()
+        t = time.time()
+        rec = dict(url=url)
+        try:
+            client = Client(self.options,self.config,session=session,
+                            logger=self.logger)
+            ret = client.artifact_import_all(
+                CandidateArtifact(url=url),importer=importer,fetch=fetch,
+                remove=remove,follow=follow,extract=extract,force=force)
+            if isinstance(ret,list):
+                ret = ret[0]
+            if ret is None:
+                rec.update(status="failed",error="import produced no artifact")
+            else:
+                rec.update(status="imported",artifact_id=ret.id)
+        except AlreadyImportedError as ex:
+            rec.update(status="exists",
+                       artifact_id=getattr(ex,"_kwargs",{}).get("id"))
+        except Exception as ex:
+            self.logger.debug("failed to import %r",url,exc_info=True)
+            rec.update(status="failed",error=str(ex) or repr(ex))
+        finally:
+            session.rollback()
+            session.close()
+        rec.update(time=datetime.datetime.now().isoformat(),
+                   elapsed=round(time.time() - t,3))
+        return rec
+
+    @ApplicableMethod(
+        alias="artifact.import_batch",
+        kwargs=[dict(name="workers",type=int,default=1),
+            dict(name="journal",type=str,default=None),
+            dict(name="nofetch",action="store_true",default=False),
+            dict(name="noremove",action="store_true",default=False),
+            dict(name="nofollow",action="store_true",default=False),
+            dict(name="noextract",action="store_true",default=False),
+            dict(name="force",action="store_true",default=False)])
+    def artifact_import_batch(self,path,importer="",workers=1,journal=None,
+                              nofetch=False,noremove=False,nofollow=False,
+                              noextract=False,force=False):
+        """
+        Import artifacts from a list of URLs, one per line, concurrently.
+
+        Each URL's outcome is appended to a journal (JSON lines); URLs the
+        journal records as imported (or already existing) are skipped, so an
+        interrupted batch may simply be rerun.  Progress, throughput and ETA
+        are printed to stderr.  With [extract] batch_artifacts > 1, each
+        worker imports that many URLs at a time, with batched keyword
+        extraction (see extract_all_batch).
+
+        :param path: a file containing URLs, one per line ('#' starts a comment); use '-' for stdin
+        :param importer: the name of a specific importer to use; or the empty string for automatic selection
+        :param workers: the number of URLs to import concurrently (1 with a SQLite database)
+        :param journal: the journal path (default <path>.journal, or <tmpdir>/import_batch.journal for stdin)
+        :param nofetch: do not download artifact files
+        :param noremove: do not remove downloaded artifact files
+        :param nofollow: do not automatically follow suggested artifacts
+        :param noextract: do not extract metadata from artifact content
+        :param force: import artifacts even if an artifact with the same canonical URL already exists
+        """
+        urls = []
+        with fileinput.input(files=(path,)) as f:
+            for line in f:
+                line = line.split("#",1)[0].strip()
+                if line and not line in urls:
+                    urls.append(line)
+        if not journal:
+            if path == "-":
+                journal = os.path.join(
+                    self.config["DEFAULT"]["tmpdir"],"import_batch.journal")
+            else:
+                journal = path + ".journal"
+        done = set()
+        if os.path.exists(journal):
+            with open(journal,"r") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("status") in ("imported","exists"):
+                        done.add(rec.get("url"))
+        todo = [url for url in urls if not url in done]
+        bind = self.session.get_bind()
+        # Each import holds its write transaction until it commits, and
+        # SQLite allows a single writer; concurrent imports would time out.
+        if workers > 1 and bind.dialect.name == "sqlite":
+            self.logger.warning(
+                "SQLite database does not support concurrent imports; using 1 worker")
+            workers = 1
+        summary = dict(total=len(urls),skipped=len(urls) - len(todo),
+                       imported=0,exists=0,failed=0,journal=journal)
+        self.logger.info("importing %d of %d URLs (%d already done) with %d workers",
+                         len(todo),len(urls),summary["skipped"],workers)
+
+        chunk = max(1,self.config["extract"].getint("batch_artifacts"))
+        start = time.time()
+        i = 0
+        with open(journal,"a") as jf, \
+          concurrent.futures.ThreadPoolExecutor(max_workers=max(1,workers)) as executor:
+            futures = [
+                executor.submit(
+                    self._batch_import_chunk,bind,todo[j:j + chunk],
+                    importer=importer,fetch=not nofetch,remove=not noremove,
+                    follow=not nofollow,extract=not noextract,force=force)
+                for j in range(0,len(todo),chunk)]
+            for future in concurrent.futures.as_completed(futures):
+                for rec in future.result():
+                    jf.write(json.dumps(rec) + "\n")
+                    jf.flush()
+                    summary[rec["status"]] += 1
+                    i += 1
+                    elapsed = time.time() - start
+                    rate = i / elapsed if elapsed > 0 else 0.0
+                    eta = (len(todo) - i) / rate if rate > 0 else 0.0
+                    print("[%d/%d] %s %s (%.2f URLs/min, ETA %dm%02ds)" % (
+                        i,len(todo),rec["status"],rec["url"],rate * 60,
+                        eta // 60,eta % 60),file=sys.stderr)
+        summary["elapsed"] = round(time.time() - start,3)
+        return summary
 
     @ApplicableMethod(
         alias="artifact.create",
@@ -870,9 +1212,11 @@ class Client(object):
         alias="candidate.import",formatter=pretty_print_record,
         kwargs=[dict(name="nofetch",action="store_true",default=False),
                 dict(name="noremove",action="store_true",default=False),
-                dict(name="nofollow",action="store_true",default=False)])
+                dict(name="nofollow",action="store_true",default=False),
+                dict(name="force",action="store_true",default=False)])
     def candidate_import(self,id,importer="",sessionid=None,
-                         nofetch=False,noremove=False,nofollow=False):
+                         nofetch=False,noremove=False,nofollow=False,
+                         force=False):
         """
         Import a candidate artifact that hasn't already been imported.
 
@@ -882,6 +1226,7 @@ class Client(object):
         :param nofetch: do not download artifact files
         :param noremove: do not remove downloaded artifact files
         :param nofollow: do not automatically follow suggested artifacts
+        :param force: import the candidate even if an artifact with the same canonical URL already exists
         """
         candidate = self.session.query(CandidateArtifact).\
           filter(CandidateArtifact.id == id).first()
@@ -890,4 +1235,71 @@ class Client(object):
         if candidate.imported_artifact:
             raise AlreadyImportedError("candidate artifact",id=id)
         return self.artifact_import_all(
-            candidate,fetch=not nofetch,remove=not noremove,follow=not nofollow)
+            candidate,fetch=not nofetch,remove=not noremove,follow=not nofollow,
+            force=force)
+
+    @ApplicableMethod(alias="cache.show")
+    def cache_show(self):
+        """
+        Show the retrieved file (blob) cache location, size, and contents summary.
+        """
+        cache = get_blob_cache(self.config)
+        if not cache:
+            raise ConfigError("retrieve cache disabled")
+        return json.dumps(cache.stats(),indent=2)
+
+    @ApplicableMethod(
+        alias="cache.prune",
+        kwargs=[dict(name="all",action="store_true",default=False)])
+    def cache_prune(self,max_size=None,all=False):
+        """
+        Evict least-recently-used files from the retrieved file (blob) cache, and least-recently-used responses from the HTTP response cache.
+
+        :param max_size: prune the blob cache until it is smaller than this many bytes (default: 90% of the configured cache_max_size); the HTTP cache is pruned to 90% of its max_size
+        :param all: remove everything, including files still linked into import sessions
+        """
+        cache = get_blob_cache(self.config)
+        http_cache = ResponseCache.from_config(dict(self.config["http_cache"]))
+        if not cache and not http_cache:
+            raise ConfigError("retrieve and http caches disabled")
+        ret = dict()
+        if cache:
+            (count,freed) = cache.prune(
+                target=int(max_size) if max_size is not None else None,all=all)
+            ret.update(removed=count,bytes_freed=freed)
+        if http_cache:
+            (count,freed) = http_cache.prune(all=all)
+            ret["http_cache"] = dict(removed=count,bytes_freed=freed)
+        return json.dumps(ret,indent=2)
+
+    @ApplicableMethod(
+        alias="resources.fetch",
+        kwargs=[dict(name="force",action="store_true",default=False)])
+    def resources_fetch(self,names=None,force=False):
+        """
+        Download the extractors' models and corpora into the resource directory, and record their checksums, so that imports load them without network access.
+
+        :param names: a comma-separated list of resources to fetch (default: all)
+        :param force: fetch resources even if they are already staged and verified
+        """
+        ret = fetch_resources(
+            self.config,names=names.split(",") if names else None,force=force)
+        failed = [name for (name,digest) in ret.items() if not digest]
+        if failed:
+            raise ResourceUnavailableError(
+                "failed to fetch resources: %s" % (", ".join(failed),))
+        return json.dumps(
+            dict(dir=get_resource_dir(self.config),resources=ret),indent=2)
+
+    @ApplicableMethod(alias="resources.check")
+    def resources_check(self,names=None):
+        """
+        Verify the checksums of the models and corpora in the resource directory.  Each resource is ok, missing, unverified (no recorded checksum), or mismatch.
+
+        :param names: a comma-separated list of resources to check (default: all)
+        """
+        return json.dumps(
+            dict(dir=get_resource_dir(self.config),
+                 resources=check_resources(
+                     self.config,names=names.split(",") if names else None)),
+            indent=2)
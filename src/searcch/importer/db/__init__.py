@@ -4,7 +4,7 @@ import os
 import os.path
 
 import sqlalchemy
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine,event
 from sqlalchemy.orm import sessionmaker
 
 from searcch.importer.util.config import (
@@ -65,10 +65,28 @@ def ensure_db_file(config=None,url=None):
         f.close()
     return url
 
+#
+# SQLite connections wait this many seconds for a lock held by another
+# connection (e.g. a concurrent follow import) instead of failing at once.
+#
+SQLITE_BUSY_TIMEOUT = 30
+
+def _sqlite_on_connect(dbapi_connection,connection_record):
+    # Write-ahead logging lets readers proceed while a writer holds the
+    # database.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
 def get_db_engine(config=None,url=None,echo=False):
     url = ensure_db_file(config=config,url=url)
     LOG.debug("connecting to '%s'",url)
-    return create_engine(url,echo=echo)
+    if not url.startswith("sqlite"):
+        return create_engine(url,echo=echo)
+    engine = create_engine(
+        url,echo=echo,connect_args=dict(timeout=SQLITE_BUSY_TIMEOUT))
+    event.listen(engine,"connect",_sqlite_on_connect)
+    return engine
 
 def get_db_session(config=None,url=None,auto_upgrade=None,
                    error_db_unsync=None,echo=False):
@@ -0,0 +1,38 @@
+"""artifact-url-index
+
+Revision ID: 3f8a6d2b7c15
+Revises: e61b0c9d3a28
+Create Date: 2026-10-18 15:07:19.832046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8a6d2b7c15'
+down_revision = 'e61b0c9d3a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('artifacts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('canonical_url', sa.String(length=1024), nullable=True))
+        batch_op.create_index(batch_op.f('ix_artifacts_canonical_url'), ['canonical_url'], unique=False)
+        batch_op.create_index(batch_op.f('ix_artifacts_ext_id'), ['ext_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_artifacts_url'), ['url'], unique=False)
+
+    with op.batch_alter_table('candidate_artifacts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_candidate_artifacts_url'), ['url'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('candidate_artifacts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_candidate_artifacts_url'))
+
+    with op.batch_alter_table('artifacts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_artifacts_url'))
+        batch_op.drop_index(batch_op.f('ix_artifacts_ext_id'))
+        batch_op.drop_index(batch_op.f('ix_artifacts_canonical_url'))
+        batch_op.drop_column('canonical_url')
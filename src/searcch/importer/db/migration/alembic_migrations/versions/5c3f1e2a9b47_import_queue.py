@@ -0,0 +1,30 @@
+"""import-queue
+
+Revision ID: 5c3f1e2a9b47
+Revises: 71cc3aa3e0c9
+Create Date: 2026-10-18 10:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c3f1e2a9b47'
+down_revision = '71cc3aa3e0c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('artifact_imports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.Enum('queued', 'running', 'completed', 'failed', name='artifact_import_status_enum'), nullable=True))
+        batch_op.add_column(sa.Column('queue_time', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('start_time', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('artifact_imports', schema=None) as batch_op:
+        batch_op.drop_column('start_time')
+        batch_op.drop_column('queue_time')
+        batch_op.drop_column('status')
@@ -0,0 +1,40 @@
+"""backfill-canonical-url
+
+Revision ID: a1d5e3b7c9f4
+Revises: c47e91a05d2f
+Create Date: 2026-10-18 19:12:07.415820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d5e3b7c9f4'
+down_revision = 'c47e91a05d2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Artifacts imported before canonical_url existed must be found by
+    # find_artifact too; compute theirs exactly as an import would.
+    from searcch.importer.importer import canonical_url
+
+    artifacts = sa.table(
+        'artifacts',sa.column('id',sa.Integer),sa.column('url',sa.String),
+        sa.column('canonical_url',sa.String))
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(artifacts.c.id,artifacts.c.url)
+        .where(artifacts.c.canonical_url == None)
+        .where(artifacts.c.url != None)).fetchall()
+    for (id,url) in rows:
+        conn.execute(
+            artifacts.update().where(artifacts.c.id == id)
+            .values(canonical_url=canonical_url(url)[:1024]))
+
+
+def downgrade():
+    # The values are derived from url; leaving them in place is harmless.
+    pass
@@ -0,0 +1,26 @@
+"""import-attempts
+
+Revision ID: a2d7e4c81f06
+Revises: 5c3f1e2a9b47
+Create Date: 2026-10-18 13:40:07.291835
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2d7e4c81f06'
+down_revision = '5c3f1e2a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('artifact_imports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('artifact_imports', schema=None) as batch_op:
+        batch_op.drop_column('attempts')
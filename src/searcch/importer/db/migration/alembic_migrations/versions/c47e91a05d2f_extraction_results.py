@@ -0,0 +1,33 @@
+"""extraction-results
+
+Revision ID: c47e91a05d2f
+Revises: 3f8a6d2b7c15
+Create Date: 2026-10-18 16:41:52.118304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e91a05d2f'
+down_revision = '3f8a6d2b7c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('extraction_results',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('hash', sa.BINARY(length=32), nullable=False),
+    sa.Column('extractor', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.String(length=32), nullable=False),
+    sa.Column('result', sa.Text(), nullable=False),
+    sa.Column('ctime', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('hash', 'extractor', 'version')
+    )
+
+
+def downgrade():
+    op.drop_table('extraction_results')
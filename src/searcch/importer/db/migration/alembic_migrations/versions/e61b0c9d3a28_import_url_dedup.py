@@ -0,0 +1,32 @@
+"""import-url-dedup
+
+Revision ID: e61b0c9d3a28
+Revises: a2d7e4c81f06
+Create Date: 2026-10-18 14:22:53.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b0c9d3a28'
+down_revision = 'a2d7e4c81f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('artifact_imports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('url_key', sa.String(length=1024), nullable=True))
+        batch_op.add_column(sa.Column('leader_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_artifact_imports_url_key'), ['url_key'], unique=False)
+        batch_op.create_foreign_key('fk_artifact_imports_leader_id', 'artifact_imports', ['leader_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('artifact_imports', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_artifact_imports_leader_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_artifact_imports_url_key'))
+        batch_op.drop_column('leader_id')
+        batch_op.drop_column('url_key')
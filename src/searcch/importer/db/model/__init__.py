@@ -24,6 +24,9 @@ ARTIFACT_IMPORT_TYPES = (
     "publication", "presentation", "dataset", "software",
     "other", "unknown"
 )
+ARTIFACT_IMPORT_STATUSES = (
+    "queued", "running", "completed", "failed"
+)
 
 ARTIFACT_RELATIONS = (
     "cites", "supplements", "extends", "uses", "describes",
@@ -78,6 +81,50 @@ def file_content_fixups(mapper, connection, target):
         if row:
             target.id = row["id"]
 
+class ExtractionResult(Base):
+    """
+    A memoized extractor result: the JSON-encoded `result` of `extractor`
+    (at `version`) on the content whose SHA-256 digest is `hash` (as in
+    FileContent.hash), so that identical input (e.g. the README of a fork,
+    or a re-import) is not processed again.
+    """
+    __tablename__ = "extraction_results"
+
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    hash = Column(BINARY(length=32),nullable=False)
+    extractor = Column(String(64),nullable=False)
+    version = Column(String(32),nullable=False)
+    result = Column(Text,nullable=False)
+    ctime = Column(DateTime,nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("hash","extractor","version"),)
+
+    @classmethod
+    def insert_ignore(kls,session,rows):
+        """Inserts `rows` (dicts of column values) in `session`'s transaction, skipping any whose (hash,extractor,version) is already present, e.g. because a concurrent import stored the same result."""
+        table = kls.__table__
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+            session.execute(insert(table).on_conflict_do_nothing(),rows)
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            session.execute(insert(table).on_conflict_do_nothing(),rows)
+        elif dialect == "mysql":
+            session.execute(table.insert().prefix_with("IGNORE"),rows)
+        else:
+            for row in rows:
+                if not session.query(kls.id)\
+                  .filter(kls.hash == row["hash"])\
+                  .filter(kls.extractor == row["extractor"])\
+                  .filter(kls.version == row["version"]).first():
+                    session.execute(table.insert(),[row])
+
+    def __repr__(self):
+        return "<ExtractionResult(id=%r,hash=0x%s,extractor=%r,version=%r)>" % (
+            self.id,self.hash.hex(),self.extractor,self.version)
+
 class ArtifactMetadata(Base):
     __tablename__ = "artifact_metadata"
 
@@ -536,8 +583,11 @@ class Artifact(Base):
     id = Column(Integer,primary_key=True,autoincrement=True)
     #uuid = Column(String(64),primary_key=True)
     type = Column(Enum(*ARTIFACT_TYPES,name="artifact_enum"))
-    url = Column(String(1024),nullable=False)
-    ext_id = Column(String(512),nullable=True)
+    url = Column(String(1024),nullable=False,index=True)
+    ext_id = Column(String(512),nullable=True,index=True)
+    # A network-free canonical form of the URL the artifact was imported
+    # from; see searcch.importer.importer.canonical_url.
+    canonical_url = Column(String(1024),nullable=True,index=True)
     title = Column(Text(),nullable=False)
     name = Column(String(1024),nullable=True)
     ctime = Column(DateTime,nullable=False)
@@ -621,7 +671,7 @@ class CandidateArtifact(Base):
     __tablename__ = "candidate_artifacts"
 
     id = Column(Integer,primary_key=True,autoincrement=True)
-    url = Column(String(1024),nullable=False)
+    url = Column(String(1024),nullable=False,index=True)
     ctime = Column(DateTime,nullable=False)
     mtime = Column(DateTime)
     type = Column(Enum(*ARTIFACT_TYPES,name="candidate_artifact_enum"))
@@ -738,6 +788,17 @@ class ArtifactImport(Base):
     bytes_retrieved = Column(Integer, default=0)
     bytes_extracted = Column(Integer, default=0)
     log = Column(Text, nullable=True)
+    # Scheduler state: imports wait in the queue until a worker is free.
+    status = Column(Enum(
+        *ARTIFACT_IMPORT_STATUSES,name="artifact_import_status_enum"),
+        nullable=True)
+    queue_time = Column(DateTime, nullable=True)
+    start_time = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0)
+    # Imports of the same normalized URL share one run: the first (the
+    # leader) runs, and later ones (followers) wait for its result.
+    url_key = Column(String(1024), nullable=True, index=True)
+    leader_id = Column(Integer, ForeignKey("artifact_imports.id"), nullable=True)
     # Only set once status=complete and phase=done
     artifact_id = Column(Integer, ForeignKey("artifacts.id"), nullable=True)
 
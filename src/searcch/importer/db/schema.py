@@ -306,7 +306,7 @@ class ArtifactSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Artifact
         model_converter = ModelConverter
-        exclude = ('id','license_id', 'owner_id', 'importer_id')
+        exclude = ('id','license_id', 'owner_id', 'importer_id', 'canonical_url')
         include_fk = True
         include_relationships = True
 
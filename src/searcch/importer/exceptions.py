@@ -120,3 +120,26 @@ class HttpError(ImporterError):
     
 class MissingMetadataError(ImporterError):
     """Critical metadata was unavailable."""
+
+class ArchiveLimitError(ImporterError):
+    """An archive exceeded a configured unpack limit (member count, expanded size, or compression ratio), or contained an unsafe member path."""
+
+class UnpackError(ImporterError):
+    """An unpacker or external decompression tool failed."""
+
+class QueueFullError(ImporterError):
+    """The import queue is full; the caller should retry after `retry_after` seconds."""
+
+    def __init__(self,retry_after,*args):
+        super(QueueFullError,self).__init__(*args)
+        self.retry_after = retry_after
+
+class RateLimitedError(ImporterError):
+    """A host is rate limited for longer than [ratelimit] max_wait seconds; the caller should retry after `retry_after` seconds."""
+
+    def __init__(self,retry_after,*args):
+        super(RateLimitedError,self).__init__(*args)
+        self.retry_after = retry_after
+
+class ResourceUnavailableError(ImporterError):
+    """An extractor model or corpus is not staged in the resource directory (or failed checksum verification), and may not be downloaded."""
@@ -8,6 +8,7 @@ from .json import JSONExporter
 from searcch.importer.db.model import ExportedObject
 from searcch.importer.exceptions import (
     NotExportedError )
+from searcch.importer.util.http import new_http_session
 
 class SearcchExporter(JSONExporter):
     """A simple SEARCCH exporter that recursively flattens an Artifact record into a JSON document and pushes it to the SEARCCH API."""
@@ -42,7 +43,7 @@ class SearcchExporter(JSONExporter):
         headers = dict()
         if self.config["searcch"]["api_key"]:
             headers["X-Api-Key"] = self.config["searcch"]["api_key"]
-        r = requests.post(
+        r = new_http_session(self.config).post(
             self.config["searcch"]["api_root"] + "/artifacts",
             headers=headers,json=j)
         if r.status_code != requests.codes.ok:
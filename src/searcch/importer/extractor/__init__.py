@@ -3,19 +3,56 @@ import six
 from future.utils import iteritems
 import abc
 import logging
+import hashlib
 import os.path
+import collections
 
 from searcch.importer.db.model import (
-    Extractor, License)
+    Extractor, License, ArtifactTag, ArtifactMetadata, ArtifactAffiliation,
+    Affiliation, Person)
 from searcch.importer.util.pdf import pdf_file_to_text
+from searcch.importer.util.inspect import FileTypeInspector
+import searcch.importer.extractor.config
 
 LOG = logging.getLogger(__name__)
 
+#
+# Extractors declare the parts of the import session they read and write,
+# from this list: "files" (retrieved files), "file_members" (their
+# ArtifactFileMembers), "general_text", and the artifact's "title",
+# "description", "license", "authors", "tags", and "meta".  Authors, tags
+# and metadata are staged by each extractor (see BaseExtractor.add_author,
+# add_tag and add_metadata) and merged in extractor order, so writing them
+# does not order extractors.
+#
+MERGED_RESOURCES = ("authors","tags","meta")
+
+#
+# Archive members with these suffixes are read as keyword documents, in
+# addition to the key files (README, etc) recorded as ArtifactFileMembers.
+#
+DOCUMENT_SUFFIXES = (".pdf",".txt",".md",".markdown")
+
+#
+# The mime types of files that keyword extractors read as text.  Other text/*
+# types (source code, HTML, CSV, etc) are not prose.
+#
+TEXT_MIME_TYPES = (
+    "text","txt","application/text","",None,
+    "text/plain","text/markdown","text/x-markdown")
+
 @six.add_metaclass(abc.ABCMeta)
 class BaseExtractor(object):
     """An abstract base class that any Extractor must subclass."""
     name = None
     version = None
+    #
+    # The session state this extractor reads and writes (see above).  None
+    # means unknown: the extractor is run alone, after all extractors
+    # before it, and before all extractors after it.
+    #
+    reads = None
+    writes = None
 
     def __init__(self,config,session,**kwargs):
         self._config = config
@@ -34,42 +71,145 @@ class BaseExtractor(object):
         """Extracts all possible metadata from an artifact import session; return value ignored."""
 
     def get_license_object(self,short_name):
-        license = self.session.session.query(License).\
-            filter(License.short_name == short_name).\
-            first()
-        if not license:
-            license = License(short_name=short_name)
+        db_session = self.session.session
+        # Concurrent extractors share the database session; and we must not
+        # autoflush the artifact while another extractor modifies it.
+        with self.session.db_lock, db_session.no_autoflush:
+            license = db_session.query(License).\
+                filter(License.short_name == short_name).\
+                first()
+            if not license:
+                for obj in db_session.new:
+                    if isinstance(obj,License) and obj.short_name == short_name:
+                        return obj
+                license = License(short_name=short_name)
         return license
 
+    def lookup_result(self,digest):
+        """Returns our memoized result on the content whose SHA-256 digest is `digest`, or None."""
+        return self.session.lookup_result(self.name,self.version,digest)
+
+    def store_result(self,digest,result):
+        """Memoizes our `result` (a JSON value) on the content whose SHA-256 digest is `digest`."""
+        self.session.store_result(self.name,self.version,digest,result)
+
+    @property
+    def staged(self):
+        """A dict of the authors (`authors`, as (name,email) tuples), ArtifactTags (`tags`) and ArtifactMetadata (`meta`) this extractor has staged."""
+        if getattr(self,"_staged",None) is None:
+            self._staged = dict(authors=[],tags=[],meta=[])
+        return self._staged
+
+    def add_author(self,name=None,email=None):
+        """Stages an author, unless our staged authors already have it; merge skips authors the artifact already has.  Returns True if staged."""
+        if (name,email) in self.staged["authors"]:
+            return False
+        self.staged["authors"].append((name,email))
+        return True
+
+    def add_tag(self,tag,source=None):
+        """Stages an ArtifactTag, unless the artifact or our staged tags already have it (ignoring case).  Returns True if staged."""
+        if self.session.artifact.has_tag(tag,ignore_case=True):
+            return False
+        for t in self.staged["tags"]:
+            if t.tag.lower() == tag.lower():
+                return False
+        self.staged["tags"].append(ArtifactTag(tag=tag,source=source))
+        return True
+
+    def add_metadata(self,name,value,source=None,type=None):
+        """Stages an ArtifactMetadata."""
+        self.staged["meta"].append(
+            ArtifactMetadata(name=name,value=value,source=source,type=type))
+
+    def merge(self):
+        """Adds our staged authors and tags (except those the artifact already has) and metadata to the artifact."""
+        staged = self.staged
+        self._staged = None
+        for (name,email) in staged["authors"]:
+            if not self.session.artifact.has_author(name=name,email=email):
+                person = Person(name=name,email=email)
+                self.session.artifact.affiliations.append(
+                    ArtifactAffiliation(affiliation=Affiliation(person=person)))
+        for t in staged["tags"]:
+            if not self.session.artifact.has_tag(t.tag,ignore_case=True):
+                self.session.artifact.tags.append(t)
+        for m in staged["meta"]:
+            self.session.artifact.meta.append(m)
+
+def _conflicts(a,b):
+    if a.reads is None or a.writes is None or b.reads is None or b.writes is None:
+        return True
+    (aw,bw) = (set(a.writes) - set(MERGED_RESOURCES),
+               set(b.writes) - set(MERGED_RESOURCES))
+    return bool(aw & (set(b.reads) | bw) or bw & set(a.reads))
+
+def get_extractor_stages(extractors):
+    """Groups `extractors` into a list of stages (lists of extractors, in their original order) that may run concurrently.  Each extractor is placed in the stage after the last earlier extractor it conflicts with: one writes what the other reads or writes (ignoring merged resources)."""
+    stages = []
+    placed = []
+    for ext in extractors:
+        i = 0
+        for (other,j) in placed:
+            if _conflicts(ext,other):
+                i = max(i,j + 1)
+        if i == len(stages):
+            stages.append([])
+        stages[i].append(ext)
+        placed.append((ext,i))
+    return stages
+
 @six.add_metaclass(abc.ABCMeta)
 class BaseKeywordExtractor(BaseExtractor):
+    reads = ("files","file_members","general_text")
+    writes = ("tags","meta")
+
+    @abc.abstractmethod
+    def compute_keywords(self,text):
+        """Returns the keywords in text, as a JSON-compatible list (empty if none)."""
 
     @abc.abstractmethod
+    def apply_keywords(self,keywords,source=None):
+        """Stages tags and metadata for the keywords computed from the text supplied by source; returns False if there were none."""
+
     def extract_keywords(self,text,source=None):
         """Extracts keywords from the text supplied by source."""
+        return self.apply_keywords(self.compute_keywords(text),source=source)
 
-    def extract(self):
-        """Extracts keywords from retrieved ArtifactFiles with mime type application/pdf or text and saves the top N as ArtifactMetadata."""
+    def compute_keywords_batch(self,texts):
+        """Returns a list of the keywords in each of `texts` (see compute_keywords).  Subclasses whose work can be batched across documents should override this."""
+        return [self.compute_keywords(text) for text in texts]
 
-        LOG.debug("extracting keywords (%r) in %r",
-                  getattr(self.__class__,"name",None),self.session.artifact)
-
-        self.extract_keywords(self.session.general_text,source="general text")
+    def _file_document(self,path,mime_type,source):
+        if mime_type in ("application/pdf","pdf"):
+            to_text = lambda: pdf_file_to_text(path)
+        elif mime_type in TEXT_MIME_TYPES:
+            to_text = lambda: _file_text(path)
+        else:
+            return None
+        max_size = self.config["extract"].getint("max_document_size")
+        if max_size and os.path.getsize(path) > max_size:
+            LOG.debug("not extracting keywords from %r: larger than %d bytes",
+                      path,max_size)
+            return None
+        h = hashlib.sha256()
+        with open(path,"rb") as f:
+            for buf in iter(lambda: f.read(65536),b""):
+                h.update(buf)
+        return (h.digest(),to_text,source)
 
+    def collect_documents(self):
+        """Returns a list of (digest,to_text,source) for each document to extract keywords from: the general text, and each retrieved PDF or text file (or archive member) not already indexed in it.  Archive members that were not unpacked (see [retrieve] unpack = lazy) are extracted on demand.  `digest` is the SHA-256 digest of the document's content, and `to_text()` returns its text."""
+        text = self.session.general_text
+        docs = [(hashlib.sha256(text.encode("utf-8")).digest(),lambda: text,
+                 "general text")]
         for rf in self.session.retrieved_files:
             if os.path.isfile(rf.path):
                 if self.session.general_text_indexed(artifact_file=rf.artifact_file):
                     continue
-                text = None
-                if rf.mime_type in ("application/pdf","pdf"):
-                    text = pdf_file_to_text(rf.path)
-                elif rf.mime_type in ("text","txt","application/text","",None):
-                    with open(rf.path,"rb") as f:
-                        text = f.read().decode()
-                else:
-                    continue
-                if text:
-                    self.extract_keywords(text,source=rf)
+                doc = self._file_document(rf.path,rf.mime_type,rf)
+                if doc:
+                    docs.append(doc)
             elif os.path.isdir(rf.path) and rf.artifact_file.members:
                 for rfm in rf.artifact_file.members:
                     if rfm.pathname.startswith("LICENSE") or rfm.pathname.startswith("COPYING"):
@@ -77,17 +217,82 @@ class BaseKeywordExtractor(BaseExtractor):
                     if self.session.general_text_indexed(
                       artifact_file=rf.artifact_file,artifact_file_member=rfm):
                         continue
+                    doc = self._file_document(
+                        os.path.join(rf.path,rfm.pathname),rfm.filetype,rfm)
+                    if doc:
+                        docs.append(doc)
+            docs.extend(self._archive_documents(rf))
+        return docs
+
+    def _archive_documents(self,rf):
+        """Returns the documents (see collect_documents) in the PDF and text members of `rf`'s archive, other than its ArtifactFileMembers."""
+        known = set([rfm.pathname for rfm in rf.artifact_file.members])
+        names = [m.name for m in rf.archive_members()
+                 if m.is_file and m.name.lower().endswith(DOCUMENT_SUFFIXES)]
+        paths = rf.member_paths(names)
+        docs = []
+        for name in names:
+            path = paths.get(name)
+            if not path or os.path.relpath(path,rf.path) in known:
+                continue
+            mimelist = FileTypeInspector.inspect(path)
+            mime_type = mimelist[0][0] if mimelist else None
+            doc = self._file_document(path,mime_type,"%s:%s" % (rf.raw_path,name))
+            if doc:
+                docs.append(doc)
+        return docs
+
+    @classmethod
+    def extract_batch(kls,extractors):
+        """Extracts keywords from the documents of `extractors`, instances of this class each bound to its own import session (e.g. the artifacts of a batch import), as one batch.  Documents with memoized keywords are not processed, identical documents are processed once, and the rest are passed to a single compute_keywords_batch call.  Each extractor then stages the keywords of its own documents.  A document that cannot be read is skipped, and no result is memoized for it."""
+        docs = [(ext,doc) for ext in extractors for doc in ext.collect_documents()]
+        results = dict()
+        todo = collections.OrderedDict()
+        failed = set()
+        for (ext,(digest,to_text,source)) in docs:
+            if digest in results or digest in todo:
+                continue
+            result = ext.lookup_result(digest)
+            if result is None:
+                todo[digest] = to_text
+            else:
+                results[digest] = result
+        if todo:
+            (digests,texts) = ([],[])
+            for (digest,to_text) in todo.items():
+                try:
+                    text = to_text()
+                except:
+                    LOG.warning("failed to read document for %s",kls.name,
+                                exc_info=True)
                     text = None
-                    path = os.path.join(rf.path,rfm.pathname)
-                    if rfm.filetype in ("application/pdf","pdf"):
-                        text = pdf_file_to_text(path)
-                    elif rfm.filetype in ("text","txt","application/text","",None):
-                        with open(path,"rb") as f:
-                            text = f.read().decode()
-                    else:
-                        continue
-                    if text:
-                        self.extract_keywords(text,source=rfm)
+                    failed.add(digest)
+                if text:
+                    digests.append(digest)
+                    texts.append(text)
+                else:
+                    results[digest] = dict(keywords=[])
+            LOG.debug("computing keywords (%s) in %d documents",kls.name,len(texts))
+            if texts:
+                keywords = extractors[0].compute_keywords_batch(texts)
+                for (digest,kw) in zip(digests,keywords):
+                    results[digest] = dict(keywords=kw)
+        for (ext,(digest,to_text,source)) in docs:
+            if digest in todo and not digest in failed:
+                ext.store_result(digest,results[digest])
+            ext.apply_keywords(results[digest]["keywords"],source=source)
+
+    def extract(self):
+        """Extracts keywords from retrieved ArtifactFiles with mime type application/pdf or text and saves the top N as ArtifactMetadata."""
+
+        LOG.debug("extracting keywords (%r) in %r",
+                  getattr(self.__class__,"name",None),self.session.artifact)
+
+        self.extract_batch([self])
+
+def _file_text(path):
+    with open(path,"rb") as f:
+        return f.read().decode("utf-8",errors="replace")
 
 __extractors__ = dict()
 
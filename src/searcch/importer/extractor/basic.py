@@ -7,6 +7,7 @@ import datetime
 from searcch.importer.extractor import BaseExtractor
 from searcch.importer.db.model import (
     ArtifactFileMember,FileContent )
+from searcch.importer.util.inspect import FileTypeInspector
 
 LOG = logging.getLogger(__name__)
 
@@ -14,12 +15,14 @@ class BasicFileExtractor(BaseExtractor):
     """A simple extractor that knows enough to look for (README,LICENSE,COPYING}* if a previous heuristic has not found them."""
     name = "basic_file"
     version = "0.1"
+    reads = ("files","file_members")
+    writes = ("file_members","general_text")
 
     def __init__(self,config,session,**kwargs):
         self._config = config
         self._session = session
 
-    def add_file_member(self,artifact_file,dirent):
+    def add_file_member(self,artifact_file,dirent,filetype="text"):
         content = None
         st = dirent.stat()
         mtime = datetime.date.fromtimestamp(st.st_mtime)
@@ -34,7 +37,7 @@ class BasicFileExtractor(BaseExtractor):
         fc = FileContent(content=content,size=size)
         rfm = ArtifactFileMember(
             pathname=dirent.name,name=dirent.name,html_url=None,
-            download_url=None,filetype="text",
+            download_url=None,filetype=filetype,
             file_content=fc,size=size,mtime=mtime)
         artifact_file.members.append(rfm)
         return rfm
@@ -71,17 +74,37 @@ class BasicFileExtractor(BaseExtractor):
             if readme and (license or copying) and citation_cff:
                 continue
 
+            found = dict()
             for dirent in os.scandir(rf.path):
                 if dirent.is_symlink():
                     continue
                 if not dirent.is_file():
                     continue
-                if not readme and dirent.name.startswith("README"):
-                    readme = self.add_file_member(rf.artifact_file,dirent)
-                    self.session.add_general_text_from_file(rf,readme)
-                if not license and dirent.name.startswith("LICENSE"):
-                    license = self.add_file_member(rf.artifact_file,dirent)
-                if not copying and dirent.name.startswith("COPYING"):
-                    copying = self.add_file_member(rf.artifact_file,dirent)
-                if not citation_cff and dirent.name == "CITATION.cff":
-                    citation_cff = self.add_file_member(rf.artifact_file,dirent)
+                if not readme and not "readme" in found \
+                  and dirent.name.startswith("README"):
+                    found["readme"] = dirent
+                if not license and not "license" in found \
+                  and dirent.name.startswith("LICENSE"):
+                    found["license"] = dirent
+                if not copying and not "copying" in found \
+                  and dirent.name.startswith("COPYING"):
+                    found["copying"] = dirent
+                if not citation_cff and not "citation_cff" in found \
+                  and dirent.name == "CITATION.cff":
+                    found["citation_cff"] = dirent
+            if not found:
+                continue
+
+            # Type all the new members at once.
+            mimelists = FileTypeInspector.inspect_many(
+                [ x.path for x in found.values() ])
+            members = dict()
+            for (kind,dirent) in found.items():
+                mimelist = mimelists.get(dirent.path)
+                filetype = "text"
+                if mimelist and mimelist[0][0]:
+                    filetype = mimelist[0][0]
+                members[kind] = self.add_file_member(
+                    rf.artifact_file,dirent,filetype=filetype)
+            if "readme" in members:
+                self.session.add_general_text_from_file(rf,members["readme"])
@@ -0,0 +1,27 @@
+from searcch.importer.util.config import (
+    config_section,ConfigSection )
+
+@config_section
+class ExtractConfigSection(ConfigSection):
+
+    @classmethod
+    def section_name(cls):
+        return "extract"
+
+    @classmethod
+    def section_defaults(cls):
+        return dict(
+            workers="1",result_cache="true",pipe_batch_size="32",
+            pipe_processes="1",batch_artifacts="1",
+            max_document_size="16777216")
+
+@config_section
+class ResourcesConfigSection(ConfigSection):
+
+    @classmethod
+    def section_name(cls):
+        return "resources"
+
+    @classmethod
+    def section_defaults(cls):
+        return dict(dir="",allow_download="false")
@@ -7,8 +7,6 @@ import sys
 import pygit2
 
 from searcch.importer.extractor import BaseExtractor
-from searcch.importer.db.model import (
-    ArtifactAffiliation, Affiliation, Person)
 
 LOG = logging.getLogger(__name__)
 
@@ -16,6 +14,8 @@ class GitExtractor(BaseExtractor):
     """A simple extractor that extracts branch/author info from a repository."""
     name = "git_extractor"
     version = "0.1"
+    reads = ("files",)
+    writes = ("authors",)
 
     def __init__(self, config, session,**kwargs):
         self._config = config
@@ -51,8 +51,5 @@ class GitExtractor(BaseExtractor):
                 if not (name or email) or email in authors:
                     continue
                 authors[email] = name
-                if not self.session.artifact.has_author(name=name,email=email):
-                    LOG.debug("git extractor found new author %r/%r",name,email)
-                    person = Person(name=name,email=email)
-                    self.session.artifact.affiliations.append(
-                        ArtifactAffiliation(affiliation=Affiliation(person=person)))
+                if self.add_author(name=name,email=email):
+                    LOG.debug("git extractor found author %r/%r",name,email)
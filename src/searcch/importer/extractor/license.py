@@ -4,6 +4,7 @@ import os
 import os.path
 import datetime
 import sys
+import hashlib
 import commonmark
 
 from searcch.importer.extractor import BaseExtractor
@@ -16,6 +17,8 @@ class LicenseExtractor(BaseExtractor):
     """A simple extractor that extracts an open-source license from a file."""
     name = "license"
     version = "0.1"
+    reads = ("files","file_members","license")
+    writes = ("license",)
 
     def __init__(self, config, session,**kwargs):
         self._config = config
@@ -25,10 +28,14 @@ class LicenseExtractor(BaseExtractor):
         LOG.debug("recognizing license in %r",path)
         content = None
         with open(path, "rb") as f:
-            content = bytes2str(f.read())
-        license_short_name = recognize_license(content)
-        if license_short_name:
-            return self.get_license_object(license_short_name)
+            content = f.read()
+        digest = hashlib.sha256(content).digest()
+        result = self.lookup_result(digest)
+        if result is None:
+            result = dict(license=recognize_license(bytes2str(content)))
+            self.store_result(digest,result)
+        if result["license"]:
+            return self.get_license_object(result["license"])
         return None
 
     def extract(self):
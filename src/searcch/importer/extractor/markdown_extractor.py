@@ -4,6 +4,7 @@ import os
 import os.path
 import datetime
 import sys
+import hashlib
 import commonmark
 
 from searcch.importer.extractor import BaseExtractor
@@ -109,6 +110,8 @@ class MarkdownExtractor(BaseExtractor):
     """A simple extractor that reads the content from the Readme.md file"""
     name = "markdown_extractor"
     version = "0.1"
+    reads = ("files","file_members","title","description")
+    writes = ("title","description")
 
     def __init__(self, config, session,**kwargs):
         self._config = config
@@ -131,6 +134,26 @@ class MarkdownExtractor(BaseExtractor):
         except:
             LOG.exception(sys.exc_info()[1])
 
+    def get_memoized_data(self, markdown_txt):
+        """Returns get_data(markdown_txt), reusing our memoized result if we have seen the same text before."""
+        if not markdown_txt:
+            return self.get_data(markdown_txt)
+        digest = hashlib.sha256(bytes2str(markdown_txt).encode("utf-8")).digest()
+        result = self.lookup_result(digest)
+        if result is None:
+            result = dict(data=self.get_data(markdown_txt))
+            self.store_result(digest,result)
+        return result["data"]
+
+    def find_archive_readme(self, rf):
+        """Returns the path of the least deeply nested README in the archive of retrieved file rf (extracting it if necessary), or None."""
+        names = [ m.name for m in rf.archive_members()
+                  if m.is_file and os.path.basename(m.name).startswith("README") ]
+        if not names:
+            return None
+        name = min(names, key=lambda x: (x.strip("/").count("/"), x))
+        return rf.member_paths([name]).get(name)
+
     def extract(self):
         """Extracts title and description from the Readme.md file"""
         if self.session.artifact.title and self.session.artifact.description:
@@ -141,14 +164,18 @@ class MarkdownExtractor(BaseExtractor):
             if not os.path.isdir(rf.path):
                 continue
             data = None
+            path_to_readme = None
             for rfm in rf.artifact_file.members:
                 if rfm.name.startswith("README"):
                     path_to_readme = rf.path + os.path.sep + rfm.pathname
-                    readme_txt = self.get_filetext(path_to_readme)
-                    data = self.get_data(readme_txt)
                     break
+            if not path_to_readme:
+                path_to_readme = self.find_archive_readme(rf)
+            if path_to_readme:
+                readme_txt = self.get_filetext(path_to_readme)
+                data = self.get_memoized_data(readme_txt)
             if data:
-                LOG.debug("extracted %r from artifact file %r",data,rfm.name)
+                LOG.debug("extracted %r from artifact file %r",data,path_to_readme)
                 if not self.session.artifact.title and data.get("Title", None):
                     self.session.artifact.title = data['Title']
                 if not self.session.artifact.description and data.get("Desc", None):
@@ -6,41 +6,63 @@ import os
 import requests
 import json
 import spacy
-import nltk
 import pke
 
 from searcch.importer.extractor import BaseKeywordExtractor
-from searcch.importer.db.model import (
-    ArtifactMetadata, ArtifactTag )
+from searcch.importer.extractor.registry import (
+    resource,get_resource,resource_path )
 
 LOG = logging.getLogger(__name__)
 
+def fetch_spacy_model(config,dest):
+    """Saves the en_core_web_sm pipeline to `dest`, first downloading the package if it is not installed."""
+    try:
+        nlp = spacy.load("en_core_web_sm")
+    except OSError:
+        spacy.cli.download("en_core_web_sm")
+        nlp = spacy.load("en_core_web_sm")
+    nlp.to_disk(dest)
+
+@resource("spacy_en_core_web_sm",path="spacy/en_core_web_sm",
+          fetch=fetch_spacy_model)
+def load_spacy_model(config):
+    """The spaCy English pipeline that PKE uses to tokenize and tag documents.  As in PKE itself, only the tagger is kept, and sentences are split by the sentencizer rather than the parser."""
+    nlp = spacy.load(resource_path(config,"spacy_en_core_web_sm"),
+                     disable=["ner","parser","textcat"])
+    nlp.add_pipe("sentencizer")
+    return nlp
+
 class PKEExtractor(BaseKeywordExtractor):
     """Uses the PKE toolkit to extract keywords from text files."""
     name = "pke_keywords"
-    version = "0.1"
+    version = "0.2"
 
     def __init__(self,config,session,**kwargs):
         self._config = config
         self._session = session
-        try:
-            sp = spacy.load("en_core_web_sm")
-        except:
-            spacy.cli.download("en_core_web_sm")
-            sp = spacy.load("en_core_web_sm")
-        try:
-            if not nltk.corpus.stopwords.fileids:
-                nltk.download('stopwords')
-        except:
-            nltk.download('stopwords')
-
-    def extract_keywords(self,text,source=None):
-        LOG.debug("extracting keywords (%s) from %r",
-            getattr(self.__class__,"name",None),source)
 
+    def load(self):
+        get_resource("nltk_stopwords",self.config)
+        return get_resource("spacy_en_core_web_sm",self.config)
+
+    def compute_keywords(self,text):
+        return self.compute_keywords_batch([text])[0]
+
+    def compute_keywords_batch(self,texts):
+        """Parses `texts` with spaCy in batches (nlp.pipe, with [extract] pipe_batch_size and pipe_processes), and runs each PKE model on the parsed documents, so that each text is parsed once."""
+        LOG.debug("computing keywords (%s) in %d documents",
+                  getattr(self.__class__,"name",None),len(texts))
+
+        nlp = self.load()
+        docs = nlp.pipe(
+            texts,batch_size=self.config["extract"].getint("pipe_batch_size"),
+            n_process=max(1,self.config["extract"].getint("pipe_processes")))
+        return [self._doc_keywords(doc) for doc in docs]
+
+    def _doc_keywords(self,doc):
         keywords = []
         extractor = pke.unsupervised.TopicRank()
-        extractor.load_document(input=text, language="en")
+        extractor.load_document(input=doc, language="en")
         extractor.candidate_selection()
         extractor.candidate_weighting()
         keyphrases = extractor.get_n_best(n=10)
@@ -52,7 +74,7 @@ class PKEExtractor(BaseKeywordExtractor):
             normalized.append((i[0],i[1]/maxi))
         keywords.extend(normalized)
         extractor = pke.unsupervised.YAKE()
-        extractor.load_document(input=text, language="en")
+        extractor.load_document(input=doc, language="en")
         extractor.candidate_selection()
         extractor.candidate_weighting()
         keyphrases = extractor.get_n_best(n=10)
@@ -64,7 +86,7 @@ class PKEExtractor(BaseKeywordExtractor):
             normalized.append((i[0],i[1]/maxi))
         keywords.extend(normalized)
         extractor = pke.unsupervised.MultipartiteRank()
-        extractor.load_document(input=text, language="en")
+        extractor.load_document(input=doc, language="en")
         extractor.candidate_selection()
         extractor.candidate_weighting()
         keyphrases = extractor.get_n_best(n=10)
@@ -84,19 +106,19 @@ class PKEExtractor(BaseKeywordExtractor):
                 filtered_keywords.append(i)
                 seen.add(i[0])
 
-        if not len(filtered_keywords):
+        return [list(x) for x in filtered_keywords]
+
+    def apply_keywords(self,keywords,source=None):
+        if not len(keywords):
             LOG.debug("no pke keywords found in %r",source)
             return False
 
         # Add in ArtifacTags, but don't duplicate.
-        for (kw,rank) in filtered_keywords:
-            if not self.session.artifact.has_tag(kw,ignore_case=True):
+        for (kw,rank) in keywords:
+            if self.add_tag(kw,source="pke_keywords"):
                 LOG.debug("pke_keywords found kw %s (%r)",kw,rank)
-                self.session.artifact.tags.append(
-                    ArtifactTag(tag=kw,source="pke_keywords"))
 
-        pke_keywords = json.dumps(filtered_keywords, separators=(',', ':'))
-        self.session.artifact.meta.append(
-            ArtifactMetadata(
-                name="pke_keywords",value=pke_keywords,source="pke_keywords",type="json"))
+        pke_keywords = json.dumps(keywords, separators=(',', ':'))
+        self.add_metadata(
+            name="pke_keywords",value=pke_keywords,source="pke_keywords",type="json")
         return True;
@@ -0,0 +1,251 @@
+"""
+A process-wide registry of the models and corpora that extractors use
+(spaCy pipelines, NLTK data, word lists, keyword extractor objects).  Each
+resource is loaded once, on first use, and is then shared by all extractor
+instances, import sessions, and threads in the process.  Extractor modules
+register a loader for each resource they need; `warmup` loads them all
+ahead of time (e.g., when a server worker starts).
+
+Resources backed by files are staged ahead of time into the resource
+directory ([resources] dir) by `fetch_resources` (the resources.fetch
+command), which records each one's sha256 checksum beside it, in
+sha256sum format.  Loaders read them only from there, after verifying the
+checksum.  If a resource is missing or fails verification, it is fetched
+on first use if [resources] allow_download is true; otherwise loading
+raises ResourceUnavailableError, so imports never touch the network for
+resources.
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+
+from searcch.importer.exceptions import ResourceUnavailableError
+
+LOG = logging.getLogger(__name__)
+
+__loaders__ = dict()
+__files__ = dict()
+__resources__ = dict()
+__locks__ = dict()
+__lock__ = threading.Lock()
+
+def register_resource(name,loader,path=None,fetch=None):
+    """Registers `loader(config)` as the function that loads resource `name`.  If the resource is backed by files, `path` is their location (a file or directory) relative to the resource directory, and `fetch(config,dest)` downloads them to `dest`."""
+    with __lock__:
+        __loaders__[name] = loader
+        if path:
+            __files__[name] = (path,fetch)
+
+def resource(name,path=None,fetch=None):
+    """A decorator that registers the decorated function as the loader of resource `name`."""
+    def wrap(loader):
+        register_resource(name,loader,path=path,fetch=fetch)
+        return loader
+    return wrap
+
+def get_resource_dir(config):
+    return config["resources"]["dir"] \
+      or os.path.join(config["DEFAULT"]["tmpdir"],"resources")
+
+def _hash_file(h,path):
+    with open(path,"rb") as f:
+        while True:
+            buf = f.read(65536)
+            if not buf:
+                break
+            h.update(buf)
+
+def checksum(path):
+    """Returns the sha256 hex digest of file `path`, or of the relative names and contents of all files beneath directory `path`."""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for (dirpath,dirnames,filenames) in os.walk(path):
+            dirnames.sort()
+            for fn in sorted(filenames):
+                fp = os.path.join(dirpath,fn)
+                h.update(os.path.relpath(fp,path).encode("utf-8") + b"\0")
+                _hash_file(h,fp)
+    else:
+        _hash_file(h,path)
+    return h.hexdigest()
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+def _recorded_checksum(path):
+    try:
+        with open(path + ".sha256","r") as f:
+            return f.read().split()[0]
+    except (OSError,IndexError):
+        return None
+
+def _file_resources(names=None):
+    from searcch.importer.extractor import load_extractors
+
+    load_extractors()
+    with __lock__:
+        if names is None:
+            return sorted(__files__.keys())
+        for name in names:
+            if not name in __files__:
+                raise KeyError("no such file-backed resource '%s'" % (str(name),))
+        return list(names)
+
+def check_resource(config,name):
+    """Returns the status of file-backed resource `name` in the resource directory: ok, missing, unverified (no recorded checksum), or mismatch."""
+    path = os.path.join(get_resource_dir(config),__files__[name][0])
+    if not os.path.exists(path):
+        return "missing"
+    recorded = _recorded_checksum(path)
+    if not recorded:
+        return "unverified"
+    if recorded != checksum(path):
+        return "mismatch"
+    return "ok"
+
+def check_resources(config,names=None):
+    """Returns a dict of the status (see `check_resource`) of each file-backed resource in `names` (default all)."""
+    return dict([(name,check_resource(config,name))
+                 for name in _file_resources(names)])
+
+def fetch_resource(config,name,force=False):
+    """Downloads file-backed resource `name` into the resource directory and records its checksum, unless it is already staged and verified (and not `force`).  Returns its checksum."""
+    (relpath,fetch) = __files__[name]
+    path = os.path.join(get_resource_dir(config),relpath)
+    if not force and check_resource(config,name) == "ok":
+        return _recorded_checksum(path)
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    # Fetch to a private name, so that other processes never see a partial resource.
+    tmp = "%s.%d.%d.tmp" % (path,os.getpid(),threading.get_ident())
+    _remove(tmp)
+    try:
+        fetch(config,tmp)
+        digest = checksum(tmp)
+        _remove(path)
+        os.rename(tmp,path)
+    finally:
+        _remove(tmp)
+    with open(tmp,"w") as f:
+        f.write("%s  %s\n" % (digest,os.path.basename(path)))
+    os.replace(tmp,path + ".sha256")
+    LOG.info("fetched resource %s into %s (sha256 %s)",name,path,digest)
+    return digest
+
+def fetch_resources(config,names=None,force=False):
+    """Fetches the file-backed resources in `names` (default all); see `fetch_resource`.  Returns a dict of each resource's checksum, or None if it could not be fetched."""
+    ret = dict()
+    for name in _file_resources(names):
+        try:
+            ret[name] = fetch_resource(config,name,force=force)
+        except:
+            LOG.error("failed to fetch resource %s",name,exc_info=True)
+            ret[name] = None
+    return ret
+
+def resource_path(config,name):
+    """Returns the path of file-backed resource `name` in the resource directory, once its checksum is verified.  If it is not staged or fails verification, it is fetched if [resources] allow_download is true; else raises ResourceUnavailableError."""
+    path = os.path.join(get_resource_dir(config),__files__[name][0])
+    status = check_resource(config,name)
+    if status == "ok":
+        return path
+    if not config["resources"].getboolean("allow_download"):
+        raise ResourceUnavailableError(
+            "resource %s is %s in %s (run resources.fetch)" % (
+                name,status,get_resource_dir(config)))
+    LOG.warning("resource %s is %s; downloading it",name,status)
+    fetch_resource(config,name,force=True)
+    return path
+
+def get_resource(name,config):
+    """Returns resource `name`, loading it if this is its first use in this process.  Concurrent first uses wait for a single load.  If the load fails, the exception is raised, and the next use tries again."""
+    try:
+        return __resources__[name]
+    except KeyError:
+        pass
+    with __lock__:
+        if not name in __loaders__:
+            raise KeyError("no such resource '%s'" % (str(name),))
+        loader = __loaders__[name]
+        lock = __locks__.setdefault(name,threading.Lock())
+    with lock:
+        if name in __resources__:
+            return __resources__[name]
+        t = time.time()
+        value = loader(config)
+        LOG.debug("loaded resource %s (%.2fs)",name,time.time() - t)
+        __resources__[name] = value
+        return value
+
+def loaded_resources():
+    """Returns the names of the resources loaded in this process."""
+    return list(__resources__.keys())
+
+def warmup(config,names=None):
+    """Loads the resources in `names` (or all registered resources) that are not yet loaded.  Returns a dict of each resource's load time in seconds, or None if it failed to load."""
+    from searcch.importer.extractor import load_extractors
+
+    load_extractors()
+    if names is None:
+        with __lock__:
+            names = list(__loaders__.keys())
+    ret = dict()
+    for name in names:
+        t = time.time()
+        try:
+            get_resource(name,config)
+            ret[name] = time.time() - t
+        except:
+            LOG.warning("failed to load resource %s",name,exc_info=True)
+            ret[name] = None
+    LOG.info("loaded %d/%d extractor resources",
+             len([x for x in ret.values() if x is not None]),len(ret))
+    return ret
+
+def _nltk_fetcher(package,subpath):
+    """Returns a fetch function that downloads NLTK `package`, and moves its unpacked `subpath` to the destination."""
+    def fetch(config,dest):
+        import nltk
+
+        tmp = dest + ".nltk"
+        try:
+            if not nltk.download(package,download_dir=tmp,quiet=True,
+                                 raise_on_error=True):
+                raise ResourceUnavailableError(
+                    "failed to download NLTK package %s" % (package,))
+            os.rename(os.path.join(tmp,subpath),dest)
+        finally:
+            _remove(tmp)
+    return fetch
+
+def _use_nltk_data(config):
+    """Adds the resource directory's NLTK data to the NLTK search path."""
+    import nltk
+
+    path = os.path.join(get_resource_dir(config),"nltk_data")
+    with __lock__:
+        if not path in nltk.data.path:
+            nltk.data.path.insert(0,path)
+
+@resource("nltk_stopwords",path="nltk_data/corpora/stopwords",
+          fetch=_nltk_fetcher("stopwords","corpora/stopwords"))
+def load_nltk_stopwords(config):
+    """The NLTK English stopwords, as a frozenset."""
+    resource_path(config,"nltk_stopwords")
+    _use_nltk_data(config)
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words("english"))
+
+@resource("nltk_punkt",path="nltk_data/tokenizers/punkt",
+          fetch=_nltk_fetcher("punkt","tokenizers/punkt"))
+def load_nltk_punkt(config):
+    """Makes the NLTK punkt tokenizer data available to nltk.tokenize."""
+    resource_path(config,"nltk_punkt")
+    _use_nltk_data(config)
+    return True
@@ -1,10 +1,8 @@
-import requests
 import logging
 import json
 
 from searcch.importer.extractor import BaseExtractor
-from searcch.importer.db.model import (
-    ArtifactMetadata )
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -12,6 +10,8 @@ class SemanticScholarExtractor(BaseExtractor):
     api_restpoint = "https://api.semanticscholar.org/v1/"
     name = "semantic_scholar"
     version = "0.1"
+    reads = ("meta",)
+    writes = ("meta",)
 
     def __init__(self, config,session,**kwargs):
         self._config = config
@@ -21,7 +21,7 @@ class SemanticScholarExtractor(BaseExtractor):
 
     def get_paper_info(self):
         paper_api_restpoint = self.api_restpoint + "paper/" + self.doi_number
-        r = requests.get(paper_api_restpoint)
+        r = new_http_session(self.config).get(paper_api_restpoint)
         if r.status_code == 200:
             self.paper_info = r.json()
 
@@ -51,10 +51,8 @@ class SemanticScholarExtractor(BaseExtractor):
             references = json.dumps(self.get_references())
 
             # Enrich the artifact here.
-            self.session.artifact.meta.append(
-                ArtifactMetadata(
-                    name="citations", value=citations, type="text/json", source="semantic_scholar"))
+            self.add_metadata(
+                name="citations", value=citations, type="text/json", source="semantic_scholar")
 
-            self.session.artifact.meta.append(
-                ArtifactMetadata(
-                    name="references", value=references, type="text/json", source="semantic_scholar"))
+            self.add_metadata(
+                name="references", value=references, type="text/json", source="semantic_scholar")
@@ -4,25 +4,22 @@ import logging
 import sys
 import os.path
 import os
-import requests
 import json
 
-import nltk
-from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from collections import Counter
 
 from searcch.importer.extractor import BaseKeywordExtractor
-from searcch.importer.db.model import (
-    ArtifactMetadata, ArtifactTag )
+from searcch.importer.extractor.registry import (
+    resource,get_resource,resource_path )
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
 def requests_download(url,destpath,retries=2,interval=2):
     while retries >= 0:
         try:
-            session = requests.session()
-            response = session.get(url,stream=True,timeout=4)
+            response = new_http_session().get(url,stream=True,timeout=4)
             response.raise_for_status()
             fd = open(destpath,'wb')
             for buf in response.iter_content(4096):
@@ -35,6 +32,18 @@ def requests_download(url,destpath,retries=2,interval=2):
         retries -= 1
     return None
 
+COMMON_WORDS_URL = "https://github.com/first20hours/google-10000-english/raw/master/google-10000-english-no-swears.txt"
+
+def fetch_common_words(config,dest):
+    requests_download(COMMON_WORDS_URL,dest)
+
+@resource("common_words",path="google-10000-english-no-swears.txt",
+          fetch=fetch_common_words)
+def load_common_words(config):
+    """The 10000 most common English words (google-10000-english), as a frozenset."""
+    with open(resource_path(config,"common_words"),"rb") as f:
+        return frozenset(f.read().decode().split())
+
 class TopKeywordsExtractor(BaseKeywordExtractor):
     """A simple extractor that grabs the top N keywords from an ArtifactFile that is a PDF."""
     name = "top_keywords"
@@ -43,33 +52,18 @@ class TopKeywordsExtractor(BaseKeywordExtractor):
     def __init__(self,config,session,**kwargs):
         self._config = config
         self._session = session
-        self._common_words = []
-        self._stop_words = set()
+        self._common_words = frozenset()
+        self._stop_words = frozenset()
         self._loaded = False
 
     def load(self):
+        """Loads our resources.  If the common words list fails to load, we fail rather than compute (and memoize) keywords that include common words."""
         if self._loaded:
             return
-        LOG.debug("loading nltk and token data")
-        tmpdir = self.config["DEFAULT"]["tmpdir"]
-        try:
-            if not nltk.corpus.stopwords.fileids:
-                nltk.download('stopwords')
-        except:
-            nltk.download('stopwords')
-        self._stop_words = set(stopwords.words("english"))
-        nltk.download("punkt")
-        cw_url = "https://github.com/first20hours/google-10000-english/raw/master/google-10000-english-no-swears.txt"
-        top_file = os.path.join(tmpdir,"google-10000-english-no-swears.txt")
-        try:
-            if not os.path.exists(top_file):
-                requests_download(cw_url,top_file)
-            with open(top_file,"rb") as f:
-                self._common_words = set(f.read().decode().split())
-            self._loaded = True
-        except:
-            LOG.warning("failed to download google-10000-english-no-swears.txt")
-            LOG.exception(sys.exc_info()[1])
+        self._stop_words = get_resource("nltk_stopwords",self.config)
+        get_resource("nltk_punkt",self.config)
+        self._common_words = get_resource("common_words",self.config)
+        self._loaded = True
 
     def clean(self,line):
         # tokenize, ignore non-alpha's and stop or common words
@@ -77,27 +71,25 @@ class TopKeywordsExtractor(BaseKeywordExtractor):
             w in self._stop_words or w in self._common_words)]
         return(list(filter(None, stripped)))
 
-    def extract_keywords(self,text,source=None):
-        LOG.debug("extracting keywords (%s) from %s",
-                  getattr(self.__class__,"name",None),source)
+    def compute_keywords(self,text):
+        LOG.debug("computing keywords (%s)",getattr(self.__class__,"name",None))
 
         self.load()
 
         counts = Counter(self.clean(text.lower()))
-        if not len(counts):
+        return [list(x) for x in counts.most_common(10)]
+
+    def apply_keywords(self,keywords,source=None):
+        if not len(keywords):
             LOG.debug("no keywords found in %r" % (source,))
             return False
 
-        top = counts.most_common(10)
-        for (kw,count) in top:
+        for (kw,count) in keywords:
             # Don't add duplicate tags.
-            if not self.session.artifact.has_tag(kw,ignore_case=True):
+            if self.add_tag(kw,source="top_keywords"):
                 LOG.debug("top_keywords found kw %s (%r)",kw,count)
-                self.session.artifact.tags.append(
-                    ArtifactTag(tag=kw,source="top_keywords"))
 
-        top_keywords = json.dumps(top, separators=(',', ':'))
-        self.session.artifact.meta.append(
-            ArtifactMetadata(
-                name="top_keywords",value=top_keywords,source="top_keywords",type="json"))
+        top_keywords = json.dumps(keywords, separators=(',', ':'))
+        self.add_metadata(
+            name="top_keywords",value=top_keywords,source="top_keywords",type="json")
         return True
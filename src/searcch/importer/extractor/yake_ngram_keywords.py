@@ -10,11 +10,15 @@ import json
 import yake
 
 from searcch.importer.extractor import BaseKeywordExtractor
-from searcch.importer.db.model import (
-    ArtifactMetadata, ArtifactTag )
+from searcch.importer.extractor.registry import ( resource,get_resource )
 
 LOG = logging.getLogger(__name__)
 
+@resource("yake_keyword_extractor")
+def load_yake_extractor(config):
+    """A default yake.KeywordExtractor; it keeps no per-document state, so it is shared."""
+    return yake.KeywordExtractor()
+
 class YakeNGramKeywordsExtractor(BaseKeywordExtractor):
     """Uses the Yet Another Keyword Extractor to extract keywords from text files."""
     name = "yake_ngram_keywords"
@@ -24,25 +28,26 @@ class YakeNGramKeywordsExtractor(BaseKeywordExtractor):
         self._config = config
         self._session = session
 
-    def extract_keywords(self,text,source=None):
-        LOG.debug("extracting keywords (%s) from %r",
-                  getattr(self.__class__,"name",None),source)
+    def load(self):
+        return get_resource("yake_keyword_extractor",self.config)
+
+    def compute_keywords(self,text):
+        LOG.debug("computing keywords (%s)",getattr(self.__class__,"name",None))
+
+        ext = self.load()
+        return [list(x) for x in ext.extract_keywords(text)]
 
-        ext = yake.KeywordExtractor()
-        top_keywords = ext.extract_keywords(text)
-        if not len(top_keywords):
+    def apply_keywords(self,keywords,source=None):
+        if not len(keywords):
             LOG.debug("no top ngram keywords found in %r",source)
             return False
 
-        for (kw,rank) in top_keywords:
+        for (kw,rank) in keywords:
             # Don't add duplicate tags.
-            if not self.session.artifact.has_tag(kw,ignore_case=True):
+            if self.add_tag(kw,source="yake_ngram_keywords"):
                 LOG.debug("yake found kw %s (%r)",kw,rank)
-                self.session.artifact.tags.append(
-                    ArtifactTag(tag=kw,source="yake_ngram_keywords"))
 
-        top_keywords = json.dumps(top_keywords, separators=(',', ':'))
-        self.session.artifact.meta.append(
-            ArtifactMetadata(
-                name="top_ngram_keywords",value=top_keywords,source="yake_ngram_keywords",type="json"))
+        top_keywords = json.dumps(keywords, separators=(',', ':'))
+        self.add_metadata(
+            name="top_ngram_keywords",value=top_keywords,source="yake_ngram_keywords",type="json")
         return True
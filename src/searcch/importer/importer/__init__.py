@@ -6,13 +6,27 @@ import os
 import os.path
 import shutil
 import sys
+import re
+import time
+import json
+import datetime
 import logging
+import threading
+import concurrent.futures
+from urllib.parse import urlparse
+from sqlalchemy import or_,and_
 
 from searcch.importer.db.model import (
-    Importer,Person,User,License)
-from searcch.importer.util.retrieve import Retriever
-from searcch.importer.extractor import get_extractors
+    Importer,Person,User,License,Artifact,ExtractionResult)
+from searcch.importer.util.retrieve import (
+    Retriever,ByteBudget,RetrievedFile)
+from searcch.importer.util.unpack import Unpacker
+from searcch.importer.util.unpack.archive import ArchiveView
+from searcch.importer.extractor import (
+    get_extractors,get_extractor_stages,BaseKeywordExtractor)
 from searcch.importer.util import bytes2str
+from searcch.importer.util.url import normalize_url
+from searcch.importer.exceptions import ResourceUnavailableError
 import searcch.importer.importer.config
 
 LOG = logging.getLogger(__name__)
@@ -22,6 +36,15 @@ class BaseImporter(object):
     """An abstract base class that any Importer must subclass."""
     name = None
     version = None
+    #
+    # A list of regular expressions that identify URLs this importer can
+    # definitely import, without any network probing.  Each pattern is
+    # matched (anchored at the start) against the lowercased URL hostname
+    # concatenated with the URL path (e.g. "github.com/owner/repo").  If a URL
+    # matches no importer's patterns, we fall back to calling each importer's
+    # can_import method.
+    #
+    url_patterns = ()
 
     def __init__(self,config,session):
         self._config = config
@@ -76,6 +99,11 @@ class BaseImporter(object):
     def can_import(cls,url):
         """Checks to see if this URL can be imported by this Importer."""
 
+    @classmethod
+    def canonical_url(cls,url):
+        """Returns a canonical form of `url`, shared by all URLs this Importer would import as the same artifact.  Never touches the network; importers override this to add their own rewrites."""
+        return normalize_url(url)
+
     @abc.abstractmethod
     def import_artifact(self,candidate):
         """Imports an artifact from the given CandidateArtifact and returns an Artifact."""
@@ -118,13 +146,72 @@ def get_importer_names():
     load_importers()
     return __importers__.keys()
 
-def validate_url(url,retries=0,interval=None):
+__url_matcher__ = None
+
+def get_url_matcher():
+    """Returns a single compiled regex that is the alternation of all loaded importers' url_patterns, in importer priority (registration) order.  Each importer's patterns are wrapped in a named group so that a match identifies the importer."""
+    global __url_matcher__
+
+    if __url_matcher__ is not None:
+        return __url_matcher__
+    load_importers()
+    alternatives = []
+    i = 0
+    for name in __importers__:
+        patterns = getattr(__importers__[name],"url_patterns",None)
+        if not patterns:
+            continue
+        alternatives.append("(?P<_i%d>%s)" % (
+            i,"|".join(["(?:%s)" % (p,) for p in patterns])))
+        i += 1
+    __url_matcher__ = (re.compile("|".join(alternatives) or "(?!)"),
+                       [n for n in __importers__
+                        if getattr(__importers__[n],"url_patterns",None)])
+    return __url_matcher__
+
+def match_importer(url):
+    """Returns the name of the highest-priority importer whose url_patterns match `url`, or None.  Never touches the network."""
+    try:
+        up = urlparse(url)
+        key = (up.hostname or "") + up.path
+    except Exception:
+        return None
+    (regex,names) = get_url_matcher()
+    m = regex.match(key)
+    if not m:
+        return None
+    for (group,value) in iteritems(m.groupdict()):
+        if value is not None:
+            return names[int(group[2:])]
+    return None
+
+def canonical_url(url,name=None):
+    """Returns the canonical form of `url` defined by importer `name`, or by the importer whose url_patterns match `url`; or its generic normal form.  Never touches the network."""
+    load_importers()
+    if not name:
+        name = match_importer(url)
+    if name in __importers__:
+        try:
+            return __importers__[name].canonical_url(url)
+        except:
+            LOG.debug("failed to canonicalize %r with %s",url,name,exc_info=True)
+    return normalize_url(url)
+
+def find_artifact(session,url,name=None):
+    """Returns the most recently created Artifact whose canonical URL is that of `url` (or, if it has no canonical URL, whose URL is `url`), or None.  Use this to avoid importing an artifact that already exists."""
+    return session.query(Artifact)\
+      .filter(or_(Artifact.canonical_url == canonical_url(url,name=name),
+                  and_(Artifact.canonical_url == None,Artifact.url == url)))\
+      .order_by(Artifact.ctime.desc()).first()
+
+def validate_url(url,retries=0,interval=None,config=None):
     import requests
+    from searcch.importer.util.http import new_http_session
     errors = []
     while retries >= 0:
         retries -= 1
         try:
-            requests.head(url)
+            new_http_session(config).head(url)
         except requests.exceptions.RequestException:
             if retries < 0:
                 six.reraise(*sys.exc_info())
@@ -134,43 +221,124 @@ def validate_url(url,retries=0,interval=None):
                 six.reraise(*sys.exc_info())
 
 def get_importer(url,config,session,name=None,retries=0,interval=None):
+    """Returns an instance of importer `name`, or of the importer that can import `url`, or None.  An importer whose url_patterns match `url` is chosen without touching the network; otherwise `url` is validated (see validate_url), and the importers are probed."""
     load_importers()
-    if (not url.endswith(".web")):
-        validate_url(url,retries=retries,interval=interval)
     if name:
         if not name in __importers__:
             raise NotImplementedError("no such importer %r" % (name,))
-        return __importers__[name]()
-    else:
-        for name in __importers__:
+        if (not url.endswith(".web")):
+            validate_url(url,retries=retries,interval=interval,config=config)
+        return __importers__[name](config,session)
+    if config["importer"].getboolean("url_patterns"):
+        name = match_importer(url)
+        if name:
             try:
-                cls = __importers__[name]
-                i = cls(config,session)
-                if i.can_import(url):
-                    print("Returning ", i)
-                    return i
+                i = __importers__[name](config,session)
+                LOG.debug("url %r matched %s importer url_patterns",url,name)
+                return i
             except Exception:
-                LOG.debug("unexpected error in %s.can_import:",
+                LOG.debug("unexpected error instantiating %s; probing:",
                           name,exc_info=sys.exc_info())
+    if (not url.endswith(".web")):
+        validate_url(url,retries=retries,interval=interval,config=config)
+    if config["importer"]["probe_mode"] == "concurrent":
+        return _probe_importers_concurrent(url,config,session)
+    return _probe_importers_serial(url,config,session)
+
+def _probe_importer(name,i,url,stop=None):
+    """Calls `i.can_import(url)`, logging its result and latency; returns False without probing if `stop` (a threading.Event) is set."""
+    if stop is not None and stop.is_set():
+        return False
+    t = time.time()
+    res = False
+    try:
+        res = i.can_import(url)
+    except Exception:
+        LOG.debug("unexpected error in %s.can_import:",
+                  name,exc_info=sys.exc_info())
+    LOG.info("probe %s.can_import(%r): %r (%.3fs)",
+             name,url,bool(res),time.time() - t)
+    return res
+
+def _probe_importers_serial(url,config,session):
+    for name in __importers__:
+        try:
+            cls = __importers__[name]
+            i = cls(config,session)
+        except Exception:
+            LOG.debug("unexpected error instantiating %s:",
+                      name,exc_info=sys.exc_info())
+            continue
+        if _probe_importer(name,i,url):
+            return i
+    return None
+
+def _probe_importers_concurrent(url,config,session):
+    """Runs importers' can_import probes concurrently ([importer] probe_workers at a time), but returns the highest-priority (in load_importers order) importer that can import `url`.  Once it is known, or the probe_timeout passes, probes that have not yet started are skipped; probes already running cannot be interrupted, and finish in the background."""
+    candidates = []
+    for name in __importers__:
+        try:
+            candidates.append((name,__importers__[name](config,session)))
+        except Exception:
+            LOG.debug("unexpected error instantiating %s:",
+                      name,exc_info=sys.exc_info())
+    if not candidates:
         return None
+    workers = config["importer"].getint("probe_workers") or len(candidates)
+    timeout = config["importer"].getint("probe_timeout") or None
+    deadline = None
+    if timeout:
+        deadline = time.time() + timeout
+    stop = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(workers,len(candidates)),
+        thread_name_prefix="importer-probe")
+    futures = [ executor.submit(_probe_importer,name,i,url,stop=stop)
+                for (name,i) in candidates ]
+    ret = None
+    try:
+        for (idx,(name,i)) in enumerate(candidates):
+            remaining = None
+            if deadline:
+                remaining = max(0,deadline - time.time())
+            try:
+                if futures[idx].result(timeout=remaining):
+                    ret = i
+                    break
+            except concurrent.futures.TimeoutError:
+                LOG.warning("probe %s.can_import(%r) timed out after %ds",
+                            name,url,timeout)
+    finally:
+        stop.set()
+        for f in futures:
+            f.cancel()
+        executor.shutdown(wait=False)
+    return ret
 
 class ImportSession(object):
-    """A helper class that contains and manages state (e.g. temporary filesystem content) accumulated during an import session -- retrieval, unpacking, extraction(s)."""
+    """A helper class that contains and manages state (e.g. temporary filesystem content) accumulated during an import session -- retrieval, unpacking, extraction(s).  If `defer_results` is set, extraction results are not saved to `session`; the caller saves `results` itself (see save_extraction_results)."""
 
-    def __init__(self,config,session,artifact,sessionid=None):
+    def __init__(self,config,session,artifact,sessionid=None,
+                 defer_results=False):
         self._config = config
         self._session = session
         self._artifact = artifact
         self._retrieved_files = []
         self._sessionid_journal_path = os.path.join(
             config["DEFAULT"]["tmpdir"],".last_sessionid")
-        self._sessionid = sessionid or self._get_next_sessionid()
+        if sessionid is None:
+            sessionid = self._get_next_sessionid()
+        self._sessionid = sessionid
         self._session_destdir = os.path.join(
             config["DEFAULT"]["tmpdir"],str(self._sessionid))
         self._artifact_destdir = os.path.join(
             config["DEFAULT"]["tmpdir"],str(self._sessionid))
         self._general_text = ""
         self._general_text_source_map = dict()
+        self._db_lock = threading.RLock()
+        self._result_cache = config["extract"].getboolean("result_cache")
+        self._results = dict()
+        self._defer_results = defer_results
         if self.artifact.title:
             self.add_general_text(self.artifact.title,artifact_field="title")
         if self.artifact.description:
@@ -185,11 +353,15 @@ class ImportSession(object):
             except:
                 pass
             f.close()
-        sd = os.path.join(self.config["DEFAULT"]["tmpdir"],str(n))
-        while os.path.exists(sd):
-            n += 1
+        # Concurrent sessions may race for the same id; whoever creates the
+        # directory owns it.
+        while True:
             sd = os.path.join(self.config["DEFAULT"]["tmpdir"],str(n))
-        os.makedirs(sd)
+            try:
+                os.makedirs(sd)
+                break
+            except FileExistsError:
+                n += 1
         f = open(self._sessionid_journal_path,'w')
         f.write(str(n))
         f.close()
@@ -199,6 +371,11 @@ class ImportSession(object):
     def id(self):
         return self._sessionid
 
+    @property
+    def db_lock(self):
+        """Serializes database session use by concurrent extractors."""
+        return self._db_lock
+
     @property
     def config(self):
         return self._config
@@ -265,23 +442,168 @@ class ImportSession(object):
         self._general_text += "\n\n" + text
         return True
 
+    def checkpoint_state(self):
+        """Returns a picklable description of this session's retrieved files (by index into the artifact's files), so that an interrupted import can resume after its retrieve phase; see restore_state."""
+        files = list(self.artifact.files)
+        retrieved = []
+        for rf in self.retrieved_files:
+            try:
+                i = files.index(rf.artifact_file)
+            except ValueError:
+                continue
+            retrieved.append(dict(
+                index=i,destdir=rf.destdir,raw_path=rf.raw_path,
+                unpacked_path=rf.path if rf.path != rf.raw_path else None,
+                mime_type=rf.mime_type,mime_desc=rf.mime_desc))
+        return dict(sessionid=self.id,retrieved=retrieved)
+
+    def restore_state(self,state):
+        """Restores the retrieved files described by `state` (from checkpoint_state), if their content still exists.  Returns False if any is missing, in which case the caller should retrieve again."""
+        files = list(self.artifact.files)
+        retrieved = []
+        for x in state.get("retrieved",[]):
+            if x["index"] >= len(files) or not os.path.exists(x["raw_path"]):
+                return False
+            unpacked_path = x.get("unpacked_path")
+            if unpacked_path and not os.path.exists(unpacked_path):
+                unpacked_path = None
+            # Reopen the archive, so that members that were not unpacked
+            # can still be extracted on demand.
+            archive = None
+            if unpacked_path and os.path.isdir(unpacked_path):
+                archive = ArchiveView.open(
+                    x["raw_path"],**Unpacker(self.config).limits)
+            retrieved.append(RetrievedFile(
+                files[x["index"]],x["destdir"],x["raw_path"],
+                unpacked_path=unpacked_path,mime_type=x.get("mime_type"),
+                mime_desc=x.get("mime_desc"),archive=archive))
+        self._retrieved_files = retrieved
+        return True
+
     def retrieve_all(self):
+        """Retrieves all the artifact's files, concurrently if the [retrieve] workers config is greater than 1.  The total bytes retrieved (downloaded or from the blob cache) are limited by [retrieve] session_max_bytes; retrieved files are kept in artifact file order.  Worker threads do not modify the ArtifactFiles; their updates (e.g. sizes) are applied in this thread."""
         r = Retriever(self.config)
-        i = 0
-        for af in self.artifact.files:
-            destdir = os.path.join(self._artifact_destdir,str(i))
-            rf = r.retrieve(af,self.artifact,destdir=destdir)
+        budget = ByteBudget(
+            max(0,self.config["retrieve"].getint("session_max_bytes") or 0))
+        workers = self.config["retrieve"].getint("workers") or 1
+        files = list(self.artifact.files)
+        # Load lazy relationships in this thread; the database session must
+        # not be used from the worker threads.
+        list(self.artifact.meta)
+        jobs = [ (i,af,os.path.join(self._artifact_destdir,str(i)))
+                 for (i,af) in enumerate(files) ]
+        results = [ None for x in jobs ]
+        if workers <= 1 or len(jobs) <= 1:
+            for (i,af,destdir) in jobs:
+                results[i] = r.retrieve(
+                    af,self.artifact,destdir=destdir,budget=budget)
+        else:
+            errors = [ None for x in jobs ]
+            updates = [ dict() for x in jobs ]
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(workers,len(jobs)),
+                    thread_name_prefix="retrieve") as executor:
+                futures = dict()
+                for (i,af,destdir) in jobs:
+                    futures[executor.submit(
+                        r.retrieve,af,self.artifact,destdir=destdir,
+                        budget=budget,updates=updates[i])] = i
+                for f in concurrent.futures.as_completed(futures):
+                    i = futures[f]
+                    try:
+                        results[i] = f.result()
+                    except Exception:
+                        errors[i] = sys.exc_info()
+            for (i,af,destdir) in jobs:
+                for (k,v) in iteritems(updates[i]):
+                    setattr(af,k,v)
+            # Preserve serial semantics: fail with the first file's error.
+            for e in errors:
+                if e:
+                    six.reraise(*e)
+        for rf in results:
             if rf:
                 self._retrieved_files.append(rf)
                 LOG.debug("retrieved file: %r" % (rf,))
-            i += 1
+        LOG.debug("retrieved %d/%d files (%d bytes)",
+                  len(self._retrieved_files),len(jobs),budget.used)
+
+    def lookup_result(self,extractor,version,digest):
+        """Returns the memoized result (a JSON value; see ExtractionResult) of `extractor` at `version` on the content whose SHA-256 digest is `digest`, or None."""
+        if not self._result_cache:
+            return None
+        key = (digest,extractor,version)
+        with self.db_lock:
+            if key in self._results:
+                return self._results[key]
+            with self.session.no_autoflush:
+                row = self.session.query(ExtractionResult.result)\
+                  .filter(ExtractionResult.hash == digest)\
+                  .filter(ExtractionResult.extractor == extractor)\
+                  .filter(ExtractionResult.version == version).first()
+        if row is None:
+            return None
+        LOG.debug("reusing %s result for 0x%s",extractor,digest.hex())
+        return json.loads(row[0])
+
+    def store_result(self,extractor,version,digest,result):
+        """Records `result` (a JSON value) as the result of `extractor` at `version` on the content whose SHA-256 digest is `digest`; see save_results."""
+        if not self._result_cache:
+            return
+        with self.db_lock:
+            self._results[(digest,extractor,version)] = result
+
+    @property
+    def results(self):
+        """A dict of the results recorded by store_result, keyed by (digest,extractor,version)."""
+        with self.db_lock:
+            return dict(self._results)
+
+    def save_results(self):
+        """Adds the results recorded by store_result to the extraction_results table, in the database session's current transaction.  Results that are already present are skipped, so this may be called more than once."""
+        with self.db_lock:
+            save_extraction_results(self.session,self._results)
 
     def extract_all(self,skip=[]):
-        """Runs all extractors (except those identified in the `skip` arg) across the artifact and its content."""
-        for ext in get_extractors(self.config,self):
-            if skip and ext.name in skip:
-                continue
-            ext.extract()
+        """Runs all extractors (except those identified in the `skip` arg) across the artifact and its content.  With [extract] workers > 1, extractors that do not conflict (see get_extractor_stages) run concurrently; each stage's staged authors, tags and metadata are merged in extractor order once it finishes, so the result does not depend on timing.  New extractor results are then saved (see save_results)."""
+        extractors = [ext for ext in get_extractors(self.config,self)
+                      if not (skip and ext.name in skip)]
+        workers = self.config["extract"].getint("workers")
+        try:
+            if workers <= 1:
+                for ext in extractors:
+                    _run_extractor(ext.extract,ext.name)
+                    ext.merge()
+                return
+            # Load lazy relationships that extractors check while staging
+            # (see BaseExtractor.add_tag) in this thread.
+            list(self.artifact.tags)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for stage in get_extractor_stages(extractors):
+                    LOG.debug("running extractors %r",[ext.name for ext in stage])
+                    futures = [executor.submit(_run_extractor,ext.extract,ext.name)
+                               for ext in stage]
+                    error = None
+                    for future in futures:
+                        try:
+                            future.result()
+                        except:
+                            if error is None:
+                                error = sys.exc_info()
+                    for ext in stage:
+                        ext.merge()
+                    if error:
+                        six.reraise(*error)
+        finally:
+            self._save_results_quietly()
+
+    def _save_results_quietly(self):
+        if self._defer_results:
+            return
+        try:
+            self.save_results()
+        except:
+            LOG.warning("failed to save extraction results",exc_info=True)
 
     def remove_retrieved_files(self):
         """Removes all temporary filesystem content for each retrieved file."""
@@ -301,6 +623,8 @@ class ImportSession(object):
 
     def finalize(self):
         """Automatically fills in as many unset fields in the main Artifact object as possible, as necessary to be in compliance with the schema; although there are no good choices."""
+        if not self.artifact.canonical_url and self.artifact.url:
+            self.artifact.canonical_url = canonical_url(self.artifact.url)
         if not self.artifact.title:
             if self.artifact.name:
                 self.artifact.title = self.artifact.name
@@ -310,3 +634,42 @@ class ImportSession(object):
     def __repr__(self):
         return "<ImportSession(id=%r,artifact=%r)>" % (
             self.id,self.artifact)
+
+def _run_extractor(fn,name):
+    """Runs extractor method `fn`.  An extractor whose models or corpora are unavailable (see [resources] allow_download) is skipped with a warning, rather than failing the import."""
+    try:
+        fn()
+    except ResourceUnavailableError:
+        LOG.warning("skipping extractor %s: %s",name,sys.exc_info()[1])
+
+def save_extraction_results(session,results):
+    """Adds `results` (see ImportSession.results) to the extraction_results table, in `session`'s current transaction, skipping any that are already present."""
+    if not results:
+        return
+    now = datetime.datetime.now()
+    rows = [dict(hash=digest,extractor=extractor,version=version,
+                 result=json.dumps(result,separators=(',',':')),ctime=now)
+            for ((digest,extractor,version),result) in results.items()]
+    ExtractionResult.insert_ignore(session,rows)
+
+def extract_all_batch(import_sessions,skip=[]):
+    """Runs all extractors (except those in `skip`) on each ImportSession in `import_sessions`, like ImportSession.extract_all; but the keyword extractors run last, each over the documents of all the sessions as one batch (see BaseKeywordExtractor.extract_batch).  Keywords are still attributed to each session's own artifact."""
+    if not import_sessions:
+        return
+    batched = [
+        [ext for ext in get_extractors(imp_session.config,imp_session)
+         if isinstance(ext,BaseKeywordExtractor) and not (skip and ext.name in skip)]
+        for imp_session in import_sessions]
+    names = [ext.name for ext in batched[0]]
+    try:
+        for imp_session in import_sessions:
+            imp_session.extract_all(skip=list(skip) + names)
+        for i in range(0,len(names)):
+            extractors = [exts[i] for exts in batched]
+            _run_extractor(
+                lambda: extractors[0].extract_batch(extractors),names[i])
+            for ext in extractors:
+                ext.merge()
+    finally:
+        for imp_session in import_sessions:
+            imp_session._save_results_quietly()
@@ -1,5 +1,6 @@
 from future.utils import raise_from
 import sys
+import re
 import six
 import logging
 import time
@@ -16,6 +17,7 @@ from searcch.importer.db.model import (
     Artifact,ArtifactFile,ArtifactMetadata,ArtifactRelease,User,Person,
     Importer,Affiliation,ArtifactAffiliation,Badge,ArtifactBadge,
     RecurringVenue,Venue,ArtifactVenue)
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -34,12 +36,16 @@ class AcmDigitalLibraryImporter(BaseImporter):
 
     name = "acm_dl"
     version = "0.1"
+    url_patterns = (
+        r"dl\.acm\.org/doi/",
+        r"doi\.org/10\.1145/",
+    )
 
     @classmethod
     def _extract_doi(cls,url,session=None):
         try:
             if not session:
-                session = requests.session()
+                session = new_http_session()
             urlobj = urlparse(url)
             #
             # The ACM DL has added a nasty chain of redirects through
@@ -77,6 +83,17 @@ class AcmDigitalLibraryImporter(BaseImporter):
             LOG.exception(sys.exc_info()[1])
         return (None,None)
 
+    @classmethod
+    def canonical_url(cls,url):
+        """Rewrites dl.acm.org/doi URLs (abstract, pdf, full text) to their doi.org URL."""
+        urlobj = urlparse(url)
+        if (urlobj.hostname or "").lower() == "dl.acm.org":
+            m = re.match(r"^/doi/(?:(?:abs|pdf|epdf|full|fullHtml)/)?(10\.\d+/.+)$",
+                         urlobj.path)
+            if m:
+                url = "https://doi.org/" + m.group(1)
+        return super(AcmDigitalLibraryImporter,cls).canonical_url(url)
+
     @classmethod
     def can_import(cls,url):
         """Checks to see if this URL is a doi.org or dl.acm.org/doi URL."""
@@ -89,7 +106,7 @@ class AcmDigitalLibraryImporter(BaseImporter):
         """Imports an artifact from the ACM Digital Library and returns an Artifact, or throws an error."""
         url = candidate.url
         LOG.debug("importing '%s' from ACM Digital Library" % (url,))
-        session = requests.session()
+        session = new_http_session(self.config)
         (res,doi) = self.__class__._extract_doi(url,session=session)
 
         firstpage = res.content
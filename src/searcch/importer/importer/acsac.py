@@ -20,6 +20,7 @@ from searcch.importer.db.model import (
     Badge, ArtifactBadge, RecurringVenue, Venue, ArtifactVenue,
     CandidateArtifact, CandidateArtifactRelationship)
 from searcch.importer.exceptions import MissingMetadataError
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -28,6 +29,10 @@ class ACSACImporter(BaseImporter):
 
     name = "acsac"
     version = "0.1"
+    url_patterns = (
+        r"([^/]+\.)?acsac\.org(/|$)",
+        r"([^/]+\.)?openconf\.org/acsac",
+    )
     acsac_default_desc = "The Annual Computer Security Applications Conference (ACSAC) brings together cutting-edge researchers, with a broad cross-section of security professionals drawn from academia, industry, and government, gathered to present and discuss the latest security results and topics. With peer reviewed technical papers, invited talks, panels, national interest discussions, and workshops, ACSAC continues its core mission of investigating practical solutions for computer and network security technology."
 
     @classmethod
@@ -35,8 +40,8 @@ class ACSACImporter(BaseImporter):
         """Checks to see if this URL is an acsac.org or openconf.org/acsac* URL."""
         try:
             if not session:
-                session = requests.session()
-            res = requests.get(url)
+                session = new_http_session()
+            res = session.get(url)
             urlobj = urlparse(res.url)
             if urlobj.netloc.endswith("acsac.org") \
               or (urlobj.netloc.endswith("openconf.org") \
@@ -54,7 +59,7 @@ class ACSACImporter(BaseImporter):
         umatch = re.match("^\/((20\d\d)|acsac(20\d\d))\/.*$", urlobj.path)
         if umatch:
             year = umatch.group(1).replace("acsac","")
-        page = requests.get(url)
+        page = new_http_session(self.config).get(url)
         soup = bs4.BeautifulSoup(page.content, 'html.parser')
 
         elm = soup.find('div',id="oc_program_summary_main")
@@ -111,7 +116,7 @@ class ACSACImporter(BaseImporter):
         venues = []
         if year:
             vurl = "https://www.acsac.org/%s" % (year,)
-            vpage = requests.get(vurl)
+            vpage = new_http_session(self.config).get(vurl)
             vsoup = bs4.BeautifulSoup(vpage.content, 'html.parser')
             vdesc = None
             vdesc_elm = vsoup.find("div", class_="acsac-prose")
@@ -207,7 +212,7 @@ class ACSACImporter(BaseImporter):
                 aurl = "https://www.acsac.org/%s/artifacts" % (year,)
             else:
                 aurl = "https://www.acsac.org/%s/program/artifacts" % (year,)
-            apage = requests.get(aurl)
+            apage = new_http_session(self.config).get(aurl)
             if apage.ok:
                 # Must use html5lib because ACSAC pages use unclosed <img>
                 # tags, and that screws up the hierarchy of <li> tags for
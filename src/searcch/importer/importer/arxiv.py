@@ -1,14 +1,14 @@
 import logging
 import datetime
-import atoma, requests
+import atoma
 from urllib.parse import urlparse
-import urllib, urllib.request
 import arxiv
 
 from searcch.importer.importer import BaseImporter
 from searcch.importer.db.model import (
     Artifact,ArtifactFile,ArtifactMetadata,ArtifactRelease,User,Person,
     Importer,Affiliation,ArtifactAffiliation,ArtifactTag )
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -17,12 +17,14 @@ class ArxivImporter(BaseImporter):
 
     name = "arxiv"
     version = "0.1"
+    url_patterns = (
+        r"arxiv\.org/(abs|pdf)/",
+    )
 
     @classmethod
     def _extract_record_id(self, url):
         try:
-            #session = requests.session()
-            res = requests.get(url)
+            res = new_http_session().get(url)
             urlobj = urlparse(res.url)
             if urlobj.netloc == "arxiv.org" \
               and (urlobj.path.startswith("/abs/") or urlobj.path.startswith("/pdf/")): # check for pdf file as well
@@ -38,21 +40,34 @@ class ArxivImporter(BaseImporter):
             return True
         return False
 
+    @classmethod
+    def canonical_url(cls,url):
+        """Rewrites arxiv.org /pdf/ URLs to their /abs/ page."""
+        urlobj = urlparse(url)
+        if (urlobj.hostname or "").lower() in ("arxiv.org","www.arxiv.org") \
+          and urlobj.path.startswith("/pdf/"):
+            paper_id = urlobj.path[len("/pdf/"):].rstrip("/")
+            if paper_id.endswith(".pdf"):
+                paper_id = paper_id[:-4]
+            url = "https://arxiv.org/abs/" + paper_id
+        return super(ArxivImporter,cls).canonical_url(url)
+
     def import_artifact(self, candidate):
         """Imports an artifact from Arxiv and returns an Artifact"""
         url = candidate.url.replace('/pdf/','/abs/').replace(".pdf","")
         LOG.debug("importing '%s' from Arxiv" % (url,))
         arxiv_url = "http://export.arxiv.org/api/query?"
 
-        session = requests.session()
-        res = requests.get(url)
+        session = new_http_session(self.config)
+        res = session.get(url)
         urlobj = urlparse(res.url)
 
         if urlobj.netloc == "arxiv.org" and urlobj.path.startswith("/abs/"):
             paper_id = urlobj.path[len("/abs/"):].rstrip("/")
             arxiv_url = arxiv_url + "id_list=" + paper_id
-            arxiv_url_response = urllib.request.urlopen(arxiv_url)
-            article_content = arxiv_url_response.read()
+            arxiv_url_response = session.get(arxiv_url)
+            arxiv_url_response.raise_for_status()
+            article_content = arxiv_url_response.content
             feed = atoma.parse_atom_bytes(article_content)
 
             artifacts = []
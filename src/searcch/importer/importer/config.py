@@ -2,6 +2,19 @@
 from searcch.importer.util.config import (
     config_section,ConfigSection )
 
+@config_section
+class ImporterConfigSection(ConfigSection):
+
+    @classmethod
+    def section_name(cls):
+        return "importer"
+
+    @classmethod
+    def section_defaults(cls):
+        return dict(
+            url_patterns="true",probe_mode="concurrent",probe_workers="4",
+            probe_timeout="120",follow_workers="1",follow_max_depth="0")
+
 @config_section
 class GithubConfigSection(ConfigSection):
 
@@ -10,8 +10,11 @@ import giturlparse
 import requests
 
 import github
+import github.Requester
 from github import Github,GithubException
 
+from urllib.parse import urlparse
+
 from searcch.importer.importer import BaseImporter
 from searcch.importer.exceptions import HttpError
 from searcch.importer.db.model import (
@@ -19,9 +22,28 @@ from searcch.importer.db.model import (
     Importer,Affiliation,ArtifactAffiliation,ArtifactFileMember,
     ArtifactTag,FileContent)
 from searcch.importer.db.model.license import recognize_license
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
+class SharedHTTPSRequestsConnection(github.Requester.HTTPSRequestsConnectionClass):
+    """A PyGithub connection that sends its requests through a session from new_http_session, instead of a private session and adapter, so that GitHub API requests share our connection pools, response cache and [ratelimit] limits."""
+
+    def __init__(self,host,port=None,strict=False,timeout=None,retry=None,
+                 pool_size=None,**kwargs):
+        self.port = port if port else 443
+        self.host = host
+        self.protocol = "https"
+        self.timeout = timeout
+        self.verify = kwargs.get("verify",True)
+        self.session = new_http_session()
+
+#
+# PyGithub creates a connection for each request with the injected classes.
+#
+github.Requester.Requester.injectConnectionClasses(
+    github.Requester.HTTPRequestsConnectionClass,SharedHTTPSRequestsConnection)
+
 def clean(url):
     if "/releases" in url:
         url = re.sub(r"/releases.*$", "", url)
@@ -39,6 +61,9 @@ class GithubImporter(BaseImporter):
 
     name = "github"
     version = "0.1"
+    url_patterns = (
+        r"(www\.)?github\.com/[^/]+/[^/]+",
+    )
 
     @classmethod
     def can_import(cls,url):
@@ -52,6 +77,14 @@ class GithubImporter(BaseImporter):
         except BaseException:
             return False
 
+    @classmethod
+    def canonical_url(cls,url):
+        """Reduces a Github URL to its repository URL."""
+        parts = [x for x in urlparse(clean(url)).path.split("/") if x]
+        if len(parts) >= 2:
+            url = "https://github.com/%s/%s" % (parts[0],parts[1])
+        return super(GithubImporter,cls).canonical_url(url)
+
     def _parse_time(self,timestr):
         #return time.strptime(timestr,"%a, %d %b %Y %H:%M:%S GMT")
         return dateutil.parser.parse(timestr)
@@ -67,7 +100,7 @@ class GithubImporter(BaseImporter):
         up = giturlparse.parse(url)
             
         # Check if original URL exists
-        response = requests.get(original_url)
+        response = new_http_session(self.config).get(original_url)
         if response.status_code != 200:
             original_url = ""
 
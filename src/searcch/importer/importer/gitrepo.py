@@ -22,6 +22,10 @@ class GitRepoImporter(BaseImporter):
 
     name = "gitrepo"
     version = "0.1"
+    url_patterns = (
+        r"(gitlab\.com|bitbucket\.org)/[^/]+/[^/]+",
+        r"[^/]*/.+\.git/?$",
+    )
 
     @classmethod
     def can_import(cls,url):
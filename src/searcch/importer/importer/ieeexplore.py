@@ -19,6 +19,7 @@ from searcch.importer.db.model import (
     Importer,Affiliation,ArtifactAffiliation,ArtifactTag,Venue,ArtifactVenue,
     RecurringVenue)
 from searcch.importer.exceptions import MissingMetadataError
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -27,6 +28,10 @@ class IeeeXploreImporter(BaseImporter):
 
     name = "ieeexplore"
     version = "0.1"
+    url_patterns = (
+        r"ieeexplore\.ieee\.org/document/",
+        r"doi\.ieeecomputersociety\.org/10\.1109/",
+    )
 
     @classmethod
     def _extract_record_id(self,url):
@@ -35,8 +40,8 @@ class IeeeXploreImporter(BaseImporter):
             if urlobj.netloc == "doi.ieeecomputersociety.org":
                 doi = urlobj.path[1:].rstrip("/")
                 url = "https://doi.org/" + doi
-            session = requests.session()
-            res = requests.get(url)
+            session = new_http_session()
+            res = session.get(url)
             urlobj = urlparse(res.url)
             if urlobj.netloc == "ieeexplore.ieee.org" \
               and urlobj.path.startswith("/document/"):
@@ -44,6 +49,16 @@ class IeeeXploreImporter(BaseImporter):
         except BaseException:
             return None
 
+    @classmethod
+    def canonical_url(cls,url):
+        """Reduces an ieeexplore.ieee.org document URL to the document's main page."""
+        urlobj = urlparse(url)
+        if (urlobj.hostname or "").lower() == "ieeexplore.ieee.org":
+            m = re.match(r"^(?:/abstract)?/document/(\d+)",urlobj.path)
+            if m:
+                url = "https://ieeexplore.ieee.org/document/" + m.group(1)
+        return super(IeeeXploreImporter,cls).canonical_url(url)
+
     @classmethod
     def can_import(cls,url):
         """Checks to see if this URL is a doi.org or ieeexplore.ieee.org/document URL."""
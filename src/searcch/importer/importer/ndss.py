@@ -19,6 +19,7 @@ from searcch.importer.db.model import (
     Importer, Affiliation, ArtifactAffiliation, ArtifactTag, Organization,
     Badge, ArtifactBadge, RecurringVenue, Venue, ArtifactVenue)
 from searcch.importer.exceptions import MissingMetadataError
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -27,12 +28,15 @@ class NDSSImporter(BaseImporter):
 
     name = "ndss"
     version = "0.1"
+    url_patterns = (
+        r"(www\.)?ndss-symposium\.org/ndss",
+    )
 
     @classmethod
     def _extract_record_id(self, url):
         try:
-            session = requests.session()
-            res = requests.get(url)
+            session = new_http_session()
+            res = session.get(url)
             urlobj = urlparse(res.url)
             if urlobj.netloc.endswith("ndss-symposium.org") \
               and urlobj.path.startswith("/ndss"):
@@ -77,7 +81,7 @@ class NDSSImporter(BaseImporter):
         """Imports an artifact from NDSS and returns an Artifact, or throws an error."""
         url = candidate.url
         LOG.debug("importing '%s' from NDSS " % (url,))
-        page = requests.get(url)
+        page = new_http_session(self.config).get(url)
         soup = bs4.BeautifulSoup(page.content, 'html.parser')
         page_header_elm = soup.find('div',class_="page-header")
 
@@ -7,6 +7,7 @@ from searcch.importer.importer import BaseImporter
 from searcch.importer.db.model import (
     Artifact,ArtifactFile,ArtifactMetadata,ArtifactRelease,User,Person,
     Importer,Affiliation,ArtifactAffiliation,ArtifactTag, CandidateArtifactRelationship, CandidateArtifact )
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -14,7 +15,7 @@ class PapersWithCodeClient(object):
 
     def __init__(self, token=None):
         self.token = None
-        self.session = requests.session()
+        self.session = new_http_session()
         self.baseurl = "https://paperswithcode.com/api/v1"
 
     def paper_get(self, paper_id):
@@ -46,12 +47,15 @@ class PapersWithCodeImporter(BaseImporter):
 
     name = "paperswithcode"
     version = "0.1"
+    url_patterns = (
+        r"(www\.)?paperswithcode\.com/paper/",
+    )
 
     @classmethod
     def _extract_paper_id(self, url, session=None):
         try:
             if not session:
-                session = requests.session()
+                session = new_http_session()
             res = session.get(url)
             urlobj = urlparse(res.url)
             if urlobj.netloc.endswith("paperswithcode.com") \
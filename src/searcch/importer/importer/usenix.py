@@ -17,6 +17,7 @@ from searcch.importer.db.model import (
     Artifact, ArtifactFile, ArtifactMetadata, ArtifactRelease, User, Person,
     Importer, Affiliation, ArtifactAffiliation, ArtifactTag, Organization,
     Badge, ArtifactBadge, RecurringVenue, Venue, ArtifactVenue)
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -25,14 +26,17 @@ class USENIXImporter(BaseImporter):
 
     name = "usenix"
     version = "0.1"
+    url_patterns = (
+        r"(www\.)?usenix\.org/conference/[^/]+/presentation/",
+    )
     month_to_number = {month: index for index, month in enumerate(calendar.month_name) if month}
 
     
     @classmethod
     def _extract_record_id(self, url):
         try:
-            session = requests.session()
-            res = requests.get(url)
+            session = new_http_session()
+            res = session.get(url)
             urlobj = urlparse(res.url)
             if urlobj.netloc.endswith("usenix.org") \
               and urlobj.path.startswith("/conference/") and "/presentation/" in urlobj.path:
@@ -51,7 +55,7 @@ class USENIXImporter(BaseImporter):
         """Imports an artifact from USENIX and returns an Artifact, or throws an error."""
         url = candidate.url
         LOG.debug("importing '%s' from USENIX " % (url,))
-        page = requests.get(url)
+        page = new_http_session(self.config).get(url)
         soup = bs4.BeautifulSoup(page.content, 'html.parser')
 
         title = soup.find('h1',id='page-title')
@@ -212,7 +216,7 @@ class USENIXImporter(BaseImporter):
         if venue_object:
             artifact_venues.append(ArtifactVenue(venue=venue_object))
         else:
-            venue_page = requests.get(tmp)
+            venue_page = new_http_session(self.config).get(tmp)
             venue_soup = bs4.BeautifulSoup(venue_page.content, 'html.parser')
 
             value = dict(url=tmp, type="conference", verified=False)
@@ -267,7 +271,7 @@ class USENIXImporter(BaseImporter):
                 "a", {"href" : lambda x: x and x.startswith("https://www.usenix.org/conferences/byname/")})
             if venue_index_url:
                 venue_index_url = venue_index_url.get("href")
-                venue_index_page = requests.get(venue_index_url)
+                venue_index_page = new_http_session(self.config).get(venue_index_url)
 
                 recurring_venue_object = self.session.query(RecurringVenue).\
                     filter(RecurringVenue.url == venue_index_url).\
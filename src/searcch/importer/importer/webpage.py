@@ -19,6 +19,7 @@ from searcch.importer.db.model import (
     Importer,Affiliation,ArtifactAffiliation,ArtifactFileMember,
     ArtifactTag,FileContent)
 from searcch.importer.db.model.license import recognize_license
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -27,6 +28,9 @@ class WebpageImporter(BaseImporter):
 
     name = "webage"
     version = "0.1"
+    url_patterns = (
+        r".*\.web$",
+    )
 
     @classmethod
     def can_import(cls,url):
@@ -57,7 +61,7 @@ class WebpageImporter(BaseImporter):
 
             LOG.warn("importing '%s' from webpage" % (webpage,))               
 
-            page = requests.get(webpage)
+            page = new_http_session(self.config).get(webpage)
             description = page.text
             soup = BeautifulSoup(page.text, features="html.parser")            
             title = soup.find('title')
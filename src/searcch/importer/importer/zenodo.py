@@ -1,4 +1,5 @@
 import json
+import re
 import sys
 import six
 import logging
@@ -19,6 +20,7 @@ from searcch.importer.db.model import (
     Organization,ArtifactFunding,PersonMetadata,ArtifactTag,
     ARTIFACT_TYPES )
 from searcch.importer.db.model.license import recognize_license
+from searcch.importer.util.http import new_http_session
 
 LOG = logging.getLogger(__name__)
 
@@ -74,11 +76,11 @@ class ZenodoApi(object):
 
     APIROOT = "https://zenodo.org/api/"
 
-    def __init__(self,token,apiroot=APIROOT,verify=True):
+    def __init__(self,token,apiroot=APIROOT,verify=True,config=None):
         self._token = token
         self._apiroot = apiroot
         self._verify = verify
-        self._session = requests.Session()
+        self._session = new_http_session(config)
 
     def _send(self,req,stream=False,timeout=None):
         req = self._session.prepare_request(req)
@@ -142,15 +144,33 @@ class ZenodoImporter(BaseImporter):
 
     name = "zenodo"
     version = "0.1"
+    url_patterns = (
+        r"([^/]+\.)?zenodo\.org(/|$)",
+        r"(dx\.)?doi\.org/10\.5281/zenodo\.",
+    )
 
     def __init__(self,config,session):
         super(ZenodoImporter,self).__init__(config,session)
         if not self.config["zenodo"]["token"]:
             raise ConfigError("zenodo importer requires a token, and zenodo.token must be set to that token")
-        self.api = ZenodoApi(self.config["zenodo"]["token"])
+        self.api = ZenodoApi(self.config["zenodo"]["token"],config=self.config)
 
-    def _extract_record_id(self,url):
+    @classmethod
+    def canonical_url(cls,url):
+        """Rewrites Zenodo record URLs (/record/<id>, /records/<id>, /doi/10.5281/zenodo.<id>) to the record's DOI URL."""
         ret = urlparse(url)
+        host = (ret.hostname or "").lower()
+        m = None
+        if host.endswith("zenodo.org"):
+            m = re.match(r"^/(?:records?/(\d+)|doi/10\.5281/zenodo\.(\d+))",ret.path)
+        elif host.endswith("doi.org"):
+            m = re.match(r"^/?10\.5281/zenodo\.(\d+)",ret.path)
+        if m:
+            url = "https://doi.org/10.5281/zenodo." + (m.group(1) or m.group(2))
+        return super(ZenodoImporter,cls).canonical_url(url)
+
+    def _extract_record_id(self,url):
+        ret = urlparse(self.canonical_url(url))
         if (ret.netloc.find("zenodo.org:") > -1 \
             or ret.netloc.endswith("zenodo.org")) \
           and ret.path.startswith("/record/"):
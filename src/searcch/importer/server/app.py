@@ -43,6 +43,22 @@ class ServerConfigSection(ConfigSection):
             secret_key="",
             myurl="",
             max_tasks="1",
+            max_queue="100",
+            retry_after="30",
+            worker_mode="thread",
+            process_workers="0",
+            process_preload="true",
+            warmup="false",
+            checkpoint_dir="",
+            stale_timeout="3600",
+            max_attempts="3",
+            reuse_window="0",
+            notify_workers="1",
+            notify_max_pending="1000",
+            notify_retries="5",
+            notify_backoff="1",
+            notify_backoff_max="60",
+            notify_flush_timeout="10",
             remote_register="true",
             remote_update="true",
             remote_update_interval="10",
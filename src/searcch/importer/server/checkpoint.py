@@ -0,0 +1,76 @@
+import os
+import os.path
+import pickle
+import tempfile
+import logging
+
+LOG = logging.getLogger(__name__)
+
+#
+# Import phases, in order.  A checkpoint records the last completed phase.
+#
+PHASES = ("start","validate","import","retrieve","extract","done")
+
+class CheckpointStore(object):
+    """
+    Persists the outputs of each completed phase of a server import, so
+    that an interrupted import can resume from its last completed phase
+    rather than starting over.  A checkpoint holds the phase name, the
+    pickled Artifact graph, and a dict of phase state (e.g. the import
+    session id and retrieved file locations).  Each import's checkpoint is a
+    single file, <dir>/<artifact_import_id>.pickle, replaced atomically.
+    """
+
+    def __init__(self,checkpoint_dir):
+        self._dir = checkpoint_dir
+        os.makedirs(checkpoint_dir,exist_ok=True)
+
+    @property
+    def dir(self):
+        return self._dir
+
+    def _path(self,artifact_import_id):
+        return os.path.join(self._dir,"%d.pickle" % (artifact_import_id,))
+
+    def save(self,artifact_import_id,phase,artifact,state=None):
+        """Records that `phase` completed with outputs `artifact` and `state`."""
+        data = pickle.dumps(dict(
+            phase=phase,artifact=pickle.dumps(artifact),state=state or {}))
+        (fd,tmppath) = tempfile.mkstemp(dir=self._dir,prefix=".tmp-")
+        try:
+            with os.fdopen(fd,"wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmppath,self._path(artifact_import_id))
+        except:
+            if os.path.exists(tmppath):
+                os.unlink(tmppath)
+            raise
+        LOG.debug("checkpointed import %d after phase %s",artifact_import_id,phase)
+
+    def load(self,artifact_import_id):
+        """Returns (phase,detached Artifact,state) from the last checkpoint, or (None,None,None) if there is none (or it is unreadable)."""
+        try:
+            with open(self._path(artifact_import_id),"rb") as f:
+                data = pickle.load(f)
+            return (data["phase"],pickle.loads(data["artifact"]),data["state"])
+        except FileNotFoundError:
+            pass
+        except:
+            LOG.warning("ignoring unreadable checkpoint for import %d",
+                        artifact_import_id,exc_info=True)
+        return (None,None,None)
+
+    def clear(self,artifact_import_id):
+        try:
+            os.unlink(self._path(artifact_import_id))
+        except FileNotFoundError:
+            pass
+
+def get_checkpoint_store(config):
+    """Returns a CheckpointStore for [server] checkpoint_dir (default <tmpdir>/checkpoints)."""
+    checkpoint_dir = config["server"].get("checkpoint_dir")
+    if not checkpoint_dir:
+        checkpoint_dir = os.path.join(config["DEFAULT"]["tmpdir"],"checkpoints")
+    return CheckpointStore(checkpoint_dir)
@@ -0,0 +1,224 @@
+import os
+import time
+import json
+import atexit
+import logging
+import threading
+import collections
+
+from searcch.importer.util.http import new_http_session
+
+LOG = logging.getLogger(__name__)
+
+#
+# Status codes worth retrying; any other non-2xx response is final.
+#
+RETRY_STATUS_CODES = (408,425,429,500,502,503,504)
+
+class BackendNotifier(object):
+    """
+    Sends import status updates to the backend from background threads, so
+    that import threads never wait on backend latency.  Updates are queued
+    per import (`key`) and coalesced: if an import's previous update has not
+    been sent yet, the new fields overwrite the old ones, and log deltas are
+    concatenated.  Each update carries only the log text added since the
+    last update, as `log`, and its offset in the full import log, as
+    `log_offset`.
+
+    Failed sends are retried with exponential backoff (`backoff` seconds,
+    doubling up to `backoff_max`), up to `retries` times; the update is then
+    dropped, but its log delta is carried forward into the import's next
+    update, so the backend's log has no gaps.  Final updates (e.g. the
+    completed artifact, or a failure) are retried until they are delivered
+    or rejected by the backend.  A final update's
+    `callback(success,response)` runs in a notifier thread once it is
+    delivered or dropped.
+
+    At most `max_pending` imports may have updates waiting; beyond that,
+    `notify` blocks until one has been sent.
+    """
+
+    def __init__(self,session,workers=1,max_pending=1000,retries=5,backoff=1.0,
+                 backoff_max=60.0):
+        self._session = session
+        self._nworkers = max(1,workers)
+        self._max_pending = max(1,max_pending)
+        self._retries = retries
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self._pending = collections.OrderedDict()
+        self._inflight = set()
+        self._carried = dict()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stats = dict(
+            queued=0,coalesced=0,sent=0,retried=0,dropped=0,blocked=0,
+            bytes_sent=0)
+
+    def start(self):
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(0,self._nworkers):
+                t = threading.Thread(
+                    target=self._work,name="backend-notifier-%d" % (i,),
+                    daemon=True)
+                self._workers.append(t)
+                t.start()
+
+    def notify(self,key,url,headers,data,log=None,log_offset=0,final=False,
+               callback=None):
+        """Queues an update of `data` (a dict) for `key`, with log delta `log` starting at `log_offset` in the full log, to be PUT to `url`."""
+        with self._cond:
+            if not key in self._pending \
+              and len(self._pending) >= self._max_pending:
+                self._stats["blocked"] += 1
+                while not key in self._pending \
+                  and len(self._pending) >= self._max_pending:
+                    self._cond.wait()
+            update = dict(
+                url=url,headers=headers,data=dict(data),log=log or "",
+                log_offset=log_offset,final=final,
+                callbacks=[callback] if callback else [],attempts=0,
+                not_before=0.0)
+            if key in self._carried:
+                update = self._merge(self._carried.pop(key),update)
+            if key in self._pending:
+                self._pending[key] = self._merge(self._pending[key],update)
+                self._stats["coalesced"] += 1
+            else:
+                self._pending[key] = update
+            self._stats["queued"] += 1
+            self._cond.notify_all()
+
+    def _merge(self,old,new):
+        """Returns `new` coalesced on top of the older update `old`."""
+        data = dict(old["data"])
+        data.update(new["data"])
+        return dict(
+            url=new["url"],headers=new["headers"],data=data,
+            log=old["log"] + new["log"],log_offset=old["log_offset"],
+            final=old["final"] or new["final"],
+            callbacks=old["callbacks"] + new["callbacks"],
+            attempts=old["attempts"],not_before=old["not_before"])
+
+    def _next(self):
+        """Waits for, and removes, the next update that is due and whose key has no send in progress."""
+        with self._cond:
+            while True:
+                now = time.time()
+                wait = None
+                for (key,update) in self._pending.items():
+                    if key in self._inflight:
+                        continue
+                    if update["not_before"] <= now:
+                        del self._pending[key]
+                        self._inflight.add(key)
+                        self._cond.notify_all()
+                        return (key,update)
+                    delay = update["not_before"] - now
+                    wait = delay if wait is None else min(wait,delay)
+                self._cond.wait(wait)
+
+    def _send(self,update):
+        data = dict(update["data"])
+        if update["log"]:
+            data["log"] = update["log"]
+            data["log_offset"] = update["log_offset"]
+        body = json.dumps(data)
+        r = self._session.put(update["url"],headers=update["headers"],data=body)
+        with self._cond:
+            self._stats["bytes_sent"] += len(body)
+        return r
+
+    def _work(self):
+        while True:
+            (key,update) = self._next()
+            (r,retry) = (None,False)
+            try:
+                r = self._send(update)
+                retry = r.status_code in RETRY_STATUS_CODES
+            except:
+                LOG.warning("failed to notify the backend (%r)",key,exc_info=True)
+                retry = True
+            success = r is not None and r.ok
+            if not success and retry \
+              and (update["final"] or update["attempts"] < self._retries):
+                update["attempts"] += 1
+                update["not_before"] = time.time() + min(
+                    self._backoff_max,
+                    self._backoff * (2 ** (update["attempts"] - 1)))
+                with self._cond:
+                    if key in self._pending:
+                        update = self._merge(update,self._pending[key])
+                    self._pending[key] = update
+                    self._pending.move_to_end(key,last=False)
+                    self._inflight.discard(key)
+                    self._stats["retried"] += 1
+                    self._cond.notify_all()
+                continue
+            with self._cond:
+                self._inflight.discard(key)
+                self._stats["sent" if success else "dropped"] += 1
+                if not success and not update["final"] and update["log"]:
+                    # Resend the dropped log delta with the next update.
+                    carried = dict(
+                        update,data=dict(),callbacks=[],attempts=0,
+                        not_before=0.0)
+                    if key in self._pending:
+                        self._pending[key] = self._merge(
+                            carried,self._pending[key])
+                    else:
+                        self._carried[key] = carried
+                self._cond.notify_all()
+            if not success:
+                LOG.error("failed to notify the backend (%r) (%r) (%r)",key,
+                          r.status_code if r is not None else None,
+                          r.content if r is not None else None)
+            for callback in update["callbacks"]:
+                try:
+                    callback(success,r)
+                except:
+                    LOG.exception("backend notification callback failed (%r)",key)
+
+    def flush(self,timeout=None):
+        """Waits until all queued updates have been sent or dropped; returns False on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._pending or self._inflight:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                pending=len(self._pending),inflight=len(self._inflight),
+                **self._stats)
+
+__notifier__ = None
+__notifier_lock__ = threading.Lock()
+
+def get_backend_notifier(config):
+    """Returns this process's BackendNotifier, creating and starting it if necessary."""
+    global __notifier__
+
+    with __notifier_lock__:
+        if __notifier__ and __notifier__[0] == os.getpid():
+            return __notifier__[1]
+        sc = config["server"]
+        notifier = BackendNotifier(
+            new_http_session(config),workers=sc.getint("notify_workers"),
+            max_pending=sc.getint("notify_max_pending"),
+            retries=sc.getint("notify_retries"),
+            backoff=sc.getfloat("notify_backoff"),
+            backoff_max=sc.getfloat("notify_backoff_max"))
+        notifier.start()
+        atexit.register(notifier.flush,sc.getfloat("notify_flush_timeout"))
+        __notifier__ = (os.getpid(),notifier)
+        return notifier
@@ -0,0 +1,134 @@
+"""
+Runs the retrieve and extract phases of server imports in a pool of worker
+processes ([server] worker_mode = process), so that CPU-heavy extraction
+(PDF parsing, spaCy/PKE, YAKE, NLTK tokenization) in concurrent imports is
+not serialized by the GIL in the server process.  Artifact graphs cross the
+process boundary pickled; each side merges them into its own database
+session.
+"""
+
+import os
+import pickle
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+
+from searcch.importer.util.config import get_config_parser
+
+LOG = logging.getLogger(__name__)
+
+#
+# Worker process state, set by init_worker.
+#
+__config__ = None
+__sessionmaker__ = None
+
+def config_values(config):
+    """Returns a picklable dict of the raw values in `config`."""
+    ret = dict(DEFAULT=dict(config.defaults()))
+    for name in config.sections():
+        ret[name] = dict(config.items(name,raw=True))
+    return ret
+
+def preload_extractors(config):
+    """Loads the extractors' models and corpora into this process's resource registry, so that the first import in a worker process does not pay for it."""
+    from searcch.importer.extractor.registry import warmup
+    warmup(config)
+
+def init_worker(values,preload=True):
+    """Initializes a worker process: rebuilds the config, prepares database sessions, and preloads extractor models."""
+    global __config__, __sessionmaker__
+
+    from sqlalchemy.orm import sessionmaker
+    from searcch.importer.db import get_db_engine
+
+    config = get_config_parser()
+    config.read_dict(values)
+    __config__ = config
+    __sessionmaker__ = sessionmaker(bind=get_db_engine(config=config))
+    if preload:
+        preload_extractors(config)
+    LOG.debug("import worker process %d ready",os.getpid())
+
+def retrieve_and_extract(artifact_data,nofetch=False,noextract=False,
+                         noremove=False,resume_phase=None,state={},
+                         checkpoint=None):
+    """Runs in a worker process: retrieves and extracts the pickled Artifact `artifact_data`, and returns (pickled Artifact,log).  Nothing is written to the database; the caller merges and commits the result.  If `checkpoint` is a (checkpoint dir,artifact import id) tuple, the retrieve phase is checkpointed; if `resume_phase` is retrieve, the retrieved files in `state` are reused."""
+    from searcch.importer.importer import ImportSession
+    from searcch.importer.server.checkpoint import CheckpointStore
+
+    log = ""
+    store = None
+    if checkpoint:
+        (checkpoint_dir,artifact_import_id) = checkpoint
+        store = CheckpointStore(checkpoint_dir)
+    session = __sessionmaker__(autoflush=False)
+    imp_session = None
+    try:
+        artifact = session.merge(pickle.loads(artifact_data))
+        imp_session = ImportSession(
+            __config__,session,artifact,sessionid=state.get("sessionid"))
+        if resume_phase == "retrieve" and imp_session.restore_state(state):
+            log += "reusing %d retrieved files\n" % (len(imp_session.retrieved_files),)
+        else:
+            if store:
+                store.save(artifact_import_id,"import",artifact,
+                           dict(sessionid=imp_session.id))
+            if not nofetch:
+                imp_session.retrieve_all()
+            if store:
+                store.save(artifact_import_id,"retrieve",artifact,
+                           imp_session.checkpoint_state())
+            log += "retrieved %d files\n" % (len(imp_session.retrieved_files),)
+        if not noextract:
+            imp_session.extract_all()
+        if not noremove:
+            imp_session.remove_all()
+        imp_session.finalize()
+        ret = pickle.dumps(artifact)
+    finally:
+        session.rollback()
+        # Our session is never committed, but memoized extraction results
+        # are not part of the artifact, so commit them separately.
+        try:
+            if imp_session:
+                imp_session.save_results()
+                session.commit()
+        except:
+            session.rollback()
+            LOG.warning("failed to save extraction results",exc_info=True)
+        session.close()
+    return (ret,log)
+
+__pool__ = None
+__pool_lock__ = threading.Lock()
+
+def get_process_pool(config):
+    """Returns this process's pool of import worker processes, creating it if necessary.  Workers are spawned (not forked), since the server process has threads and open database connections."""
+    global __pool__
+
+    with __pool_lock__:
+        if __pool__ and __pool__[0] == os.getpid():
+            return __pool__[1]
+        workers = config["server"].getint("process_workers") \
+          or config["server"].getint("max_tasks") or 1
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(config_values(config),
+                      config["server"].getboolean("process_preload")))
+        __pool__ = (os.getpid(),pool)
+        LOG.info("started %d import worker processes",workers)
+        return pool
+
+def run_in_process(config,artifact,nofetch=False,noextract=False,noremove=False,
+                   resume_phase=None,state={},checkpoint=None):
+    """Retrieves and extracts `artifact` in a worker process, blocking (only) the calling thread.  Returns (detached Artifact,log); the caller should merge the Artifact into its session."""
+    pool = get_process_pool(config)
+    future = pool.submit(
+        retrieve_and_extract,pickle.dumps(artifact),nofetch=nofetch,
+        noextract=noextract,noremove=noremove,resume_phase=resume_phase,
+        state=state,checkpoint=checkpoint)
+    (data,log) = future.result()
+    return (pickle.loads(data),log)
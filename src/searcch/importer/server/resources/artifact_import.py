@@ -1,9 +1,8 @@
 import datetime
+import functools
 import dateutil.parser
 import logging
 import json
-import threading
-import requests
 import traceback
 import sys
 
@@ -18,30 +17,37 @@ from searcch.importer.db.schema import (
 from searcch.importer.server.util import verify_api_key
 from searcch.importer.server.app import ( app,db,config )
 from searcch.importer.importer import (
-    get_importer,ImportSession )
+    get_importer,canonical_url,ImportSession )
 from searcch.importer.exporter import (
     get_exporter )
+from searcch.importer.server.scheduler import get_import_scheduler
+from searcch.importer.server.process import run_in_process
+from searcch.importer.server.checkpoint import get_checkpoint_store
+from searcch.importer.server.notifier import get_backend_notifier
+from searcch.importer.exceptions import QueueFullError
 
 
 LOG = logging.getLogger(__name__)
 
-class ThreadedArtifactImport(threading.Thread):
+class ArtifactImportJob(object):
     """
-    A simple thread to handle an artifact import (and status updates
-    and final push to the server, if applicable).
+    A simple job to handle an artifact import (and status updates
+    and final push to the server, if applicable).  Jobs are run by the
+    ImportScheduler's worker threads.
     """
     def __init__(self,artifact_import_id,**kwargs):
-        super(ThreadedArtifactImport,self).__init__(**kwargs)
         self.artifact_import_id = artifact_import_id
-        self._stop_flag = False
+        self.checkpoints = get_checkpoint_store(config)
         self._log = ""
+        self._log_sent = 0
 
     def log(self,msg):
         self._log += str(msg)
 
     def notify_backend(self,artifact_import,status=None,phase=None,message=None,
                        progress=0.0,bytes_retrieved=0,bytes_extracted=0,
-                       artifact=None):
+                       artifact=None,callback=None):
+        """Queues a status update (with the log added since the last update) for the backend; it is sent asynchronously, and coalesced with any later updates not yet sent.  Updates with an `artifact` or a terminal `status` (completed or failed) are final: they are retried until delivered, and then `callback(success,response)` is called."""
         api_root = config["searcch"].get("api_root")
         api_key = config["searcch"].get("api_key")
         data = dict(mtime=artifact_import.mtime.isoformat())
@@ -57,23 +63,130 @@ class ThreadedArtifactImport(threading.Thread):
             data["bytes_retrieved"] = bytes_retrieved
         if bytes_extracted:
             data["bytes_extracted"] = bytes_extracted
-        if self._log:
-            data["log"] = self._log
         if artifact:
             data["artifact"] = artifact
-        r = requests.put(
+        (log,log_offset) = (self._log[self._log_sent:],self._log_sent)
+        self._log_sent = len(self._log)
+        get_backend_notifier(config).notify(
+            self.artifact_import_id,
             api_root + "/artifact/import/%d" % (artifact_import.remote_id),
-            headers={ "Content-type":"application/json",
-                      "X-Api-Key":api_key },
-            data=json.dumps(data))
-        if r.status_code != requests.codes.ok:
-            LOG.error("failed to notify the backend (%d) (%r)" % (r.status_code,r.content))
-            return (False,r)
-        return (True,r)
+            { "Content-type":"application/json","X-Api-Key":api_key },
+            data,log=log,log_offset=log_offset,
+            final=bool(artifact) or status in ("completed","failed"),
+            callback=callback)
+
+    def _retrieve_extract(self,artifact_import,artifact,nofetch,noextract,
+                          noremove,resume_phase=None,state={}):
+        """Retrieves and extracts `artifact` in this thread; returns the artifact, or None on failure.  Checkpoints the retrieved files, and if resuming after the retrieve phase, reuses them."""
+        imp_session = ImportSession(
+            config,db.session,artifact,sessionid=state.get("sessionid"))
+        if resume_phase == "retrieve" and imp_session.restore_state(state):
+            self.log("(resumed) ")
+        else:
+            # Record the session id, so that a resumed retrieve phase reuses
+            # (and continues) this one's downloads.
+            self.checkpoints.save(
+                self.artifact_import_id,"import",artifact,
+                dict(sessionid=imp_session.id))
+            try:
+                if not nofetch:
+                    imp_session.retrieve_all()
+                self.checkpoints.save(
+                    self.artifact_import_id,"retrieve",artifact,
+                    imp_session.checkpoint_state())
+            except:
+                self.log("error:\n" + traceback.format_exc())
+                artifact_import.mtime = datetime.datetime.now()
+                self.notify_backend(
+                    artifact_import,status="failed",
+                    message="error importing artifact")
+                return None
+        self.log("done.\n")
+
+        self.log("Extracting artifact sources: ")
+        artifact_import.phase = "extract"
+        artifact_import.mtime = datetime.datetime.now()
+        db.session.commit()
+        self.notify_backend(
+            artifact_import,phase=artifact_import.phase,message="",
+            progress=70.0)
+
+        try:
+            if not noextract:
+                imp_session.extract_all()
+            if not noremove:
+                imp_session.remove_all()
+        except:
+            self.log("error:\n" + traceback.format_exc())
+            artifact_import.mtime = datetime.datetime.now()
+            self.notify_backend(
+                artifact_import,status="failed",
+                message="error importing artifact")
+            return None
+        self.log("done.\n")
+
+        imp_session.finalize()
+        return artifact
+
+    def _retrieve_extract_process(self,artifact_import,artifact,nofetch,
+                                  noextract,noremove,resume_phase=None,
+                                  state={}):
+        """Retrieves and extracts `artifact` in a worker process, and merges the result into our session; returns the merged artifact, or None on failure.  The retrieve and extract phases run as a single task, so the backend sees the extract phase only once it is done."""
+        try:
+            (artifact,log) = run_in_process(
+                config,artifact,nofetch=nofetch,noextract=noextract,
+                noremove=noremove,resume_phase=resume_phase,state=state,
+                checkpoint=(self.checkpoints.dir,self.artifact_import_id))
+            self.log(log)
+            artifact = db.session.merge(artifact)
+        except:
+            self.log("error:\n" + traceback.format_exc())
+            artifact_import.mtime = datetime.datetime.now()
+            self.notify_backend(
+                artifact_import,status="failed",
+                message="error importing artifact")
+            return None
+        self.log("done.\n")
+
+        artifact_import.phase = "extract"
+        artifact_import.mtime = datetime.datetime.now()
+        db.session.commit()
+        self.notify_backend(
+            artifact_import,phase=artifact_import.phase,message="",
+            progress=70.0)
+        return artifact
 
     def run(self,*args,**kwargs):
         with app.app_context():
-            return self._run(*args,**kwargs)
+            try:
+                return self._run(*args,**kwargs)
+            finally:
+                # If we get here, the import finished (or failed); only a
+                # crashed import leaves a checkpoint to resume from.
+                self.checkpoints.clear(self.artifact_import_id)
+
+    def _resume(self,artifact_import):
+        """Returns (phase,artifact,state) from the import's last checkpoint, with the artifact merged into our session; or (None,None,{}) if there is no checkpoint."""
+        (phase,artifact,state) = self.checkpoints.load(self.artifact_import_id)
+        if not phase:
+            return (None,None,{})
+        try:
+            artifact = db.session.merge(artifact)
+        except:
+            LOG.warning("failed to restore checkpoint of import %d; restarting",
+                        self.artifact_import_id,exc_info=True)
+            db.session.rollback()
+            self.checkpoints.clear(self.artifact_import_id)
+            return (None,None,{})
+        LOG.info("resuming import %d after phase %s",self.artifact_import_id,phase)
+        self.log("Resuming import after phase %s.\n" % (phase,))
+        artifact_import.mtime = datetime.datetime.now()
+        db.session.commit()
+        db.session.refresh(artifact_import)
+        self.notify_backend(
+            artifact_import,status="running",phase=artifact_import.phase,
+            message="resuming after phase %s" % (phase,))
+        return (phase,artifact,state)
 
     def _run(self,*args,**kwargs):
         artifact_import = db.session.query(ArtifactImport)\
@@ -86,6 +199,39 @@ class ThreadedArtifactImport(threading.Thread):
         noextract = artifact_import.noextract
         noremove = artifact_import.noremove
 
+        (resume_phase,artifact,state) = self._resume(artifact_import)
+        if not resume_phase:
+            artifact = self._import(artifact_import)
+            if not artifact:
+                return
+            self.checkpoints.save(self.artifact_import_id,"import",artifact)
+
+        if resume_phase in (None,"import","retrieve"):
+            if resume_phase is None:
+                self.log("Retrieving artifact sources: ")
+                artifact_import.phase = "retrieve"
+                artifact_import.mtime = datetime.datetime.now()
+                db.session.commit()
+                self.notify_backend(
+                    artifact_import,phase=artifact_import.phase,message="",
+                    progress=40.0)
+
+            if config["server"].get("worker_mode","thread") == "process":
+                artifact = self._retrieve_extract_process(
+                    artifact_import,artifact,nofetch,noextract,noremove,
+                    resume_phase=resume_phase,state=state)
+            else:
+                artifact = self._retrieve_extract(
+                    artifact_import,artifact,nofetch,noextract,noremove,
+                    resume_phase=resume_phase,state=state)
+            if not artifact:
+                return
+            self.checkpoints.save(self.artifact_import_id,"extract",artifact)
+
+        self._commit(artifact_import,artifact)
+
+    def _import(self,artifact_import):
+        """Runs the validate and import phases; returns the imported artifact, or None on failure."""
         artifact_import.phase = "validate"
         artifact_import.mtime = datetime.datetime.now()
         #self.log("Validating URL: %r" % (artifact_import.url))
@@ -143,54 +289,13 @@ class ThreadedArtifactImport(threading.Thread):
                 artifact_import,status="failed",
                 message="import failed to produce an artifact")
             return
+        artifact.canonical_url = canonical_url(artifact_import.url,name=imp.name)
         self.log("done (%r)\n" % (artifact))
         LOG.debug("imported: %r",artifact)
+        return artifact
 
-        self.log("Retrieving artifact sources: ")
-        artifact_import.phase = "retrieve"
-        artifact_import.mtime = datetime.datetime.now()
-        db.session.commit()
-        self.notify_backend(
-            artifact_import,phase=artifact_import.phase,message="",
-            progress=40.0)
-
-        imp_session = ImportSession(config,db.session,artifact)
-        if not nofetch:
-            try:
-                imp_session.retrieve_all()
-            except:
-                self.log("error:\n" + traceback.format_exc())
-                artifact_import.mtime = datetime.datetime.now()
-                self.notify_backend(
-                    artifact_import,status="failed",
-                    message="error importing artifact")
-                return
-        self.log("done.\n")
-
-        self.log("Extracting artifact sources: ")
-        artifact_import.phase = "extract"
-        artifact_import.mtime = datetime.datetime.now()
-        db.session.commit()
-        self.notify_backend(
-            artifact_import,phase=artifact_import.phase,message="",
-            progress=70.0)
-
-        try:
-            if not noextract:
-                imp_session.extract_all()
-            if not noremove:
-                imp_session.remove_all()
-        except:
-            self.log("error:\n" + traceback.format_exc())
-            artifact_import.mtime = datetime.datetime.now()
-            self.notify_backend(
-                artifact_import,status="failed",
-                message="error importing artifact")
-            return
-        self.log("done.\n")
-
-        imp_session.finalize()
-
+    def _commit(self,artifact_import,artifact):
+        """Commits the finished artifact, and pushes it to the backend."""
         artifact_import.artifact = artifact
         db.session.add(artifact)
         try:
@@ -217,34 +322,99 @@ class ThreadedArtifactImport(threading.Thread):
         artifact_import.phase = "done"
         artifact_import.mtime = datetime.datetime.now()
         db.session.commit()
-        (success,response) = self.notify_backend(
+        artifact_id = artifact.id
+        self.notify_backend(
             artifact_import,status="completed",phase=artifact_import.phase,
-            message="",progress=100.0,artifact=ArtifactSchema().dump(artifact))
+            message="",progress=100.0,artifact=ArtifactSchema().dump(artifact),
+            callback=lambda success,response: self._exported(
+                artifact_id,success,response))
+        return
 
-        if success:
-            if "id" in response.json():
+    def _exported(self,artifact_id,success,response):
+        """Records the backend's id for our artifact, once the backend has accepted it.  Runs in a notifier thread."""
+        if not success:
+            LOG.error("server returned error (%r)" % (
+                response.status_code if response is not None else None,))
+            return
+        try:
+            external_id = response.json().get("id")
+        except:
+            external_id = None
+        if not external_id:
+            LOG.warning("server claimed success, but returned no id")
+            return
+        with app.app_context():
+            try:
                 exporter = get_exporter("searcch",config,db.session)
                 exp = ExportedObject(
-                    object_id=artifact.id,object_type="artifact",
+                    object_id=artifact_id,object_type="artifact",
                     ctime=datetime.datetime.now(),
-                    external_object_id=response.json()["id"],
+                    external_object_id=external_id,
                     exporter=exporter.exporter_obj)
                 db.session.add(exp)
                 db.session.commit()
-            else:
-                LOG.warning("server claimed success, but returned no id")
-        else:
-            LOG.error("server returned error (%r)" % (response.status_code,))
+            finally:
+                db.session.remove()
+
+def run_artifact_import(artifact_import_id):
+    ArtifactImportJob(artifact_import_id).run()
+
+def abandon_artifact_import(artifact_import_id,message):
+    """Tells the backend that an orphaned import has failed, and discards its checkpoint."""
+    job = ArtifactImportJob(artifact_import_id)
+    job.checkpoints.clear(artifact_import_id)
+    artifact_import = db.session.query(ArtifactImport)\
+      .filter(ArtifactImport.id == artifact_import_id).first()
+    if not artifact_import:
         return
-
-    def stop(self):
-        self._stop_flag = True
-
-    def cleanup(self):
-        self.stop()
-        LOG.debug("stopped import thread")
-        self.join()
-        LOG.debug("joined import thread")
+    artifact_import.message = message
+    artifact_import.mtime = datetime.datetime.now()
+    db.session.commit()
+    job.notify_backend(artifact_import,status="failed",message=message)
+    resolve_followers(artifact_import_id)
+
+def resolve_followers(leader_id):
+    """Hands the result of a finished import to the imports of the same URL waiting on it (its followers): each is marked completed with the leader's artifact, or failed, and the backend is notified."""
+    leader = db.session.query(ArtifactImport)\
+      .filter(ArtifactImport.id == leader_id).first()
+    if not leader or leader.status in ("queued","running"):
+        return
+    followers = db.session.query(ArtifactImport.id)\
+      .filter(ArtifactImport.leader_id == leader_id)\
+      .filter(ArtifactImport.status == "queued").all()
+    if not followers:
+        return
+    artifact_id = None
+    if leader.status == "completed" and leader.phase == "done":
+        artifact_id = leader.artifact_id
+    artifact_data = ArtifactSchema().dump(leader.artifact) if artifact_id else None
+    message = "" if artifact_id else (leader.message or "import failed")
+    for (follower_id,) in followers:
+        now = datetime.datetime.now()
+        values = dict(status="completed" if artifact_id else "failed",
+                      message=message,mtime=now)
+        if artifact_id:
+            values.update(phase="done",artifact_id=artifact_id,progress=100.0)
+        # Only one caller may resolve each follower.
+        count = db.session.query(ArtifactImport)\
+          .filter(ArtifactImport.id == follower_id)\
+          .filter(ArtifactImport.status == "queued")\
+          .update(values,synchronize_session=False)
+        db.session.commit()
+        if not count:
+            continue
+        follower = db.session.query(ArtifactImport)\
+          .filter(ArtifactImport.id == follower_id).first()
+        job = ArtifactImportJob(follower_id)
+        job.log("Attached to import %d of the same URL.\n" % (leader_id,))
+        LOG.debug("resolved import %d from import %d",follower_id,leader_id)
+        if artifact_id:
+            job.notify_backend(
+                follower,status="completed",phase="done",message="",
+                progress=100.0,artifact=artifact_data,
+                callback=functools.partial(job._exported,artifact_id))
+        else:
+            job.notify_backend(follower,status="failed",message=message)
 
 
 class ArtifactImportResourceRoot(Resource):
@@ -297,19 +467,56 @@ class ArtifactImportResourceRoot(Resource):
             args["ctime"] = dateutil.parser.parse(args["ctime"])
         args["remote_id"] = args["id"]
         del args["id"]
+        now = datetime.datetime.now()
         artifact_import = ArtifactImport(
-            mtime=datetime.datetime.now(),phase="start",
+            mtime=now,phase="start",url_key=canonical_url(
+                args["url"],name=args.get("importer_module_name")),
             **args)
         res = db.session.query(ArtifactImport)\
           .filter(ArtifactImport.remote_id == args["remote_id"]).first()
         if res:
             abort(403,description="already importing this artifact")
-        db.session.add(artifact_import)
-        db.session.commit()
-        db.session.refresh(artifact_import)
 
-        ThreadedArtifactImport(artifact_import.id).start()
-        
+        # If the same URL is already being imported with the same options,
+        # or was imported within the last reuse_window seconds, wait for
+        # (or reuse) that import's artifact rather than importing it again.
+        same = db.session.query(ArtifactImport)\
+          .filter(ArtifactImport.url_key == artifact_import.url_key)\
+          .filter(ArtifactImport.importer_module_name == artifact_import.importer_module_name)\
+          .filter(ArtifactImport.nofetch == bool(artifact_import.nofetch))\
+          .filter(ArtifactImport.noextract == bool(artifact_import.noextract))
+        leader = same\
+          .filter(ArtifactImport.leader_id == None)\
+          .filter(ArtifactImport.status.in_(("queued","running")))\
+          .order_by(ArtifactImport.id).first()
+        reuse_window = config["server"].getint("reuse_window")
+        if not leader and reuse_window > 0:
+            leader = same\
+              .filter(ArtifactImport.status == "completed")\
+              .filter(ArtifactImport.artifact_id != None)\
+              .filter(ArtifactImport.mtime >= now - datetime.timedelta(seconds=reuse_window))\
+              .order_by(ArtifactImport.mtime.desc()).first()
+        if leader:
+            artifact_import.leader_id = leader.id
+            artifact_import.status = "queued"
+            artifact_import.queue_time = now
+            db.session.add(artifact_import)
+            db.session.commit()
+            # The leader may have finished before we were attached.
+            resolve_followers(leader.id)
+            response = jsonify({ "status":"up","leader_id":leader.id })
+            response.status_code = 200
+            return response
+
+        try:
+            get_import_scheduler().submit(artifact_import)
+        except QueueFullError as ex:
+            db.session.rollback()
+            response = jsonify({ "status":"busy","message":str(ex) })
+            response.status_code = 429
+            response.headers["Retry-After"] = str(ex.retry_after)
+            return response
+
         response = jsonify({ "status":"up" })
         response.status_code = 200
         return response
@@ -2,15 +2,26 @@ from flask import abort, jsonify, request, Response, Blueprint
 from flask_restful import reqparse, Resource, fields, marshal
 
 import searcch.importer
-from searcch.importer.server.app import db
+from searcch.importer.server.app import ( db,config )
 from searcch.importer.server.util import verify_api_key
+from searcch.importer.util.http import (
+    get_http_stats,get_http_cache_stats,get_ratelimit_stats )
+from searcch.importer.server.scheduler import get_import_scheduler
+from searcch.importer.server.notifier import get_backend_notifier
 
 class StatusResourceRoot(Resource):
 
     def get(self):
         """
-        Return importer status and version.
+        Return importer status and version, import queue depth and wait
+        times, backend notification queue statistics, and outbound HTTP
+        connection statistics.
         """
         api_key = request.headers.get('X-Api-Key')
         verify_api_key(api_key)
-        return jsonify({"status":"up","version":searcch.importer.__version__})
+        return jsonify({"status":"up","version":searcch.importer.__version__,
+                        "imports":get_import_scheduler().stats(),
+                        "notifications":get_backend_notifier(config).stats(),
+                        "http":get_http_stats(),
+                        "http_cache":get_http_cache_stats(),
+                        "ratelimit":get_ratelimit_stats()})
@@ -0,0 +1,303 @@
+import os
+import time
+import datetime
+import logging
+import threading
+import queue
+
+from sqlalchemy import func
+
+from searcch.importer.db.model import ArtifactImport
+from searcch.importer.exceptions import QueueFullError
+
+LOG = logging.getLogger(__name__)
+
+class ImportScheduler(object):
+    """
+    Runs server-triggered artifact imports on a bounded pool of worker
+    threads.  The queue is persisted in the artifact_imports table (status,
+    queue_time, start_time): submitted imports are marked queued, a worker
+    claims one by atomically moving it to running, and it is marked
+    completed or failed when the runner returns.  When the scheduler starts,
+    it requeues any imports left queued by a previous server process.
+    Submissions beyond `max_queue` waiting imports are refused with
+    QueueFullError.
+
+    A sweeper thread refreshes the mtime of this process's running imports,
+    and looks for orphans: imports left running by a dead process, whose
+    mtime is more than `stale_timeout` seconds old.  Orphans that have been
+    attempted fewer than `max_attempts` times are requeued (and resume from
+    their last checkpoint); others are marked failed, and passed to
+    `abandon(artifact_import_id,message)`.
+
+    Imports with a `leader_id` are followers of another import of the same
+    URL, and are never run; `finished(artifact_import_id)` is called after
+    each import finishes (and, on start, for finished imports with waiting
+    followers), so that it can hand the result to the followers.
+    """
+
+    def __init__(self,app,db,runner,max_tasks=1,max_queue=0,retry_after=30,
+                 stale_timeout=3600,max_attempts=3,abandon=None,
+                 finished=None):
+        self._app = app
+        self._db = db
+        self._runner = runner
+        self._stale_timeout = stale_timeout
+        self._max_attempts = max_attempts
+        self._abandon = abandon
+        self._finished = finished
+        self._max_tasks = max(1,max_tasks)
+        self._max_queue = max(0,max_queue)
+        self._retry_after = retry_after
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._running = dict()
+        self._stats = dict(
+            submitted=0,requeued=0,rejected=0,completed=0,failed=0,
+            orphans_requeued=0,orphans_failed=0,
+            wait_count=0,wait_total=0.0,wait_max=0.0)
+        self._pid = None
+
+    @property
+    def pid(self):
+        """The pid of the process whose workers this scheduler started."""
+        return self._pid
+
+    def start(self):
+        """Starts the worker threads and requeues pending imports."""
+        with self._lock:
+            if self._workers:
+                return
+            self._pid = os.getpid()
+            for i in range(0,self._max_tasks):
+                t = threading.Thread(
+                    target=self._work,name="import-worker-%d" % (i,),daemon=True)
+                self._workers.append(t)
+        self._requeue()
+        for t in self._workers:
+            t.start()
+        if self._stale_timeout > 0:
+            threading.Thread(
+                target=self._sweep_loop,name="import-sweeper",daemon=True).start()
+        LOG.info("import scheduler started %d workers (pid %d)",
+                 self._max_tasks,self._pid)
+
+    def _requeue(self):
+        with self._app.app_context():
+            session = self._db.session
+            try:
+                pending = session.query(ArtifactImport.id)\
+                  .filter(ArtifactImport.status == "queued")\
+                  .filter(ArtifactImport.leader_id == None)\
+                  .order_by(ArtifactImport.queue_time,ArtifactImport.id).all()
+                for (artifact_import_id,) in pending:
+                    self._queue.put(artifact_import_id)
+                with self._lock:
+                    self._stats["requeued"] += len(pending)
+                if pending:
+                    LOG.info("requeued %d pending imports",len(pending))
+                if self._finished:
+                    leaders = session.query(ArtifactImport.leader_id)\
+                      .filter(ArtifactImport.status == "queued")\
+                      .filter(ArtifactImport.leader_id != None)\
+                      .distinct().all()
+                    for (leader_id,) in leaders:
+                        status = session.query(ArtifactImport.status)\
+                          .filter(ArtifactImport.id == leader_id).scalar()
+                        if not status in ("queued","running"):
+                            self._finished(leader_id)
+            finally:
+                session.remove()
+
+    def full(self):
+        return self._max_queue > 0 and self._queue.qsize() >= self._max_queue
+
+    def submit(self,artifact_import):
+        """Queues `artifact_import` (an ArtifactImport in the current db session, not yet committed or committed), and commits it.  Raises QueueFullError if the queue is full."""
+        if self.full():
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError(
+                self._retry_after,"import queue is full (%d waiting)" % (
+                    self._queue.qsize(),))
+        artifact_import.status = "queued"
+        artifact_import.queue_time = datetime.datetime.now()
+        self._db.session.add(artifact_import)
+        self._db.session.commit()
+        self._queue.put(artifact_import.id)
+        with self._lock:
+            self._stats["submitted"] += 1
+        return artifact_import.id
+
+    def _claim(self,session,artifact_import_id):
+        """Atomically moves a queued import to running; returns False if it was claimed elsewhere (or is gone)."""
+        now = datetime.datetime.now()
+        count = session.query(ArtifactImport)\
+          .filter(ArtifactImport.id == artifact_import_id)\
+          .filter(ArtifactImport.status == "queued")\
+          .update(dict(status="running",start_time=now,mtime=now,
+                       attempts=func.coalesce(ArtifactImport.attempts,0) + 1),
+                  synchronize_session=False)
+        session.commit()
+        if not count:
+            return False
+        (queue_time,) = session.query(ArtifactImport.queue_time)\
+          .filter(ArtifactImport.id == artifact_import_id).first()
+        wait = (now - queue_time).total_seconds() if queue_time else 0.0
+        with self._lock:
+            self._running[artifact_import_id] = now
+            self._stats["wait_count"] += 1
+            self._stats["wait_total"] += wait
+            self._stats["wait_max"] = max(self._stats["wait_max"],wait)
+        LOG.debug("starting import %d after %.1fs in queue",artifact_import_id,wait)
+        return True
+
+    def _finish(self,session,artifact_import_id):
+        session.rollback()
+        ai = session.query(ArtifactImport)\
+          .filter(ArtifactImport.id == artifact_import_id).first()
+        status = "failed"
+        if ai and ai.phase == "done" and ai.artifact_id:
+            status = "completed"
+        session.query(ArtifactImport)\
+          .filter(ArtifactImport.id == artifact_import_id)\
+          .filter(ArtifactImport.status == "running")\
+          .update(dict(status=status),synchronize_session=False)
+        session.commit()
+        with self._lock:
+            self._running.pop(artifact_import_id,None)
+            self._stats[status] += 1
+
+    def _work(self):
+        while True:
+            artifact_import_id = self._queue.get()
+            try:
+                with self._app.app_context():
+                    session = self._db.session
+                    try:
+                        if not self._claim(session,artifact_import_id):
+                            continue
+                        try:
+                            self._runner(artifact_import_id)
+                        except:
+                            LOG.exception("import %d failed",artifact_import_id)
+                        self._finish(session,artifact_import_id)
+                        if self._finished:
+                            self._finished(artifact_import_id)
+                    finally:
+                        session.remove()
+            except:
+                LOG.exception("import worker error (import %r)",artifact_import_id)
+            finally:
+                self._queue.task_done()
+
+    def _sweep_loop(self):
+        interval = max(1.0,min(60.0,self._stale_timeout / 4.0))
+        while True:
+            try:
+                with self._app.app_context():
+                    session = self._db.session
+                    try:
+                        self.sweep(session)
+                    finally:
+                        session.remove()
+            except:
+                LOG.exception("import sweeper error")
+            time.sleep(interval)
+
+    def sweep(self,session):
+        """Refreshes the mtime of our running imports, then requeues or fails orphaned imports.  Returns (requeued,failed) counts."""
+        now = datetime.datetime.now()
+        with self._lock:
+            ours = list(self._running.keys())
+        if ours:
+            session.query(ArtifactImport)\
+              .filter(ArtifactImport.id.in_(ours))\
+              .filter(ArtifactImport.status == "running")\
+              .update(dict(mtime=now),synchronize_session=False)
+            session.commit()
+        cutoff = now - datetime.timedelta(seconds=self._stale_timeout)
+        q = session.query(ArtifactImport.id,ArtifactImport.attempts)\
+          .filter(ArtifactImport.status == "running")\
+          .filter((ArtifactImport.mtime == None) | (ArtifactImport.mtime < cutoff))
+        if ours:
+            q = q.filter(~ArtifactImport.id.in_(ours))
+        (requeued,failed) = ([],[])
+        for (artifact_import_id,attempts) in q.all():
+            stale = session.query(ArtifactImport)\
+              .filter(ArtifactImport.id == artifact_import_id)\
+              .filter(ArtifactImport.status == "running")\
+              .filter((ArtifactImport.mtime == None) | (ArtifactImport.mtime < cutoff))
+            if (attempts or 0) < self._max_attempts:
+                if stale.update(dict(status="queued",queue_time=now,mtime=now),
+                                synchronize_session=False):
+                    requeued.append(artifact_import_id)
+            else:
+                if stale.update(dict(status="failed",mtime=now),
+                                synchronize_session=False):
+                    failed.append(artifact_import_id)
+            session.commit()
+        for artifact_import_id in requeued:
+            LOG.warning("requeueing orphaned import %d",artifact_import_id)
+            self._queue.put(artifact_import_id)
+        for artifact_import_id in failed:
+            LOG.warning("failing orphaned import %d after %d attempts",
+                        artifact_import_id,self._max_attempts)
+            if self._abandon:
+                try:
+                    self._abandon(
+                        artifact_import_id,
+                        "import was interrupted %d times; giving up" % (
+                            self._max_attempts,))
+                except:
+                    LOG.exception("failed to abandon import %d",artifact_import_id)
+        with self._lock:
+            self._stats["orphans_requeued"] += len(requeued)
+            self._stats["orphans_failed"] += len(failed)
+        return (len(requeued),len(failed))
+
+    def stats(self):
+        """Returns queue depth, running imports, and queue wait times."""
+        now = datetime.datetime.now()
+        with self._lock:
+            s = dict(self._stats)
+            running = len(self._running)
+            oldest_running = min(self._running.values()) if self._running else None
+        s["wait_avg"] = (s["wait_total"] / s["wait_count"]) if s["wait_count"] else 0.0
+        return dict(
+            max_tasks=self._max_tasks,max_queue=self._max_queue,
+            queued=self._queue.qsize(),running=running,
+            longest_running=(now - oldest_running).total_seconds() \
+              if oldest_running else 0.0,
+            **s)
+
+__scheduler__ = None
+__scheduler_lock__ = threading.Lock()
+
+def get_import_scheduler():
+    """Returns this process's ImportScheduler, creating and starting it if necessary (e.g., in each forked server worker)."""
+    global __scheduler__
+
+    with __scheduler_lock__:
+        if __scheduler__ and __scheduler__.pid == os.getpid():
+            return __scheduler__
+        from searcch.importer.server.app import ( app,db,config )
+        from searcch.importer.server.resources.artifact_import import (
+            run_artifact_import,abandon_artifact_import,resolve_followers )
+        __scheduler__ = ImportScheduler(
+            app,db,run_artifact_import,
+            max_tasks=config["server"].getint("max_tasks"),
+            max_queue=config["server"].getint("max_queue"),
+            retry_after=config["server"].getint("retry_after"),
+            stale_timeout=config["server"].getint("stale_timeout"),
+            max_attempts=config["server"].getint("max_attempts"),
+            abandon=abandon_artifact_import,finished=resolve_followers)
+        __scheduler__.start()
+        if config["server"].getboolean("warmup") \
+          and config["server"].get("worker_mode","thread") != "process":
+            from searcch.importer.extractor.registry import warmup
+            threading.Thread(
+                target=warmup,args=(config,),name="extractor-warmup",
+                daemon=True).start()
+        return __scheduler__
@@ -39,8 +39,8 @@ class RemoteBackendTask(object):
     @property
     def session(self):
         if not self._session:
-            import requests
-            self._session = requests.session()
+            from searcch.importer.util.http import new_http_session
+            self._session = new_http_session(self.config)
         return self._session
 
     def run_once(self):
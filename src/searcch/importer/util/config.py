@@ -89,4 +89,10 @@ class RetrieverConfigSection(ConfigSection):
     def section_defaults(cls):
         return dict(
             git="/usr/bin/git",
-            max_file_size="134217728")
+            max_file_size="134217728",workers="4",session_max_bytes="0",
+            cache="true",cache_dir="",cache_max_size="10737418240",
+            git_clone_strategy="full",git_depth="1",git_mirror="false",
+            git_mirror_dir="",chunk_size="1048576",download_retries="3",
+            segments="1",segment_min_size="33554432",unpack="lazy",
+            unpack_max_members="100000",unpack_max_size="4294967296",
+            unpack_max_ratio="200",unpack_threads="0")
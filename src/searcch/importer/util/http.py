@@ -0,0 +1,200 @@
+"""A shared, pooled HTTP client layer for all outbound requests.  Each import
+or component creates its own session (and thus its own cookies and headers)
+with `new_http_session`; all sessions share one pooled adapter."""
+
+import weakref
+import threading
+import logging
+import collections
+
+import requests
+import requests.adapters
+import urllib3.connectionpool
+from future.utils import iteritems
+
+from searcch.importer.util.config import (
+    config_section,ConfigSection,CONFIG_DEFAULTS)
+from searcch.importer.util.httpcache import ResponseCache
+from searcch.importer.util.ratelimit import RateLimiter
+
+LOG = logging.getLogger(__name__)
+
+@config_section
+class HttpConfigSection(ConfigSection):
+
+    @classmethod
+    def section_name(cls):
+        return "http"
+
+    @classmethod
+    def section_defaults(cls):
+        return dict(
+            pool_connections="32",pool_maxsize="16",max_retries="0",
+            timeout="60")
+
+__stats_lock__ = threading.Lock()
+__stats__ = collections.defaultdict(
+    lambda: dict(requests=0,new_connections=0))
+
+def _count(host,key):
+    with __stats_lock__:
+        __stats__[host][key] += 1
+
+def get_http_stats():
+    """Returns a dict of per-host connection statistics: the number of requests sent, the number of new connections opened, and the number of requests that reused a pooled connection."""
+    ret = dict()
+    with __stats_lock__:
+        for (host,s) in iteritems(__stats__):
+            ret[host] = dict(
+                requests=s["requests"],new_connections=s["new_connections"],
+                reused_connections=max(0,s["requests"] - s["new_connections"]))
+    return ret
+
+def get_http_cache_stats():
+    """Returns the response cache statistics, or None if the cache is disabled."""
+    adapter = __adapter__
+    if adapter is None or adapter.cache is None:
+        return None
+    return adapter.cache.stats()
+
+def get_ratelimit_stats():
+    """Returns per-host rate limiter statistics (including queue wait times), or None if rate limiting is disabled."""
+    adapter = __adapter__
+    if adapter is None or adapter.limiter is None:
+        return None
+    return adapter.limiter.stats()
+
+def reset_http_stats():
+    with __stats_lock__:
+        __stats__.clear()
+
+class CountingHTTPConnectionPool(urllib3.connectionpool.HTTPConnectionPool):
+
+    def _new_conn(self):
+        _count(self.host,"new_connections")
+        return super(CountingHTTPConnectionPool,self)._new_conn()
+
+class CountingHTTPSConnectionPool(urllib3.connectionpool.HTTPSConnectionPool):
+
+    def _new_conn(self):
+        _count(self.host,"new_connections")
+        return super(CountingHTTPSConnectionPool,self)._new_conn()
+
+class PooledHTTPAdapter(requests.adapters.HTTPAdapter):
+    """An HTTPAdapter with a default timeout, whose urllib3 connection pools count new connections per host."""
+
+    def __init__(self,timeout=None,cache=None,limiter=None,**kwargs):
+        self._timeout = timeout
+        self._cache = cache
+        self._limiter = limiter
+        super(PooledHTTPAdapter,self).__init__(**kwargs)
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    def init_poolmanager(self,*args,**kwargs):
+        super(PooledHTTPAdapter,self).init_poolmanager(*args,**kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(
+            http=CountingHTTPConnectionPool,
+            https=CountingHTTPSConnectionPool)
+
+    def send(self,request,stream=False,timeout=None,**kwargs):
+        if timeout is None:
+            timeout = self._timeout
+        entry = None
+        cache = self._cache
+        if cache and cache.cacheable(request,stream=stream):
+            (response,entry) = cache.lookup(request)
+            if response is not None:
+                response.connection = self
+                return response
+            if entry:
+                cache.add_validators(request,entry)
+        else:
+            cache = None
+        response = self._send(request,stream=stream,timeout=timeout,**kwargs)
+        if cache:
+            if entry and response.status_code == 304:
+                response.close()
+                response = cache.revalidated(request,entry,response)
+                response.connection = self
+            else:
+                cache.store(request,response)
+        return response
+
+    def _send(self,request,**kwargs):
+        host = urllib3.util.parse_url(request.url).host
+        attempt = 0
+        while True:
+            if self._limiter:
+                self._limiter.acquire(host)
+            if host:
+                _count(host,"requests")
+            response = super(PooledHTTPAdapter,self).send(request,**kwargs)
+            if not self._limiter:
+                return response
+            delay = self._limiter.observe(host,response,attempt=attempt)
+            # Streamed request bodies cannot be resent.
+            if delay is None or hasattr(request.body,"read"):
+                return response
+            response.close()
+            attempt += 1
+
+__lock__ = threading.Lock()
+__adapter__ = None
+__adapter_configured__ = False
+__sessions__ = weakref.WeakSet()
+
+def _get_adapter(config=None):
+    global __adapter__,__adapter_configured__
+
+    with __lock__:
+        if __adapter__ is not None \
+          and (__adapter_configured__ or config is None):
+            return __adapter__
+        hc = _config_values(config,"http")
+        (pc,pm,mr,to) = (int(hc["pool_connections"]),int(hc["pool_maxsize"]),
+                         int(hc["max_retries"]),int(hc["timeout"]))
+        LOG.debug("http adapter: pool_connections=%d pool_maxsize=%d"
+                  " max_retries=%d timeout=%d",pc,pm,mr,to)
+        cache = None
+        try:
+            cache = ResponseCache.from_config(_config_values(config,"http_cache"))
+        except OSError:
+            LOG.warning("failed to create http cache; disabling",exc_info=True)
+        limiter = RateLimiter.from_config(_config_values(config,"ratelimit"))
+        __adapter__ = PooledHTTPAdapter(
+            timeout=to or None,cache=cache,limiter=limiter,
+            pool_connections=pc,pool_maxsize=pm,max_retries=mr)
+        __adapter_configured__ = config is not None
+        # Sessions created before the first config was supplied must use
+        # the configured adapter too.
+        for session in list(__sessions__):
+            _mount(session,__adapter__)
+        return __adapter__
+
+def _config_values(config,section):
+    """Returns a dict of the config values in `section`, including DEFAULT values, from `config` if provided; else from the registered defaults."""
+    if config is not None:
+        return dict(config[section])
+    ret = dict(CONFIG_DEFAULTS["DEFAULT"])
+    ret.update(CONFIG_DEFAULTS[section])
+    return ret
+
+def _mount(session,adapter):
+    session.mount("http://",adapter)
+    session.mount("https://",adapter)
+
+def new_http_session(config=None):
+    """Returns a new requests.Session, with its own cookies and headers, that shares the process-wide connection pools.  The first call that provides a config determines pool sizes and timeouts for all sessions; calls without a config use the [http] defaults until then.  Do not close the returned session; that would close the shared pools."""
+    adapter = _get_adapter(config)
+    session = requests.Session()
+    with __lock__:
+        _mount(session,__adapter__ or adapter)
+        __sessions__.add(session)
+    return session
@@ -0,0 +1,356 @@
+"""A persistent, content-addressed on-disk cache for HTTP responses."""
+
+import os
+import os.path
+import time
+import json
+import hashlib
+import tempfile
+import threading
+import logging
+
+import requests
+import requests.models
+import requests.structures
+import requests.utils
+from future.utils import iteritems
+
+from searcch.importer.util.config import (
+    config_section,ConfigSection )
+
+LOG = logging.getLogger(__name__)
+
+@config_section
+class HttpCacheConfigSection(ConfigSection):
+
+    @classmethod
+    def section_name(cls):
+        return "http_cache"
+
+    @classmethod
+    def section_defaults(cls):
+        return dict(
+            enabled="true",dir="",max_size="1073741824",default_ttl="0",
+            host_ttls="dl.acm.org=86400,www.usenix.org=86400,www.ndss-symposium.org=86400,www.acsac.org=86400,export.arxiv.org=86400",
+            post_urls="https://dl.acm.org/action/exportCiteProcCitation")
+
+#
+# We only cache final, successful responses.  Temporary redirects are not
+# cached, since some sites (e.g. the ACM DL) use them to set cookies.
+#
+CACHEABLE_STATUS = (200,203,301,308)
+#
+# Request headers that select a different representation, or different
+# credentials; they are folded into the cache key.
+#
+KEY_HEADERS = ("Accept","Accept-Encoding","Authorization","X-Api-Key","Range")
+
+def parse_host_ttls(value):
+    """Parses a "host=seconds,host=seconds" string into a dict."""
+    ret = dict()
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item or not "=" in item:
+            continue
+        (host,ttl) = item.split("=",1)
+        ret[host.strip().lower()] = int(ttl.strip())
+    return ret
+
+class ResponseCache(object):
+    """
+    An on-disk HTTP response cache.  Response bodies are stored by their
+    sha256 digest under `blobs/`; per-request metadata (status, headers,
+    validators, store time) is stored under `index/`, keyed by a hash of
+    the method, URL, body, and representation-selecting request headers.
+    Fresh entries (per host TTL) are served from disk; stale entries with
+    an ETag or Last-Modified validator are revalidated with a conditional
+    request.  Blobs are evicted least-recently-used once the cache grows
+    beyond `max_size`.
+    """
+
+    def __init__(self,cache_dir,max_size=0,default_ttl=0,host_ttls={},
+                 post_urls=()):
+        self._cache_dir = cache_dir
+        self._index_dir = os.path.join(cache_dir,"index")
+        self._blob_dir = os.path.join(cache_dir,"blobs")
+        self._max_size = max_size
+        self._default_ttl = default_ttl
+        self._host_ttls = dict(host_ttls)
+        self._post_urls = set(post_urls)
+        self._lock = threading.Lock()
+        self._size = None
+        self._stats = dict(hits=0,misses=0,revalidated=0,stores=0,evictions=0)
+        os.makedirs(self._index_dir,exist_ok=True)
+        os.makedirs(self._blob_dir,exist_ok=True)
+
+    @classmethod
+    def from_config(cls,values):
+        """Creates a ResponseCache from a dict of [http_cache] config values, or returns None if the cache is disabled."""
+        if str(values.get("enabled","")).lower() not in ("true","1","yes","on"):
+            return None
+        cache_dir = values.get("dir")
+        if not cache_dir:
+            cache_dir = os.path.join(values["tmpdir"],"http-cache")
+        return cls(
+            cache_dir,max_size=int(values.get("max_size") or 0),
+            default_ttl=int(values.get("default_ttl") or 0),
+            host_ttls=parse_host_ttls(values.get("host_ttls")),
+            post_urls=[ x.strip() for x in (values.get("post_urls") or "").split(",")
+                        if x.strip() ])
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def stats(self):
+        with self._lock:
+            ret = dict(self._stats)
+        ret["size"] = self._get_size()
+        ret["max_size"] = self._max_size
+        return ret
+
+    def cacheable(self,request,stream=False):
+        """Returns True if `request` (a requests.PreparedRequest) may be served from or stored in the cache."""
+        if stream:
+            return False
+        if "If-None-Match" in request.headers \
+          or "If-Modified-Since" in request.headers:
+            return False
+        cc = request.headers.get("Cache-Control","")
+        if "no-cache" in cc or "no-store" in cc:
+            return False
+        if request.method == "GET":
+            return True
+        if request.method == "POST" and request.url in self._post_urls:
+            return True
+        return False
+
+    def ttl(self,url):
+        host = (requests.utils.urlparse(url).hostname or "").lower()
+        return self._host_ttls.get(host,self._default_ttl)
+
+    def key(self,request):
+        h = hashlib.sha256()
+        h.update(request.method.encode("utf-8"))
+        h.update(b"\0")
+        h.update(request.url.encode("utf-8"))
+        for name in KEY_HEADERS:
+            h.update(b"\0")
+            h.update(str(request.headers.get(name,"")).encode("utf-8"))
+        h.update(b"\0")
+        body = request.body
+        if body:
+            if not isinstance(body,bytes):
+                body = str(body).encode("utf-8")
+            h.update(body)
+        return h.hexdigest()
+
+    def _index_path(self,key):
+        return os.path.join(self._index_dir,key[:2],key + ".json")
+
+    def _blob_path(self,digest):
+        return os.path.join(self._blob_dir,digest[:2],digest)
+
+    def _atomic_write(self,path,data):
+        d = os.path.dirname(path)
+        os.makedirs(d,exist_ok=True)
+        (fd,tmppath) = tempfile.mkstemp(dir=d,prefix=".tmp-")
+        try:
+            with os.fdopen(fd,"wb") as f:
+                f.write(data)
+            os.replace(tmppath,path)
+        except:
+            if os.path.exists(tmppath):
+                os.unlink(tmppath)
+            raise
+
+    def _load_entry(self,key):
+        index_path = self._index_path(key)
+        try:
+            with open(index_path,"r") as f:
+                entry = json.load(f)
+            blob_path = self._blob_path(entry["digest"])
+        except (OSError,ValueError,KeyError):
+            return (None,None)
+        try:
+            with open(blob_path,"rb") as f:
+                content = f.read()
+            # Mark the blob as recently used, for LRU eviction.
+            os.utime(blob_path)
+            return (entry,content)
+        except OSError:
+            # The blob was evicted; drop its index entry too.
+            self._unlink(index_path)
+            return (None,None)
+
+    def _unlink(self,path):
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
+
+    def _save_entry(self,key,entry):
+        self._atomic_write(
+            self._index_path(key),json.dumps(entry).encode("utf-8"))
+
+    def lookup(self,request):
+        """Returns (response,entry): a cached requests.Response if `request` can be answered from disk without revalidation; else (None,entry), where entry is a stale cache entry that may be revalidated, or None."""
+        key = self.key(request)
+        (entry,content) = self._load_entry(key)
+        if not entry:
+            with self._lock:
+                self._stats["misses"] += 1
+            return (None,None)
+        entry["key"] = key
+        entry["content"] = content
+        if time.time() - entry["stored"] < entry.get("ttl",0):
+            with self._lock:
+                self._stats["hits"] += 1
+            return (self.build_response(request,entry),entry)
+        if not entry.get("etag") and not entry.get("last_modified"):
+            with self._lock:
+                self._stats["misses"] += 1
+            return (None,None)
+        return (None,entry)
+
+    def add_validators(self,request,entry):
+        """Adds conditional headers to `request` so that the server can revalidate the stale cache `entry`."""
+        if entry.get("etag"):
+            request.headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            request.headers["If-Modified-Since"] = entry["last_modified"]
+
+    def revalidated(self,request,entry,response):
+        """Handles a 304 response to a conditional request: refreshes `entry` and returns the cached response."""
+        for name in ("ETag","Last-Modified","Cache-Control","Expires","Date"):
+            if name in response.headers:
+                entry["headers"][name] = response.headers[name]
+        entry["stored"] = time.time()
+        content = entry.pop("content")
+        key = entry.pop("key")
+        try:
+            self._save_entry(key,entry)
+        except OSError:
+            LOG.debug("failed to update cache entry for %r",request.url,exc_info=True)
+        entry["content"] = content
+        entry["key"] = key
+        with self._lock:
+            self._stats["revalidated"] += 1
+        return self.build_response(request,entry)
+
+    def build_response(self,request,entry):
+        response = requests.models.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        response.url = entry.get("url",request.url)
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = entry["content"]
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+    def store(self,request,response):
+        """Stores a (non-streamed, fully-read) response for `request`, if it is cacheable."""
+        if response.status_code not in CACHEABLE_STATUS:
+            return
+        cc = response.headers.get("Cache-Control","")
+        if "no-store" in cc:
+            return
+        ttl = self.ttl(request.url)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if ttl <= 0 and not etag and not last_modified:
+            return
+        content = response.content or b""
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+        try:
+            added = 0
+            if not os.path.exists(blob_path):
+                self._atomic_write(blob_path,content)
+                added = len(content)
+            # Do not store hop-by-hop or cookie headers.
+            headers = dict([
+                (k,v) for (k,v) in iteritems(response.headers)
+                if k.lower() not in ("set-cookie","connection","keep-alive",
+                                     "transfer-encoding")])
+            entry = dict(
+                url=response.url,method=request.method,status=response.status_code,
+                reason=response.reason,headers=headers,digest=digest,
+                stored=time.time(),ttl=ttl,etag=etag,last_modified=last_modified)
+            self._save_entry(self.key(request),entry)
+        except OSError:
+            LOG.warning("failed to cache response for %r",request.url,exc_info=True)
+            return
+        with self._lock:
+            self._stats["stores"] += 1
+            if self._size is not None:
+                self._size += added
+        if self._max_size and self._get_size() > self._max_size:
+            self.prune()
+
+    def _scan_blobs(self):
+        ret = []
+        for (dirpath,dirnames,filenames) in os.walk(self._blob_dir):
+            for fn in filenames:
+                if fn.startswith(".tmp-"):
+                    continue
+                p = os.path.join(dirpath,fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                ret.append((st.st_mtime,st.st_size,p))
+        return ret
+
+    def _get_size(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum([ x[1] for x in self._scan_blobs() ])
+            return self._size
+
+    def prune(self,target=None,all=False):
+        """Removes least-recently-used blobs until the cache is below `target` bytes (default: 90% of max_size), or all of them if `all` is set.  Also removes index entries whose blob is gone.  Returns (blobs removed, bytes freed)."""
+        if all:
+            target = 0
+        elif target is None:
+            target = int(self._max_size * 0.9)
+        (count,freed) = (0,0)
+        with self._lock:
+            blobs = sorted(self._scan_blobs())
+            size = sum([ x[1] for x in blobs ])
+            for (mtime,bsize,p) in blobs:
+                if size <= target:
+                    break
+                if self._unlink(p):
+                    size -= bsize
+                    count += 1
+                    freed += bsize
+            self._size = size
+            self._stats["evictions"] += count
+        if count:
+            for (dirpath,dirnames,filenames) in os.walk(self._index_dir):
+                for fn in filenames:
+                    p = os.path.join(dirpath,fn)
+                    if all:
+                        self._unlink(p)
+                        continue
+                    try:
+                        with open(p,"r") as f:
+                            digest = json.load(f).get("digest")
+                    except (OSError,ValueError):
+                        digest = None
+                    if not digest or not os.path.exists(self._blob_path(digest)):
+                        self._unlink(p)
+        LOG.debug("http cache pruned %d blobs (%d bytes) to %d bytes",
+                  count,freed,size)
+        return (count,freed)
+
+    def clear(self):
+        self.prune(all=True)
+        for (dirpath,dirnames,filenames) in os.walk(self._index_dir):
+            for fn in filenames:
+                self._unlink(os.path.join(dirpath,fn))
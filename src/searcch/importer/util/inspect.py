@@ -1,46 +1,108 @@
 from __future__ import print_function
 import six
 from future.utils import iteritems
+import threading
 import logging
 
 LOG = logging.getLogger(__name__)
 
+#
+# Outer mime types for which we ask libmagic to look inside the
+# compressed content as well.
+#
+COMPRESSED_MIME_TYPES = (
+    "application/gzip","application/x-gzip","application/x-bzip2",
+    "application/x-xz","application/x-lzma","application/zstd",
+    "application/x-zstd","application/x-compress","application/x-lzip")
+
 class FileTypeInspector(object):
-    """This class attempts to return one or more mime types and classes (the kind of file, e.g. plain, compressed, archive, image, etc) that are associated with a file.  It returns a list of mime types, from outermost encapsulation to innermost.  It first attempts to use python-magic, then falls back to python-filetype."""
+    """This class attempts to return one or more mime types and classes (the kind of file, e.g. plain, compressed, archive, image, etc) that are associated with a file.  It returns a list of mime types, from outermost encapsulation to innermost.  It first attempts to use python-magic, then falls back to python-filetype.  Files are read once, in binary mode, and the libmagic handles are created once per process and shared."""
+
+    #
+    # Bytes read from the head of each file.  libmagic needs more than a
+    # few KB to see inside compressed content.
+    #
+    bufsize = 8192
+
+    __magic__ = None
+    __magic_lock__ = threading.Lock()
 
     @classmethod
-    def _try_magic(cls,filepath):
-        import magic
-        f = open(filepath)
-        buf = f.read(2048)
-        f.close()
-        (mime_type,desc) = (
-            magic.from_buffer(buf,mime=True),magic.from_buffer(buf))
-        im = magic.Magic(decompress=True)
-        (inner_mime_type,inner_desc) = (
-            im.from_buffer(buf,mime=True),im.from_buffer(buf))
+    def _get_magic(cls):
+        """Returns a dict of cached magic.Magic handles, or raises ImportError if python-magic is unavailable."""
+        if cls.__magic__ is None:
+            import magic
+            with cls.__magic_lock__:
+                if cls.__magic__ is None:
+                    cls.__magic__ = dict(
+                        mime=magic.Magic(mime=True),desc=magic.Magic(),
+                        inner_mime=magic.Magic(mime=True,uncompress=True),
+                        inner_desc=magic.Magic(uncompress=True))
+        return cls.__magic__
+
+    @classmethod
+    def _read(cls,filepath):
+        with open(filepath,"rb") as f:
+            return f.read(cls.bufsize)
+
+    @classmethod
+    def _try_magic(cls,buf):
+        handles = cls._get_magic()
+        mime_type = handles["mime"].from_buffer(buf)
         if not mime_type:
             return None
-        if mime_type == inner_mime_type:
+        desc = handles["desc"].from_buffer(buf)
+        if not mime_type in COMPRESSED_MIME_TYPES:
+            return [(mime_type,desc)]
+        (inner_mime_type,inner_desc) = (
+            handles["inner_mime"].from_buffer(buf),
+            handles["inner_desc"].from_buffer(buf))
+        if not inner_mime_type or mime_type == inner_mime_type:
             return [(mime_type,desc)]
         else:
             return [(mime_type,desc),(inner_mime_type,inner_desc)]
 
     @classmethod
-    def _try_filetype(cls,filepath):
+    def _try_filetype(cls,buf):
         import filetype
-        kind = filetype.guess(filepath)
+        kind = filetype.guess(buf)
         if kind:
             return [(kind.mime,kind.extension)]
 
     @classmethod
-    def inspect(cls,filepath):
-        """Returns a list of mime types, from outermost encapsulation to innermost.  Each list item is a tuple (<mime-type>,<description>)."""
+    def inspect_buffer(cls,buf):
+        """Returns a list of mime types for the leading bytes `buf` of a file, from outermost encapsulation to innermost, or None."""
         try:
-            return cls._try_magic(filepath)
+            return cls._try_magic(buf)
         except:
             pass
         try:
-            return cls._try_filetype(filepath)
+            return cls._try_filetype(buf)
         except:
             pass
+
+    @classmethod
+    def inspect(cls,filepath):
+        """Returns a list of mime types, from outermost encapsulation to innermost.  Each list item is a tuple (<mime-type>,<description>)."""
+        try:
+            buf = cls._read(filepath)
+        except (OSError,IOError):
+            LOG.debug("failed to read %r",filepath,exc_info=True)
+            return None
+        return cls.inspect_buffer(buf)
+
+    @classmethod
+    def inspect_many(cls,filepaths):
+        """Inspects each of `filepaths` and returns a dict of path to mime type list (or None, if the path could not be read or typed)."""
+        ret = dict()
+        for filepath in filepaths:
+            ret[filepath] = cls.inspect(filepath)
+        return ret
+
+    @classmethod
+    def mime_type(cls,filepath,default=None):
+        """Returns the outermost mime type of `filepath`, or `default`."""
+        mimelist = cls.inspect(filepath)
+        if mimelist and mimelist[0][0]:
+            return mimelist[0][0]
+        return default
@@ -0,0 +1,220 @@
+"""Per-host rate limiting and backoff for outbound HTTP requests."""
+
+import time
+import random
+import threading
+import logging
+import email.utils
+from future.utils import iteritems
+
+from searcch.importer.util.config import (
+    config_section,ConfigSection )
+from searcch.importer.exceptions import RateLimitedError
+
+LOG = logging.getLogger(__name__)
+
+@config_section
+class RateLimitConfigSection(ConfigSection):
+
+    @classmethod
+    def section_name(cls):
+        return "ratelimit"
+
+    @classmethod
+    def section_defaults(cls):
+        return dict(
+            enabled="true",default_rate="0",default_burst="1",
+            hosts="dl.acm.org=0.5:2,ieeexplore.ieee.org=1:2,api.github.com=1:5,api.semanticscholar.org=0.3:1",
+            max_retries="5",backoff_base="2",max_backoff="120",max_wait="600")
+
+def parse_host_rates(value):
+    """Parses a "host=rate:burst,..." string (rate in requests/second) into a dict of (rate,burst) tuples."""
+    ret = dict()
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item or not "=" in item:
+            continue
+        (host,spec) = item.split("=",1)
+        (rate,burst) = (spec,"1")
+        if ":" in spec:
+            (rate,burst) = spec.split(":",1)
+        ret[host.strip().lower()] = (float(rate),max(1,int(burst)))
+    return ret
+
+def parse_retry_after(value,now=None):
+    """Returns the number of seconds to wait given a Retry-After header value (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0,float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError,ValueError):
+        return None
+    return max(0.0,when - (now or time.time()))
+
+class TokenBucket(object):
+    """A token bucket that hands out reservations: callers take a token (possibly going into debt) and sleep until it would have been available.  A rate of 0 means unlimited, except while the bucket is blocked."""
+
+    def __init__(self,rate,burst=1):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token, and returns the number of seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0,self._blocked_until - now)
+            if self._rate > 0:
+                self._tokens = min(
+                    self._burst,self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait,-self._tokens / self._rate)
+            return wait
+
+    def block(self,seconds):
+        """Prevents any request from using this bucket for `seconds`."""
+        with self._lock:
+            self._blocked_until = max(
+                self._blocked_until,time.monotonic() + seconds)
+
+class RateLimiter(object):
+    """Schedules requests per host with token buckets, honors Retry-After and X-RateLimit-* response headers, and tracks queue wait times."""
+
+    def __init__(self,host_rates={},default_rate=0.0,default_burst=1,
+                 max_retries=5,backoff_base=2.0,max_backoff=120.0,
+                 max_wait=600.0):
+        self._host_rates = dict(host_rates)
+        self._default_rate = default_rate
+        self._default_burst = default_burst
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._max_backoff = max_backoff
+        self._max_wait = max_wait
+        self._buckets = dict()
+        self._lock = threading.Lock()
+        self._stats = dict()
+
+    @classmethod
+    def from_config(cls,values):
+        """Creates a RateLimiter from a dict of [ratelimit] config values, or returns None if rate limiting is disabled."""
+        if str(values.get("enabled","")).lower() not in ("true","1","yes","on"):
+            return None
+        return cls(
+            host_rates=parse_host_rates(values.get("hosts")),
+            default_rate=float(values.get("default_rate") or 0),
+            default_burst=int(values.get("default_burst") or 1),
+            max_retries=int(values.get("max_retries") or 0),
+            backoff_base=float(values.get("backoff_base") or 2),
+            max_backoff=float(values.get("max_backoff") or 0),
+            max_wait=float(values.get("max_wait") or 0))
+
+    @property
+    def max_retries(self):
+        return self._max_retries
+
+    def _rate_for(self,host):
+        # Match the host, then each parent domain (e.g. a.b.org, b.org).
+        parts = host.split(".")
+        for i in range(0,len(parts)):
+            h = ".".join(parts[i:])
+            if h in self._host_rates:
+                return self._host_rates[h]
+        return (self._default_rate,self._default_burst)
+
+    def bucket(self,host):
+        host = (host or "").lower()
+        with self._lock:
+            if not host in self._buckets:
+                (rate,burst) = self._rate_for(host)
+                self._buckets[host] = TokenBucket(rate,burst)
+                self._stats[host] = dict(
+                    requests=0,waited=0,wait_total=0.0,wait_max=0.0,
+                    throttled=0,retries=0,rejected=0)
+            return self._buckets[host]
+
+    def acquire(self,host):
+        """Blocks until a request to `host` may be sent; returns the time waited.  Raises RateLimitedError instead if that would take longer than max_wait seconds."""
+        bucket = self.bucket(host)
+        wait = bucket.reserve()
+        if self._max_wait and wait > self._max_wait:
+            with self._lock:
+                self._stats[(host or "").lower()]["rejected"] += 1
+            raise RateLimitedError(
+                wait,"%s is rate limited for %.1fs (> max_wait %.1fs)" % (
+                    host,wait,self._max_wait))
+        if wait > 0:
+            LOG.debug("ratelimit: waiting %.3fs for %s",wait,host)
+            time.sleep(wait)
+        with self._lock:
+            s = self._stats[(host or "").lower()]
+            s["requests"] += 1
+            if wait > 0:
+                s["waited"] += 1
+                s["wait_total"] += wait
+                s["wait_max"] = max(s["wait_max"],wait)
+        return wait
+
+    def observe(self,host,response,attempt=0):
+        """Updates the host's schedule from `response` headers.  Returns the number of seconds to wait before retrying the request, or None if it should not be retried."""
+        bucket = self.bucket(host)
+        headers = response.headers
+        delay = parse_retry_after(headers.get("Retry-After"))
+        exhausted = False
+        try:
+            if int(headers.get("X-RateLimit-Remaining","1")) <= 0 \
+              and headers.get("X-RateLimit-Reset"):
+                # GitHub-style: an epoch timestamp when the window resets.
+                exhausted = True
+                rdelay = max(0.0,float(headers["X-RateLimit-Reset"]) - time.time())
+                if self._max_wait and rdelay > self._max_wait:
+                    # Nobody will wait that long; let requests fail fast
+                    # at the server instead of stalling every thread.
+                    LOG.warning("ratelimit: %s is exhausted for %.1fs (> max_wait %.1fs)",
+                                host,rdelay,self._max_wait)
+                else:
+                    bucket.block(rdelay)
+                if delay is None:
+                    delay = rdelay
+        except ValueError:
+            pass
+        if not (response.status_code == 429
+                or (response.status_code == 503 and delay is not None)
+                or (response.status_code == 403 and exhausted)):
+            return None
+        with self._lock:
+            self._stats[(host or "").lower()]["throttled"] += 1
+        if delay is None:
+            delay = min(self._max_backoff,self._backoff_base ** (attempt + 1))
+            delay += random.uniform(0,delay / 4.0)
+        if self._max_wait and delay > self._max_wait:
+            LOG.warning("ratelimit: %s asked us to wait %.1fs (> max_wait %.1fs);"
+                        " not retrying",host,delay,self._max_wait)
+            return None
+        bucket.block(delay)
+        if attempt >= self._max_retries:
+            return None
+        with self._lock:
+            self._stats[(host or "").lower()]["retries"] += 1
+        LOG.info("ratelimit: %s returned %d; retrying in %.1fs",
+                 host,response.status_code,delay)
+        return delay
+
+    def stats(self):
+        """Returns per-host request counts and queue wait times."""
+        ret = dict()
+        with self._lock:
+            for (host,s) in iteritems(self._stats):
+                ret[host] = dict(s)
+                ret[host]["wait_avg"] = (s["wait_total"] / s["waited"]) \
+                  if s["waited"] else 0.0
+        return ret
@@ -1,15 +1,27 @@
 
+import six
 import os
 import os.path
 import subprocess
+import fcntl
 #import requests
 #import requests.utils
 import logging
 import shutil
 import re
 import sys
+import hashlib
+import json
+import time
+import threading
+import concurrent.futures
 
 from searcch.importer.util.inspect import FileTypeInspector
+from searcch.importer.util.retrieve.cache import get_blob_cache
+from searcch.importer.util.unpack import unpack_file
+from searcch.importer.util.unpack.archive import safe_member_path
+from searcch.importer.exceptions import (
+    ArchiveLimitError,UnpackError )
 
 LOG = logging.getLogger(__name__)
 
@@ -17,7 +29,8 @@ class RetrievedFile(object):
 
     def __init__(self,artifact_file,destdir,raw_path,
                  unpacked=None,unpacked_path=None,
-                 mime_type=None,mime_desc=None):
+                 mime_type=None,mime_desc=None,archive=None,
+                 unpacked_file=None):
         self._artifact_file = artifact_file
         self._destdir = destdir
         self._raw_path = raw_path
@@ -26,6 +39,9 @@ class RetrievedFile(object):
             self._unpacked = True
         self._mime_type = mime_type
         self._mime_desc = mime_desc
+        self._archive = archive
+        self._unpacked_file = unpacked_file
+        self._lock = threading.Lock()
 
     @property
     def artifact_file(self):
@@ -55,6 +71,54 @@ class RetrievedFile(object):
     def mime_desc(self):
         return self._mime_desc
 
+    @property
+    def archive(self):
+        """An ArchiveView of the raw file if it is an archive, else None.  If the retriever unpacked lazily, only some members exist beneath `path`; use this to list the rest, or extract them on demand."""
+        return self._archive
+
+    @property
+    def unpacked_file(self):
+        """An UnpackedFile describing how the raw file was unpacked (by which unpacker, bytes written, time taken), or None if it was not."""
+        return self._unpacked_file
+
+    def archive_members(self):
+        """Returns the ArchiveMembers of `archive`, or an empty list if the raw file is not a (readable) archive."""
+        if not self._archive:
+            return []
+        with self._lock:
+            try:
+                return self._archive.members()
+            except:
+                LOG.warning("failed to list archive %r",self._raw_path,exc_info=True)
+                return []
+
+    def member_paths(self,names):
+        """Returns a dict of archive member name to its path beneath `path`, for each of `names` that is (or can be) unpacked there.  Members the retriever did not unpack (see [retrieve] unpack = lazy) are extracted on demand through `archive`, in a single pass."""
+        ret = dict()
+        if not os.path.isdir(self.path):
+            return ret
+        with self._lock:
+            missing = dict()
+            for name in names:
+                try:
+                    path = safe_member_path(self.path,name)
+                except ArchiveLimitError:
+                    continue
+                if os.path.isfile(path):
+                    ret[name] = path
+                else:
+                    missing[name] = path
+            if missing and self._archive:
+                try:
+                    self._archive.extract(missing.keys(),self.path)
+                except:
+                    LOG.warning("failed to extract %d members of %r",
+                                len(missing),self._raw_path,exc_info=True)
+                for (name,path) in missing.items():
+                    if os.path.isfile(path):
+                        ret[name] = path
+        return ret
+
     def set_unpacked_path(self,path):
         self._unpacked = True
         self._unpacked_path = path
@@ -65,6 +129,41 @@ class RetrievedFile(object):
 
 class GitError(Exception):
     pass
+
+class ByteBudget(object):
+    """A thread-safe aggregate byte budget, shared by concurrent retrievals in a single import session.  A limit of 0 means unlimited."""
+
+    def __init__(self,limit=0):
+        self._limit = limit
+        self._used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def used(self):
+        return self._used
+
+    def available(self,nbytes):
+        """Returns True if `nbytes` more bytes would currently fit in the budget."""
+        if not self._limit:
+            return True
+        with self._lock:
+            return self._used + nbytes <= self._limit
+
+    def charge(self,nbytes):
+        """Charges `nbytes` against the budget; returns False (without charging) if that would exceed it."""
+        with self._lock:
+            if self._limit and self._used + nbytes > self._limit:
+                return False
+            self._used += nbytes
+            return True
+
+    def refund(self,nbytes):
+        with self._lock:
+            self._used = max(0,self._used - nbytes)
         
 class Retriever(object):
     """Helper class to retrieve ArtifactFiles into temp storage, while respecting resource limits.  Understands http(s) and git repos.  ArtifactFiles are stored in <destdir>/raw .  If unspecified, <destdir> defaults to <tmpdir>/artifact.id/artifact_file.id ."""
@@ -76,14 +175,22 @@ class Retriever(object):
             self.max_file_size = int(config["retrieve"]["max_file_size"])
             if self.max_file_size < 0:
                 self.max_file_size = 0
+        self._cache = get_blob_cache(config)
 
     @property
     def config(self):
         return self._config
 
-    def retrieve(self,artifact_file,artifact,destdir=None,unpack=True):
+    @property
+    def cache(self):
+        return self._cache
+
+    def retrieve(self,artifact_file,artifact,destdir=None,unpack=True,
+                 budget=None,updates=None):
+        """Retrieves `artifact_file` into `destdir`; returns a RetrievedFile, or None if it was skipped.  The file's size is set on `artifact_file` if unset; if `updates` (a dict) is given, it is recorded there instead, for the caller to apply (e.g. when retrieving in a thread that must not modify database objects)."""
         import requests
         import requests.utils
+        from searcch.importer.util.http import new_http_session
         try:
             up = requests.utils.urlparse(artifact_file.url)
             if not up.scheme:
@@ -97,38 +204,15 @@ class Retriever(object):
                 self.config["DEFAULT"]["tmpdir"],str(artifact_file.artifact.id),
                 str(artifact_file.id))
         rawpath = os.path.join(destdir,"raw")
-        unpacked_path = None
+        unpacked = None
         git = "git"
         if "retrieve" in self.config and "git" in self.config["retrieve"]:
             git = self.config["retrieve"]["git"]
         if artifact_file.filetype == "application/x-git":
-            clone_url = artifact_file.url
-            ref = None
-            for meta in artifact.meta:
-                if meta.name == "clone_url":
-                    clone_url = meta.value
-                if meta.name == "ref":
-                    ref = meta.value
-            res = subprocess.call(
-                [git,"ls-remote",clone_url])
-            if res != 0:
-                raise FileNotFoundError("repository not found")
-            os.makedirs(destdir)
-            res = subprocess.call(
-                [git,"clone",clone_url,rawpath])
-            if res:
-                raise GitError("failed to clone %r" % (rawpath,))
-            if ref:
-                curdir = os.getcwd()
-                os.chdir(rawpath)
-                res = subprocess.call(
-                    [git,"checkout",ref])
-                os.chdir(curdir)
-                if res:
-                    raise GitError("failed to checkout ref %r" % (ref,))
+            self._retrieve_git(artifact_file,artifact,destdir,rawpath,git=git)
             (mime_type,mime_desc) = ("application/x-git","git")
         else:
-            session = requests.session()
+            session = new_http_session(self.config)
             url = artifact_file.url
             if url.startswith("https://ieeexplore.ieee.org/stamp"):
                 res = session.get(url,headers={"User-Agent":"Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Mobile Safari/537.36"})
@@ -141,8 +225,11 @@ class Retriever(object):
                     LOG.warning("Failed to download IEEE Xplore URL %r",url)
                     return None
             rawpath = os.path.join(destdir,"raw")
-            os.makedirs(destdir)
+            # The destdir may exist if we are resuming an interrupted import;
+            # _download resumes any partial download.
+            os.makedirs(destdir,exist_ok=True)
             head_size = None
+            head_check = None
             try:
                 head_check = session.head(url,allow_redirects=True)
                 if head_check.status_code == requests.codes.ok:
@@ -153,34 +240,46 @@ class Retriever(object):
             except:
                 pass
             if self.max_file_size and head_size and head_size > self.max_file_size:
-                if not artifact_file.size:
-                    artifact_file.size = head_size
+                self._set_size(artifact_file,head_size,updates)
                 LOG.warn("file %r larger (%d) than max_file_size (%d); skipping fetch",
                          url,head_size,self.max_file_size)
                 return None
-            response = session.get(url,stream=True)
-            response.raise_for_status()
-            fd = open(rawpath,'wb')
-            total_bytes = 0
-            for buf in response.iter_content(4096):
-                fd.write(buf)
-                total_bytes += len(buf)
-                if self.max_file_size and total_bytes > self.max_file_size:
-                    LOG.warn("partially-fetched file %r larger than max_file_size (%d); aborting fetch",
-                             url,self.max_file_size)
-                    fd.close()
+            if budget and head_size and not budget.available(head_size):
+                self._set_size(artifact_file,head_size,updates)
+                LOG.warn("file %r (%d) exceeds remaining session byte budget"
+                         " (%d/%d used); skipping fetch",
+                         url,head_size,budget.used,budget.limit)
+                return None
+            digest = None
+            if self.cache and head_check is not None \
+              and head_check.status_code == requests.codes.ok:
+                digest = self.cache.lookup(url,head_check.headers)
+            if digest and self.cache.link(digest,rawpath):
+                LOG.debug("retrieved %r from blob cache (%s)",url,digest)
+                headers = head_check.headers
+                total_bytes = os.path.getsize(rawpath)
+                # Cached files count against the budget like downloads.
+                if budget and not budget.charge(total_bytes):
+                    LOG.warn("cached file %r (%d) exceeds remaining session"
+                             " byte budget (%d/%d used); skipping",
+                             url,total_bytes,budget.used,budget.limit)
                     os.unlink(rawpath)
+                    self._set_size(artifact_file,total_bytes,updates)
+                    return None
+            else:
+                (headers,total_bytes) = self._download(
+                    session,url,rawpath,budget=budget,
+                    head_headers=head_check.headers if head_size else None)
+                if headers is None:
                     return None
-            fd.close()
-            if not artifact_file.size:
-                artifact_file.size = total_bytes
+            self._set_size(artifact_file,total_bytes,updates)
             (mime_type,mime_desc) = (None,None)
             mimelist = FileTypeInspector.inspect(rawpath)
             if mimelist:
                 (mime_type,mime_desc) = mimelist[0]
             if not mime_type:
                 try:
-                    ct = response.headers["content-type"]
+                    ct = headers["content-type"]
                     idx = ct.find(";")
                     if idx > 0:
                         mime_type = ct[:idx]
@@ -189,14 +288,398 @@ class Retriever(object):
                 except:
                     pass
             if unpack:
-                # XXX: shutil.unpack_archive is only Python >=3.3
-                try:
-                    extdestdir = os.path.join(destdir,"unpacked")
-                    shutil.unpack_archive(rawpath,extdestdir)
-                    unpacked_path = extdestdir
-                except:
-                    pass
+                unpacked = self._unpack(rawpath,destdir,mime_type)
         return RetrievedFile(
             artifact_file,destdir,rawpath,
-            unpacked_path=unpacked_path,
-            mime_type=mime_type,mime_desc=mime_desc)
+            unpacked_path=unpacked.path if unpacked else None,
+            mime_type=mime_type,mime_desc=mime_desc,
+            archive=unpacked.archive if unpacked else None,
+            unpacked_file=unpacked)
+
+    def _unpack(self,rawpath,destdir,mime_type):
+        """Unpacks the file at `rawpath` into <destdir>/unpacked with the Unpacker registered for `mime_type`.  In lazy mode ([retrieve] unpack = lazy, the default), only README, LICENSE, COPYING and CITATION.cff files near the top of tar and zip archives are extracted; extractors extract other members on demand (see RetrievedFile.member_paths).  With unpack = full, archives are fully extracted.  Returns an UnpackedFile, or None if `rawpath` is not something we can unpack, or exceeds the unpack limits."""
+        mode = self.config["retrieve"].get("unpack","lazy")
+        if mode == "none":
+            return None
+        outpath = os.path.join(destdir,"unpacked")
+        if os.path.isdir(outpath):
+            shutil.rmtree(outpath)
+        elif os.path.exists(outpath):
+            os.unlink(outpath)
+        try:
+            return unpack_file(
+                rawpath,destdir,"unpacked",mime_type=mime_type,
+                config=self.config,lazy=(mode == "lazy"))
+        except ArchiveLimitError:
+            LOG.warning("not unpacking %r: %s",rawpath,sys.exc_info()[1])
+        except UnpackError:
+            LOG.warning("failed to unpack %r: %s",rawpath,sys.exc_info()[1])
+        except Exception:
+            LOG.warning("failed to unpack %r",rawpath,exc_info=True)
+        return None
+
+    def _git(self,git,args,cwd=None):
+        """Runs `git` non-interactively; returns (returncode,output)."""
+        cmd = [git]
+        if cwd:
+            cmd += ["-C",cwd]
+        cmd += args
+        env = dict(os.environ)
+        env["GIT_TERMINAL_PROMPT"] = "0"
+        LOG.debug("running %r",cmd)
+        p = subprocess.run(
+            cmd,env=env,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+        output = p.stdout.decode("utf-8",errors="replace")
+        if p.returncode:
+            LOG.debug("%r failed (%d): %s",cmd,p.returncode,output)
+        return (p.returncode,output)
+
+    def _clone_error(self,clone_url,output):
+        lo = output.lower()
+        if "not found" in lo or "does not exist" in lo \
+          or "does not appear to be a git repository" in lo \
+          or "could not read username" in lo or "authentication failed" in lo:
+            return FileNotFoundError("repository not found")
+        return GitError("failed to clone %r: %s" % (clone_url,output.strip()))
+
+    def _update_mirror(self,git,clone_url):
+        """Creates or incrementally fetches a bare mirror of `clone_url` in the git_mirror_dir, and returns its path."""
+        mirror_dir = self.config["retrieve"].get("git_mirror_dir")
+        if not mirror_dir:
+            mirror_dir = os.path.join(
+                self.config["DEFAULT"]["tmpdir"],"git-mirrors")
+        os.makedirs(mirror_dir,exist_ok=True)
+        name = hashlib.sha256(clone_url.encode("utf-8")).hexdigest()[:24]
+        mirror = os.path.join(mirror_dir,name + ".git")
+        # Serialize updates to a single mirror, across threads and processes.
+        with open(mirror + ".lock","w") as lockf:
+            fcntl.flock(lockf,fcntl.LOCK_EX)
+            try:
+                if os.path.isdir(mirror):
+                    (res,output) = self._git(
+                        git,["fetch","--prune","--quiet","origin"],cwd=mirror)
+                    if res:
+                        LOG.warning("failed to update mirror %r of %r; removing",
+                                    mirror,clone_url)
+                        shutil.rmtree(mirror)
+                if not os.path.isdir(mirror):
+                    (res,output) = self._git(
+                        git,["clone","--mirror","--quiet",clone_url,mirror])
+                    if res:
+                        if os.path.exists(mirror):
+                            shutil.rmtree(mirror)
+                        raise self._clone_error(clone_url,output)
+            finally:
+                fcntl.flock(lockf,fcntl.LOCK_UN)
+        return mirror
+
+    def _retrieve_git(self,artifact_file,artifact,destdir,rawpath,git="git"):
+        """Clones a git ArtifactFile into `rawpath`.  By default, the full repository is cloned ([retrieve] git_clone_strategy = full), so the git extractor can walk its entire history; `shallow` clones only the latest git_depth commits, so the git extractor sees only their authors and commits.  If git_mirror is set, a local bare mirror of the repository is created or incrementally fetched, and the work tree is a --shared clone of the mirror.  If the artifact has a subpath, only it (and top-level files) are checked out."""
+        clone_url = artifact_file.url
+        ref = None
+        subpath = None
+        for meta in artifact.meta:
+            if meta.name == "clone_url":
+                clone_url = meta.value
+            if meta.name == "ref":
+                ref = meta.value
+            if meta.name == "subpath" and meta.value:
+                subpath = meta.value.strip("/")
+        strategy = self.config["retrieve"].get("git_clone_strategy","full")
+        depth = max(1,self.config["retrieve"].getint("git_depth") or 1)
+        os.makedirs(destdir,exist_ok=True)
+        if os.path.exists(rawpath):
+            # Left by an interrupted import; start over.
+            shutil.rmtree(rawpath)
+        checkout = ref or "HEAD"
+        if self.config["retrieve"].getboolean("git_mirror"):
+            mirror = self._update_mirror(git,clone_url)
+            args = ["clone","--shared","--no-checkout","--quiet",mirror,rawpath]
+        else:
+            args = ["clone","--no-checkout","--quiet"]
+            # NB: no partial (--filter) clones: they set
+            # extensions.partialclone, which the libgit2 in our pinned
+            # pygit2 predates, so the git extractor may not be able to open
+            # them (and would silently find nothing).
+            if strategy == "shallow":
+                args += ["--depth",str(depth)]
+                if ref and not re.match("^[0-9a-fA-F]{7,40}$",ref):
+                    args += ["--branch",ref]
+                    checkout = "HEAD"
+            elif strategy != "full":
+                LOG.warning("unknown git_clone_strategy %r; using full",strategy)
+            args += [clone_url,rawpath]
+        # This also checks that the repository exists; no need for a
+        # separate ls-remote.
+        (res,output) = self._git(git,args)
+        if res:
+            raise self._clone_error(clone_url,output)
+        if checkout != "HEAD" and strategy == "shallow" \
+          and not self.config["retrieve"].getboolean("git_mirror"):
+            (res,output) = self._git(
+                git,["fetch","--quiet","--depth",str(depth),"origin",ref],
+                cwd=rawpath)
+            if res:
+                raise GitError("failed to fetch ref %r" % (ref,))
+            checkout = "FETCH_HEAD"
+        if subpath:
+            # Non-cone patterns: top-level files, plus the subpath (which
+            # may be a file or a directory).
+            (res,output) = self._git(
+                git,["sparse-checkout","set","--no-cone",
+                     "/*","!/*/","/" + subpath],cwd=rawpath)
+            if res:
+                LOG.warning("failed to set sparse checkout %r; checking out everything",
+                            subpath)
+        (res,output) = self._git(
+            git,["checkout","--quiet","-f",checkout],cwd=rawpath)
+        if res:
+            raise GitError("failed to checkout ref %r" % (ref,))
+
+    class _AbortDownload(Exception):
+        pass
+
+    class _NoRangeSupport(Exception):
+        pass
+
+    def _download(self,session,url,rawpath,budget=None,head_headers=None):
+        """Downloads `url` into `rawpath`, subject to max_file_size and `budget`, and adds it to the blob cache.  Data is written to `rawpath`.partial, and interrupted transfers are resumed with Range requests (up to [retrieve] download_retries times); if the server advertises byte ranges and the file is large enough, it is fetched in parallel segments.  Returns (response headers,size), or (None,None) if the download was aborted."""
+        partial = rawpath + ".partial"
+        rconfig = self.config["retrieve"]
+        segments = max(1,rconfig.getint("segments") or 1)
+        size = None
+        if head_headers is not None:
+            try:
+                size = int(head_headers.get("content-length"))
+            except (TypeError,ValueError):
+                pass
+        try:
+            if segments > 1 and size \
+              and size >= (rconfig.getint("segment_min_size") or 0) \
+              and head_headers.get("accept-ranges","").lower() == "bytes" \
+              and not head_headers.get("content-encoding"):
+                try:
+                    (headers,total_bytes) = self._download_segmented(
+                        session,url,partial,size,head_headers,segments,
+                        budget=budget)
+                    digest = None
+                except self._NoRangeSupport:
+                    LOG.debug("%r does not honor ranges; downloading as one stream",url)
+                    os.unlink(partial)
+                    (headers,total_bytes,digest) = self._download_stream(
+                        session,url,partial,budget=budget)
+            else:
+                if os.path.exists(partial + ".segments"):
+                    # A segmented partial file cannot be resumed as a stream.
+                    os.unlink(partial + ".segments")
+                    if os.path.exists(partial):
+                        os.unlink(partial)
+                (headers,total_bytes,digest) = self._download_stream(
+                    session,url,partial,budget=budget)
+        except self._AbortDownload:
+            for p in (partial,partial + ".segments",partial + ".validator"):
+                if os.path.exists(p):
+                    os.unlink(p)
+            return (None,None)
+        os.replace(partial,rawpath)
+        if os.path.exists(partial + ".validator"):
+            os.unlink(partial + ".validator")
+        if self.cache:
+            self.cache.add(rawpath,digest=digest,url=url,headers=headers)
+        return (headers,total_bytes)
+
+    def _retry_delay(self,url,attempt,retries):
+        delay = min(30,2 ** attempt)
+        LOG.warning("download of %r interrupted (attempt %d/%d); resuming in %ds",
+                    url,attempt,retries,delay)
+        time.sleep(delay)
+
+    def _set_size(self,artifact_file,size,updates=None):
+        if artifact_file.size:
+            return
+        if updates is not None:
+            updates["size"] = size
+        else:
+            artifact_file.size = size
+
+    def _charge(self,url,budget,nbytes,total_bytes):
+        """Charges `nbytes` more bytes of a download of `url` that has already fetched `total_bytes`, against max_file_size and `budget`; raises _AbortDownload (without charging) if either would be exceeded."""
+        if self.max_file_size and total_bytes + nbytes > self.max_file_size:
+            LOG.warn("partially-fetched file %r larger than max_file_size (%d); aborting fetch",
+                     url,self.max_file_size)
+            raise self._AbortDownload()
+        if budget and not budget.charge(nbytes):
+            LOG.warn("partially-fetched file %r exceeds session byte budget (%d); aborting fetch",
+                     url,budget.limit)
+            raise self._AbortDownload()
+
+    def _download_stream(self,session,url,partial,budget=None):
+        """Downloads `url` as a single stream into `partial`, resuming after connection errors.  The response's ETag (or Last-Modified) is recorded in `partial`.validator; if `partial` already exists (e.g. from an interrupted import), it is resumed from its end with that validator as If-Range, or discarded if there is none.  Returns (headers,size,sha256 hexdigest)."""
+        import requests
+        chunk_size = max(4096,self.config["retrieve"].getint("chunk_size") or 0)
+        retries = max(0,self.config["retrieve"].getint("download_retries") or 0)
+        validator_path = partial + ".validator"
+        validator = None
+        try:
+            with open(validator_path,"r") as f:
+                validator = f.read().strip() or None
+        except OSError:
+            pass
+        if os.path.exists(partial) and not validator:
+            # Without a validator, we cannot tell whether the partial
+            # data still matches the resource.
+            LOG.debug("%r: no validator for partial download; restarting",url)
+            os.unlink(partial)
+        h = hashlib.sha256()
+        offset = 0
+        if os.path.exists(partial):
+            with open(partial,"rb") as f:
+                while True:
+                    buf = f.read(chunk_size)
+                    if not buf:
+                        break
+                    h.update(buf)
+                    offset += len(buf)
+            LOG.debug("resuming %r at %d",url,offset)
+        attempt = 0
+        charged = 0
+        while True:
+            headers = {}
+            if offset:
+                headers["Range"] = "bytes=%d-" % (offset,)
+                if validator:
+                    headers["If-Range"] = validator
+            try:
+                response = session.get(url,stream=True,headers=headers)
+                if offset and response.status_code == 416:
+                    # We already have the whole entity.
+                    response.close()
+                    response = session.head(url,allow_redirects=True)
+                    return (response.headers,offset,h.hexdigest())
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    LOG.debug("%r: server ignored Range; restarting",url)
+                    (offset,h) = (0,hashlib.sha256())
+                validator = response.headers.get("ETag") \
+                  or response.headers.get("Last-Modified")
+                if validator:
+                    with open(validator_path,"w") as f:
+                        f.write(validator)
+                elif os.path.exists(validator_path):
+                    os.unlink(validator_path)
+                with open(partial,"ab" if offset else "wb") as fd:
+                    for buf in response.iter_content(chunk_size):
+                        self._charge(url,budget,len(buf),offset)
+                        charged += len(buf)
+                        fd.write(buf)
+                        h.update(buf)
+                        offset += len(buf)
+                return (response.headers,offset,h.hexdigest())
+            except self._AbortDownload:
+                if budget:
+                    budget.refund(charged)
+                raise
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout):
+                attempt += 1
+                if attempt > retries:
+                    raise
+                self._retry_delay(url,attempt,retries)
+
+    def _download_segmented(self,session,url,partial,size,head_headers,
+                            segments,budget=None):
+        """Downloads `url` (of `size` bytes) into `partial` as `segments` parallel Range requests.  Completed segments are recorded in `partial`.segments, so an interrupted download only refetches incomplete segments.  Raises _NoRangeSupport if the server does not honor a range request.  Returns (headers,size)."""
+        import requests
+        chunk_size = max(4096,self.config["retrieve"].getint("chunk_size") or 0)
+        retries = max(0,self.config["retrieve"].getint("download_retries") or 0)
+        validator = head_headers.get("ETag") or head_headers.get("Last-Modified")
+        seglen = (size + segments - 1) // segments
+        ranges = [ (start,min(size,start + seglen) - 1)
+                   for start in range(0,size,seglen) ]
+        state_path = partial + ".segments"
+        done = []
+        try:
+            with open(state_path,"r") as f:
+                state = json.load(f)
+            if state.get("size") == size and state.get("validator") == validator \
+              and os.path.exists(partial):
+                done = [ tuple(x) for x in state.get("done",[]) ]
+        except (OSError,ValueError):
+            pass
+        lock = threading.Lock()
+
+        def save_state():
+            with open(state_path + ".tmp","w") as f:
+                json.dump(dict(size=size,validator=validator,done=done),f)
+            os.replace(state_path + ".tmp",state_path)
+
+        with open(partial,"r+b" if done else "wb") as f:
+            f.truncate(size)
+        counter = dict(total=sum([ e - s + 1 for (s,e) in done ]),charged=0)
+
+        def fetch(start,end):
+            pos = start
+            attempt = 0
+            fd = os.open(partial,os.O_WRONLY)
+            try:
+                while pos <= end:
+                    headers = { "Range":"bytes=%d-%d" % (pos,end) }
+                    if validator:
+                        headers["If-Range"] = validator
+                    try:
+                        response = session.get(url,stream=True,headers=headers)
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            response.close()
+                            raise self._NoRangeSupport()
+                        for buf in response.iter_content(chunk_size):
+                            buf = buf[:end - pos + 1]
+                            with lock:
+                                self._charge(url,budget,len(buf),counter["total"])
+                                counter["total"] += len(buf)
+                                counter["charged"] += len(buf)
+                            os.pwrite(fd,buf,pos)
+                            pos += len(buf)
+                            if pos > end:
+                                break
+                        response.close()
+                    except (requests.exceptions.ConnectionError,
+                            requests.exceptions.ChunkedEncodingError,
+                            requests.exceptions.Timeout):
+                        attempt += 1
+                        if attempt > retries:
+                            raise
+                        self._retry_delay(url,attempt,retries)
+            finally:
+                os.close(fd)
+            with lock:
+                done.append((start,end))
+                save_state()
+
+        todo = [ r for r in ranges if not r in done ]
+        LOG.debug("downloading %r in %d segments (%d already done)",
+                  url,len(todo),len(ranges) - len(todo))
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(segments,len(todo) or 1),
+                thread_name_prefix="segment") as executor:
+            futures = [ executor.submit(fetch,s,e) for (s,e) in todo ]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    errors.append(sys.exc_info())
+        if errors:
+            if budget:
+                budget.refund(counter["charged"])
+            for e in errors:
+                if isinstance(e[1],self._NoRangeSupport):
+                    if os.path.exists(state_path):
+                        os.unlink(state_path)
+                    six.reraise(*e)
+            six.reraise(*errors[0])
+        if os.path.exists(state_path):
+            os.unlink(state_path)
+        return (head_headers,size)
@@ -0,0 +1,241 @@
+"""A persistent, content-addressed cache of retrieved artifact files."""
+
+import os
+import os.path
+import time
+import json
+import errno
+import hashlib
+import shutil
+import tempfile
+import threading
+import logging
+
+LOG = logging.getLogger(__name__)
+
+def sha256_file(path,bufsize=1048576):
+    h = hashlib.sha256()
+    with open(path,"rb") as f:
+        while True:
+            buf = f.read(bufsize)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+class BlobCache(object):
+    """
+    A cache of downloaded files.  File contents are stored once, named by
+    their sha256 digest, under `blobs/`.  A URL index under `urls/` maps a
+    URL plus its validators (ETag or Last-Modified, and Content-Length) to
+    a digest, so an unchanged remote file can be found with only a HEAD
+    request.  Cached blobs are hardlinked into session directories (or
+    copied, if the cache is on another filesystem).  Once the cache grows
+    beyond `max_size` bytes, least-recently-used blobs that are not linked
+    into a live session are evicted.
+    """
+
+    def __init__(self,cache_dir,max_size=0):
+        self._cache_dir = cache_dir
+        self._blob_dir = os.path.join(cache_dir,"blobs")
+        self._url_dir = os.path.join(cache_dir,"urls")
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(self._blob_dir,exist_ok=True)
+        os.makedirs(self._url_dir,exist_ok=True)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @staticmethod
+    def url_key(url,headers):
+        """Returns the URL index key for `url` and its response `headers`, or None if the headers carry neither an ETag nor a Last-Modified validator.  A matching Content-Length alone does not show that the content is unchanged."""
+        etag = headers.get("ETag")
+        length = headers.get("Content-Length")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+        h = hashlib.sha256()
+        for x in (url,etag,length,last_modified):
+            h.update(str(x or "").encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _url_path(self,key):
+        return os.path.join(self._url_dir,key[:2],key + ".json")
+
+    def blob_path(self,digest):
+        return os.path.join(self._blob_dir,digest[:2],digest)
+
+    def lookup(self,url,headers):
+        """Returns the digest of the cached content of `url`, if the cache has a blob matching `headers`' validators; else None."""
+        key = self.url_key(url,headers)
+        if not key:
+            return None
+        try:
+            with open(self._url_path(key),"r") as f:
+                entry = json.load(f)
+        except (OSError,ValueError):
+            return None
+        digest = entry.get("digest")
+        if not digest or not os.path.exists(self.blob_path(digest)):
+            return None
+        return digest
+
+    def has(self,digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def link(self,digest,destpath):
+        """Places the blob `digest` at `destpath`, by hardlink if possible, else by copy.  Returns True on success."""
+        bp = self.blob_path(digest)
+        try:
+            # Mark the blob as recently used, for LRU eviction.
+            os.utime(bp)
+            try:
+                os.link(bp,destpath)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV,errno.EPERM,errno.EMLINK,
+                                   errno.ENOTSUP):
+                    raise
+                shutil.copyfile(bp,destpath)
+            return True
+        except OSError:
+            LOG.warning("failed to link cached blob %s to %r",digest,destpath,
+                        exc_info=True)
+            return False
+
+    def add(self,path,digest=None,url=None,headers=None):
+        """Adds the file at `path` to the cache (by hardlink if possible), and records it under `url` and its response `headers` validators.  Returns the content digest."""
+        if not digest:
+            digest = sha256_file(path)
+        bp = self.blob_path(digest)
+        added = 0
+        if not os.path.exists(bp):
+            d = os.path.dirname(bp)
+            os.makedirs(d,exist_ok=True)
+            tmppath = os.path.join(d,".tmp-%s-%d" % (digest,threading.get_ident()))
+            try:
+                try:
+                    os.link(path,tmppath)
+                except OSError:
+                    shutil.copyfile(path,tmppath)
+                os.replace(tmppath,bp)
+                added = os.path.getsize(bp)
+            except OSError:
+                LOG.warning("failed to cache %r",path,exc_info=True)
+                if os.path.exists(tmppath):
+                    os.unlink(tmppath)
+                return digest
+        else:
+            os.utime(bp)
+        if url and headers is not None:
+            key = self.url_key(url,headers)
+            if key:
+                up = self._url_path(key)
+                os.makedirs(os.path.dirname(up),exist_ok=True)
+                (fd,tmppath) = tempfile.mkstemp(dir=os.path.dirname(up),prefix=".tmp-")
+                with os.fdopen(fd,"w") as f:
+                    json.dump(dict(url=url,digest=digest,stored=time.time(),
+                                   etag=headers.get("ETag"),
+                                   content_length=headers.get("Content-Length"),
+                                   last_modified=headers.get("Last-Modified")),f)
+                os.replace(tmppath,up)
+        if added:
+            with self._lock:
+                if self._size is not None:
+                    self._size += added
+            if self._max_size and self.size() > self._max_size:
+                self.prune()
+        return digest
+
+    def _scan(self):
+        ret = []
+        for (dirpath,dirnames,filenames) in os.walk(self._blob_dir):
+            for fn in filenames:
+                if fn.startswith(".tmp-"):
+                    continue
+                p = os.path.join(dirpath,fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                ret.append((st.st_mtime,st.st_size,st.st_nlink,p))
+        return ret
+
+    def size(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum([ x[1] for x in self._scan() ])
+            return self._size
+
+    def stats(self):
+        """Returns a summary of the cache's contents."""
+        blobs = self._scan()
+        urls = 0
+        for (dirpath,dirnames,filenames) in os.walk(self._url_dir):
+            urls += len([ x for x in filenames if not x.startswith(".tmp-") ])
+        return dict(
+            cache_dir=self._cache_dir,max_size=self._max_size,
+            blobs=len(blobs),size=sum([ x[1] for x in blobs ]),urls=urls,
+            in_use=len([ x for x in blobs if x[2] > 1 ]),
+            oldest=min([ x[0] for x in blobs ]) if blobs else None,
+            newest=max([ x[0] for x in blobs ]) if blobs else None)
+
+    def prune(self,target=None,all=False):
+        """Evicts least-recently-used blobs until the cache is below `target` bytes (default: 90% of max_size), skipping blobs hardlinked into a live session unless `all` is set.  Also removes URL index entries whose blob is gone.  Returns (blobs removed, bytes freed)."""
+        if all:
+            target = 0
+        elif target is None:
+            target = int(self._max_size * 0.9)
+        (count,freed) = (0,0)
+        with self._lock:
+            blobs = sorted(self._scan())
+            size = sum([ x[1] for x in blobs ])
+            for (mtime,bsize,nlink,p) in blobs:
+                if size <= target:
+                    break
+                if nlink > 1 and not all:
+                    continue
+                try:
+                    os.unlink(p)
+                    size -= bsize
+                    count += 1
+                    freed += bsize
+                except OSError:
+                    pass
+            self._size = size
+        if count:
+            for (dirpath,dirnames,filenames) in os.walk(self._url_dir):
+                for fn in filenames:
+                    p = os.path.join(dirpath,fn)
+                    try:
+                        with open(p,"r") as f:
+                            digest = json.load(f).get("digest")
+                        if not digest or not self.has(digest):
+                            os.unlink(p)
+                    except (OSError,ValueError):
+                        pass
+        LOG.debug("pruned %d blobs (%d bytes) from %r",count,freed,self._cache_dir)
+        return (count,freed)
+
+__caches__ = dict()
+__caches_lock__ = threading.Lock()
+
+def get_blob_cache(config):
+    """Returns the process-wide BlobCache for `config`, or None if the [retrieve] cache is disabled."""
+    if not config["retrieve"].getboolean("cache"):
+        return None
+    cache_dir = config["retrieve"].get("cache_dir")
+    if not cache_dir:
+        cache_dir = os.path.join(config["DEFAULT"]["tmpdir"],"blob-cache")
+    max_size = max(0,config["retrieve"].getint("cache_max_size") or 0)
+    with __caches_lock__:
+        if not cache_dir in __caches__:
+            __caches__[cache_dir] = BlobCache(cache_dir,max_size=max_size)
+        return __caches__[cache_dir]
@@ -1,17 +1,248 @@
-
+from __future__ import print_function
 import six
-from future.utils import iteritems, print_function
+from future.utils import iteritems
+import os
+import os.path
+import shutil
+import time
+import logging
+
+LOG = logging.getLogger(__name__)
+
+#
+# Leading byte signatures of the formats we can unpack, for files whose
+# mime type was not determined (or was too generic) when retrieved.
+#
+SIGNATURES = (
+    (0,b"\x1f\x8b","application/gzip"),
+    (0,b"BZh","application/x-bzip2"),
+    (0,b"\xfd7zXZ\x00","application/x-xz"),
+    (0,b"\x28\xb5\x2f\xfd","application/zstd"),
+    (0,b"PK\x03\x04","application/zip"),
+    (0,b"PK\x05\x06","application/zip"),
+    (0,b"7z\xbc\xaf\x27\x1c","application/x-7z-compressed"),
+    (0,b"Rar!\x1a\x07","application/vnd.rar"),
+    (257,b"ustar","application/x-tar"),
+)
+
+def sniff_mime_type(path):
+    """Returns the mime type of an archive or compressed file at `path` from its leading bytes, or None."""
+    try:
+        with open(path,"rb") as f:
+            buf = f.read(512)
+    except OSError:
+        return None
+    for (offset,magic,mime_type) in SIGNATURES:
+        if buf[offset:offset+len(magic)] == magic:
+            return mime_type
+    return None
+
+class UnpackedFile(object):
+    """The result of unpacking a file: where its content was placed, and how long it took.  If the file was an archive, `path` is a directory and `archive` may be an ArchiveView of the source archive; otherwise `path` is the decompressed file."""
+
+    def __init__(self,path,source_path,mime_type,unpacker,is_archive=False,
+                 bytes_in=0,bytes_out=0,members=0,elapsed=0.0,tool=None,
+                 archive=None,lazy=False):
+        self._path = path
+        self._source_path = source_path
+        self._mime_type = mime_type
+        self._unpacker = unpacker
+        self._is_archive = is_archive
+        self._bytes_in = bytes_in
+        self._bytes_out = bytes_out
+        self._members = members
+        self._elapsed = elapsed
+        self._tool = tool
+        self._archive = archive
+        self._lazy = lazy
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def source_path(self):
+        return self._source_path
+
+    @property
+    def mime_type(self):
+        return self._mime_type
+
+    @property
+    def unpacker(self):
+        """The name of the Unpacker that unpacked the file."""
+        return self._unpacker
+
+    @property
+    def is_archive(self):
+        return self._is_archive
+
+    @property
+    def bytes_in(self):
+        """The size of the packed file."""
+        return self._bytes_in
+
+    @property
+    def bytes_out(self):
+        """The number of bytes written."""
+        return self._bytes_out
+
+    @property
+    def members(self):
+        """The number of archive members extracted."""
+        return self._members
+
+    @property
+    def elapsed(self):
+        """Wall-clock seconds spent unpacking."""
+        return self._elapsed
+
+    @property
+    def tool(self):
+        """The external tool used, or None if the file was unpacked in-process."""
+        return self._tool
+
+    @property
+    def archive(self):
+        return self._archive
+
+    @property
+    def lazy(self):
+        """True if only some archive members (README, LICENSE, etc) were extracted; others may be extracted on demand through `archive`."""
+        return self._lazy
 
-def unpack_file(path,destdir,basename):
-    pass
+    def stats(self):
+        return dict(
+            path=self._path,mime_type=self._mime_type,unpacker=self._unpacker,
+            tool=self._tool,is_archive=self._is_archive,lazy=self._lazy,
+            bytes_in=self._bytes_in,bytes_out=self._bytes_out,
+            members=self._members,elapsed=self._elapsed)
+
+    def remove(self):
+        if os.path.isdir(self._path):
+            shutil.rmtree(self._path,ignore_errors=True)
+        elif os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def __repr__(self):
+        return "<UnpackedFile(path=%r,mime_type=%r,unpacker=%r,bytes_out=%r,elapsed=%.3f)>" % (
+            self._path,self._mime_type,self._unpacker,self._bytes_out,self._elapsed)
 
 class Unpacker(object):
-    """An Unpacker is a class that can unpack a file.  By unpacking, we mean decompressing and/or unpacking an archive.  The default unpacker attempts to use shutil.unpack_archive, then falls back to executables associated with mime types.  We first attempt to detect the file's mime type"""
+    """An Unpacker is a class that can unpack a file.  By unpacking, we mean decompressing and/or unpacking an archive.  Unpackers are registered by the mime types (as returned by FileTypeInspector) they handle; some are implemented natively, and some depend on external executables (e.g. 7z, unrar), and are only available if one is installed.  Unpackers enforce the [retrieve] unpack_max_* limits."""
+
+    name = None
+    mime_types = ()
+    #
+    # If set, the unpacker requires one of these executables.
+    #
+    executables = ()
+
+    def __init__(self,config=None):
+        self._config = config
+        (self.max_members,self.max_size,self.max_ratio,threads) = (0,0,0,0)
+        if config and "retrieve" in config:
+            rconfig = config["retrieve"]
+            self.max_members = rconfig.getint("unpack_max_members",fallback=0)
+            self.max_size = rconfig.getint("unpack_max_size",fallback=0)
+            self.max_ratio = rconfig.getint("unpack_max_ratio",fallback=0)
+            threads = rconfig.getint("unpack_threads",fallback=0)
+        if threads <= 0:
+            threads = os.cpu_count() or 1
+        self.threads = threads
+
+    @property
+    def config(self):
+        return self._config
+
+    @property
+    def limits(self):
+        return dict(max_members=self.max_members,max_size=self.max_size,
+                    max_ratio=self.max_ratio)
+
+    @classmethod
+    def find_executable(cls):
+        for x in cls.executables:
+            path = shutil.which(x)
+            if path:
+                return path
+        return None
+
+    @classmethod
+    def available(cls):
+        """Returns True if this unpacker can run on this host."""
+        if not cls.executables:
+            return True
+        return cls.find_executable() is not None
+
+    @classmethod
+    def recognize(cls,mime_type):
+        """Returns True if this unpacker handles files of `mime_type`."""
+        return mime_type in cls.mime_types
+
+    def unpack(self,path,destdir,basename,mime_type=None,lazy=False):
+        """Unpacks the file at `path`.  If the content is a single file, we place its decompressed/decoded content in <destdir>/<basename>.  If the content is an archive, we extract it to <destdir>/<basename>/ ; if `lazy` is set, we may extract only README, LICENSE, COPYING and CITATION.cff files.  We return an UnpackedFile object, or None if the unpacker declined to unpack the file; it is the caller's job to remove UnpackedFile content."""
+        raise NotImplementedError()
+
+__unpackers__ = dict()
+
+def load_unpackers():
+    global __unpackers__
+
+    if __unpackers__:
+        return
+
+    from .backends import (
+        TarUnpacker,ZipUnpacker,CompressedUnpacker,UnrarUnpacker,
+        SevenZipUnpacker )
+
+    # In order of preference: native backends first.
+    __unpackers__[TarUnpacker.name] = TarUnpacker
+    __unpackers__[ZipUnpacker.name] = ZipUnpacker
+    __unpackers__[CompressedUnpacker.name] = CompressedUnpacker
+    __unpackers__[UnrarUnpacker.name] = UnrarUnpacker
+    __unpackers__[SevenZipUnpacker.name] = SevenZipUnpacker
+
+    return
+
+def get_unpacker_names():
+    load_unpackers()
+    return __unpackers__.keys()
 
-    @staticmethod
-    def recognize(cls,artifact_file):
-        """Inspects <artifact_file> to see if this unpacker """
+def get_unpacker(mime_type,config=None):
+    """Returns an instance of the preferred available Unpacker for `mime_type`, or None."""
+    load_unpackers()
+    if not mime_type:
+        return None
+    for cls in __unpackers__.values():
+        if cls.recognize(mime_type) and cls.available():
+            return cls(config)
+    return None
 
-    @staticmethod
-    def unpack(cls,artifact_file,basename=None,destdir=None):
-        """Unpacks an ArtifactFile to destdir.  If the content is a single file, we place its decompressed/decoded content in <destdir>/<basename>.  If the content is an archive, we extract it to <destdir>/<basename>/ .  We return an UnpackedFile object; it is the caller's job to remove UnpackedFile content."""
+def unpack_file(path,destdir,basename,mime_type=None,config=None,lazy=False):
+    """Unpacks the file at `path` into <destdir>/<basename> with the Unpacker registered for its `mime_type` (which is sniffed from the file if not given or not recognized).  Returns an UnpackedFile, or None if the file is not something we can unpack.  On error, partial output is removed and the exception raised."""
+    unpacker = get_unpacker(mime_type,config=config)
+    if not unpacker:
+        sniffed = sniff_mime_type(path)
+        if sniffed and sniffed != mime_type:
+            mime_type = sniffed
+            unpacker = get_unpacker(mime_type,config=config)
+    if not unpacker:
+        LOG.debug("no unpacker for %r (%s)",path,mime_type)
+        return None
+    outpath = os.path.join(destdir,basename)
+    t = time.time()
+    try:
+        ret = unpacker.unpack(path,destdir,basename,mime_type=mime_type,lazy=lazy)
+    except:
+        if os.path.isdir(outpath):
+            shutil.rmtree(outpath,ignore_errors=True)
+        elif os.path.exists(outpath):
+            os.unlink(outpath)
+        raise
+    if ret:
+        LOG.info("unpacked %r (%s) with %s%s: %d member(s), %d -> %d bytes in %.3fs",
+                 path,mime_type,unpacker.name,
+                 " (%s)" % (ret.tool,) if ret.tool else "",ret.members,
+                 ret.bytes_in,ret.bytes_out,time.time() - t)
+    return ret
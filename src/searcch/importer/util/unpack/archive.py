@@ -0,0 +1,218 @@
+"""Lazy, streaming views of tar and zip archives."""
+
+import os
+import os.path
+import posixpath
+import shutil
+import tarfile
+import zipfile
+import logging
+
+from searcch.importer.exceptions import ArchiveLimitError
+
+LOG = logging.getLogger(__name__)
+
+KEY_FILE_PREFIXES = ("README","LICENSE","COPYING")
+KEY_FILE_NAMES = ("CITATION.cff",)
+
+def is_key_file(name,max_depth=2):
+    """Returns True if archive member `name` is a README, LICENSE, COPYING or CITATION.cff file at most `max_depth` path components deep."""
+    parts = [ x for x in name.split("/") if x and x != "." ]
+    if not parts or len(parts) > max_depth:
+        return False
+    base = parts[-1]
+    return base.startswith(KEY_FILE_PREFIXES) or base in KEY_FILE_NAMES
+
+def safe_member_path(destdir,name):
+    """Returns the path at which member `name` should be extracted beneath `destdir`, or raises ArchiveLimitError if it would escape `destdir`."""
+    norm = posixpath.normpath(name.replace("\\","/")).lstrip("/")
+    if norm in ("",".") or norm == ".." or norm.startswith("../") \
+      or os.path.isabs(name):
+        raise ArchiveLimitError("unsafe archive member path %r" % (name,))
+    return os.path.join(destdir,*norm.split("/"))
+
+def check_limits(path,count,total_size,archive_size,max_members=0,max_size=0,
+                 max_ratio=0):
+    """Raises ArchiveLimitError if an archive at `path` of `archive_size` bytes, with `count` members totalling `total_size` bytes, exceeds a limit.  A limit of 0 is unlimited."""
+    if max_members and count > max_members:
+        raise ArchiveLimitError(
+            "archive %r has more than %d members" % (path,max_members))
+    if max_size and total_size > max_size:
+        raise ArchiveLimitError(
+            "archive %r expands to more than %d bytes" % (path,max_size))
+    if max_ratio and archive_size and total_size > max_ratio * archive_size \
+      and total_size > 1048576:
+        raise ArchiveLimitError(
+            "archive %r compression ratio exceeds %d" % (path,max_ratio))
+
+class ArchiveMember(object):
+
+    def __init__(self,name,size,is_dir=False,is_file=True,compressed_size=None,
+                 mtime=None):
+        self.name = name
+        self.size = size
+        self.is_dir = is_dir
+        self.is_file = is_file
+        self.compressed_size = compressed_size
+        self.mtime = mtime
+
+    def __repr__(self):
+        return "<ArchiveMember(name=%r,size=%r)>" % (self.name,self.size)
+
+class ArchiveView(object):
+    """
+    A lazy view of an archive file: it lists members and extracts only the
+    members it is asked for, streaming through the archive rather than
+    unpacking all of it.  Listing and extraction enforce limits on the
+    number of members, the total expanded size, and the ratio of expanded
+    size to archive size (zip bomb protection); exceeding one raises
+    ArchiveLimitError.  Only regular files and directories are extracted;
+    links and device nodes are skipped, as are members whose paths would
+    escape the destination directory.
+
+    If `opener` is given, it is called (with no arguments) to obtain a
+    readable binary stream of the archive's decompressed content, e.g. from
+    a multi-threaded external decompressor; otherwise the archive is read
+    directly from `path`.
+    """
+
+    def __init__(self,path,max_members=0,max_size=0,max_ratio=0,opener=None):
+        self._path = path
+        self._opener = opener
+        self._archive_size = os.path.getsize(path)
+        self._max_members = max_members
+        self._max_size = max_size
+        self._max_ratio = max_ratio
+        self._members = None
+        self._extracted = dict()
+
+    @staticmethod
+    def open(path,**kwargs):
+        """Returns an ArchiveView for `path` if it is a tar or zip archive, else None."""
+        try:
+            if zipfile.is_zipfile(path):
+                return ZipArchiveView(path,**kwargs)
+            if tarfile.is_tarfile(path):
+                return TarArchiveView(path,**kwargs)
+        except (OSError,EOFError,tarfile.TarError,zipfile.BadZipFile):
+            LOG.debug("failed to recognize archive %r",path,exc_info=True)
+        return None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def extracted(self):
+        """A dict of member name to extracted path."""
+        return self._extracted
+
+    def _check(self,count,total_size):
+        check_limits(self._path,count,total_size,self._archive_size,
+                     max_members=self._max_members,max_size=self._max_size,
+                     max_ratio=self._max_ratio)
+
+    def members(self):
+        """Returns a list of ArchiveMembers, reading the archive index (or, for tar, streaming through the archive) the first time."""
+        if self._members is None:
+            self.scan()
+        return self._members
+
+    def scan(self,extract=None,destdir=None):
+        """Lists all members, and extracts those for which `extract(name)` returns True into `destdir`, in a single pass.  Returns the list of extracted paths."""
+        raise NotImplementedError()
+
+    def extract(self,names,destdir):
+        """Extracts the named members into `destdir`; returns a list of extracted paths."""
+        names = set(names)
+        return self.scan(extract=lambda x: x in names,destdir=destdir)
+
+    def extract_all(self,destdir):
+        """Extracts every member into `destdir`; returns a list of extracted paths."""
+        return self.scan(extract=lambda x: True,destdir=destdir)
+
+    def _write(self,fileobj,destpath,mtime=None):
+        d = os.path.dirname(destpath)
+        if not os.path.isdir(d):
+            os.makedirs(d)
+        with open(destpath,"wb") as f:
+            shutil.copyfileobj(fileobj,f,1048576)
+        if mtime:
+            try:
+                os.utime(destpath,(mtime,mtime))
+            except OSError:
+                pass
+
+class TarArchiveView(ArchiveView):
+
+    def scan(self,extract=None,destdir=None):
+        members = []
+        extracted = []
+        total_size = 0
+        # Stream mode: members are read sequentially, decompressing once.
+        fileobj = None
+        if self._opener:
+            fileobj = self._opener()
+            tf = tarfile.open(fileobj=fileobj,mode="r|")
+        else:
+            tf = tarfile.open(self._path,mode="r|*")
+        try:
+            for ti in tf:
+                total_size += ti.size
+                self._check(len(members) + 1,total_size)
+                members.append(ArchiveMember(
+                    ti.name,ti.size,is_dir=ti.isdir(),is_file=ti.isfile(),
+                    mtime=ti.mtime))
+                if not extract or not destdir or not extract(ti.name):
+                    continue
+                destpath = safe_member_path(destdir,ti.name)
+                if ti.isdir():
+                    os.makedirs(destpath,exist_ok=True)
+                elif ti.isfile():
+                    self._write(tf.extractfile(ti),destpath,mtime=ti.mtime)
+                    self._extracted[ti.name] = destpath
+                    extracted.append(destpath)
+                else:
+                    LOG.debug("skipping non-regular tar member %r",ti.name)
+        finally:
+            tf.close()
+            if fileobj:
+                fileobj.close()
+        self._members = members
+        return extracted
+
+class ZipArchiveView(ArchiveView):
+
+    def scan(self,extract=None,destdir=None):
+        members = []
+        extracted = []
+        total_size = 0
+        with zipfile.ZipFile(self._path) as zf:
+            infos = zf.infolist()
+            self._check(len(infos),0)
+            for zi in infos:
+                total_size += zi.file_size
+                is_dir = zi.filename.endswith("/")
+                members.append(ArchiveMember(
+                    zi.filename,zi.file_size,is_dir=is_dir,is_file=not is_dir,
+                    compressed_size=zi.compress_size))
+            self._check(len(members),total_size)
+            self._members = members
+            if not extract or not destdir:
+                return extracted
+            for zi in infos:
+                if not extract(zi.filename):
+                    continue
+                destpath = safe_member_path(destdir,zi.filename)
+                if zi.filename.endswith("/"):
+                    os.makedirs(destpath,exist_ok=True)
+                    continue
+                # Symlinks in zips are stored as files with S_IFLNK mode.
+                if (zi.external_attr >> 16) & 0o170000 == 0o120000:
+                    LOG.debug("skipping zip symlink %r",zi.filename)
+                    continue
+                with zf.open(zi) as f:
+                    self._write(f,destpath)
+                self._extracted[zi.filename] = destpath
+                extracted.append(destpath)
+        return extracted
@@ -0,0 +1,310 @@
+"""Unpacker backends: native tar, zip and single-stream decompression (gzip, bzip2, xz, zstd), and external 7z and unrar tools."""
+
+import os
+import os.path
+import re
+import shutil
+import subprocess
+import time
+import bz2
+import gzip
+import lzma
+import logging
+
+from searcch.importer.util.unpack import (
+    Unpacker,UnpackedFile )
+from searcch.importer.util.unpack.archive import (
+    TarArchiveView,ZipArchiveView,is_key_file,check_limits )
+from searcch.importer.exceptions import UnpackError
+
+LOG = logging.getLogger(__name__)
+
+COMPRESSED_MIME_TYPES = {
+    "application/gzip":"gzip",
+    "application/x-gzip":"gzip",
+    "application/x-bzip2":"bzip2",
+    "application/x-xz":"xz",
+    "application/zstd":"zstd",
+    "application/x-zstd":"zstd",
+}
+
+def _have_zstandard():
+    try:
+        import zstandard
+        return True
+    except ImportError:
+        return False
+
+class ProcessReader(object):
+    """A readable binary stream over the stdout of an external decompressor."""
+
+    def __init__(self,cmd):
+        LOG.debug("running %r",cmd)
+        self._cmd = cmd
+        self._eof = False
+        self._p = subprocess.Popen(
+            cmd,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+
+    def read(self,size=-1):
+        buf = self._p.stdout.read(size)
+        if not buf:
+            self._eof = True
+        return buf
+
+    def close(self):
+        if self._p.stdout.closed:
+            return
+        self._p.stdout.close()
+        if not self._eof and self._p.poll() is None:
+            # The reader stopped early; we do not need the rest.
+            self._p.terminate()
+        stderr = self._p.stderr.read()
+        self._p.stderr.close()
+        rc = self._p.wait()
+        if self._eof and rc:
+            raise UnpackError("%r failed (%d): %s" % (
+                self._cmd,rc,stderr.decode("utf-8",errors="replace").strip()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+def decompress_command(fmt,path,threads=1):
+    """Returns a command that decompresses `path` (of compression format `fmt`) to stdout, preferring multi-threaded tools when `threads` > 1; or None if no suitable tool is installed."""
+    if fmt == "gzip":
+        # Deflate decompression is serial, but pigz moves reading, writing
+        # and checksumming into their own threads.
+        if threads > 1 and shutil.which("pigz"):
+            return ["pigz","-dc","-p",str(threads),path]
+    elif fmt == "bzip2":
+        if threads > 1 and shutil.which("lbzip2"):
+            return ["lbzip2","-dc","-n",str(threads),path]
+        if threads > 1 and shutil.which("pbzip2"):
+            return ["pbzip2","-dc","-p%d" % (threads,),path]
+    elif fmt == "xz":
+        if threads > 1 and shutil.which("xz"):
+            return ["xz","-dc","-T",str(threads),path]
+    elif fmt == "zstd":
+        if shutil.which("zstd") and (threads > 1 or not _have_zstandard()):
+            return ["zstd","-dcq","-T%d" % (threads,),path]
+    return None
+
+def open_decompressed(path,fmt,threads=1):
+    """Returns (stream,tool): a readable binary stream of the decompressed content of `path`, and the name of the external tool producing it, or None if decompression is in-process."""
+    cmd = decompress_command(fmt,path,threads=threads)
+    if cmd:
+        return (ProcessReader(cmd),cmd[0])
+    if fmt == "gzip":
+        return (gzip.open(path,"rb"),None)
+    elif fmt == "bzip2":
+        return (bz2.open(path,"rb"),None)
+    elif fmt == "xz":
+        return (lzma.open(path,"rb"),None)
+    elif fmt == "zstd":
+        import zstandard
+        return (zstandard.ZstdDecompressor().stream_reader(open(path,"rb")),None)
+    raise UnpackError("unsupported compression format %r" % (fmt,))
+
+def _tree_size(path):
+    """Returns (number of files,total bytes) beneath `path`."""
+    (count,size) = (0,0)
+    for (dirpath,dirnames,filenames) in os.walk(path):
+        for fn in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath,fn)).st_size
+                count += 1
+            except OSError:
+                pass
+    return (count,size)
+
+def _remove_links(path):
+    """Removes symlinks beneath `path`; native backends never extract them."""
+    for (dirpath,dirnames,filenames) in os.walk(path):
+        for fn in dirnames + filenames:
+            p = os.path.join(dirpath,fn)
+            if os.path.islink(p):
+                LOG.debug("removing extracted symlink %r",p)
+                os.unlink(p)
+
+def _extract_view(unpacker,view,path,outpath,mime_type,lazy,tool=None):
+    t = time.time()
+    os.makedirs(outpath,exist_ok=True)
+    if lazy:
+        paths = view.scan(extract=is_key_file,destdir=outpath)
+    else:
+        paths = view.extract_all(outpath)
+    bytes_out = sum([ os.path.getsize(x) for x in paths ])
+    return UnpackedFile(
+        outpath,path,mime_type,unpacker.name,is_archive=True,
+        bytes_in=os.path.getsize(path),bytes_out=bytes_out,members=len(paths),
+        elapsed=time.time() - t,tool=tool,archive=view,lazy=lazy)
+
+class TarUnpacker(Unpacker):
+    """Extracts uncompressed tar archives in a single streaming pass."""
+
+    name = "tar"
+    mime_types = ("application/x-tar","application/x-gtar","application/x-ustar")
+
+    def unpack(self,path,destdir,basename,mime_type=None,lazy=False):
+        view = TarArchiveView(path,**self.limits)
+        return _extract_view(
+            self,view,path,os.path.join(destdir,basename),mime_type,lazy)
+
+class ZipUnpacker(Unpacker):
+
+    name = "zip"
+    mime_types = ("application/zip","application/x-zip-compressed",
+                  "application/java-archive")
+
+    def unpack(self,path,destdir,basename,mime_type=None,lazy=False):
+        view = ZipArchiveView(path,**self.limits)
+        return _extract_view(
+            self,view,path,os.path.join(destdir,basename),mime_type,lazy)
+
+class CompressedUnpacker(Unpacker):
+    """Decompresses gzip, bzip2, xz and zstd streams.  If the decompressed content is a tar archive, it is extracted as it is decompressed; otherwise it is written to a single file.  Uses multi-threaded external decompressors (pigz, lbzip2/pbzip2, xz -T, zstd -T) if installed."""
+
+    name = "compressed"
+    mime_types = tuple(COMPRESSED_MIME_TYPES.keys())
+
+    @classmethod
+    def recognize(cls,mime_type):
+        fmt = COMPRESSED_MIME_TYPES.get(mime_type)
+        if fmt == "zstd":
+            return _have_zstandard() or shutil.which("zstd") is not None
+        return fmt is not None
+
+    def _is_tar(self,path,fmt):
+        (stream,tool) = open_decompressed(path,fmt,threads=1)
+        try:
+            buf = stream.read(512)
+            stream.close()
+        except (OSError,EOFError,lzma.LZMAError,UnpackError):
+            LOG.debug("failed to decompress %r",path,exc_info=True)
+            stream.close()
+            return False
+        return len(buf) == 512 and buf[257:262] == b"ustar"
+
+    def unpack(self,path,destdir,basename,mime_type=None,lazy=False):
+        fmt = COMPRESSED_MIME_TYPES[mime_type]
+        outpath = os.path.join(destdir,basename)
+        threads = self.threads
+        tool = (decompress_command(fmt,path,threads=threads) or [None])[0]
+        if self._is_tar(path,fmt):
+            view = TarArchiveView(
+                path,opener=lambda: open_decompressed(path,fmt,threads=threads)[0],
+                **self.limits)
+            return _extract_view(
+                self,view,path,outpath,mime_type,lazy,tool=tool)
+        t = time.time()
+        bytes_in = os.path.getsize(path)
+        bytes_out = 0
+        (stream,tool) = open_decompressed(path,fmt,threads=threads)
+        try:
+            with open(outpath,"wb") as f:
+                while True:
+                    buf = stream.read(1048576)
+                    if not buf:
+                        break
+                    bytes_out += len(buf)
+                    check_limits(path,1,bytes_out,bytes_in,**self.limits)
+                    f.write(buf)
+        finally:
+            stream.close()
+        return UnpackedFile(
+            outpath,path,mime_type,self.name,is_archive=False,
+            bytes_in=bytes_in,bytes_out=bytes_out,members=1,
+            elapsed=time.time() - t,tool=tool)
+
+class ExternalUnpacker(Unpacker):
+    """An unpacker that runs an external archive tool.  Archive listings are checked against the unpack limits before anything is extracted.  Symlinks are removed after extraction."""
+
+    def list_command(self,exe,path):
+        raise NotImplementedError()
+
+    def parse_listing(self,output):
+        """Returns (member count,total expanded size) from the output of the list command."""
+        raise NotImplementedError()
+
+    def extract_command(self,exe,path,outpath):
+        raise NotImplementedError()
+
+    def _run(self,cmd):
+        LOG.debug("running %r",cmd)
+        p = subprocess.run(
+            cmd,stdin=subprocess.DEVNULL,stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+        output = p.stdout.decode("utf-8",errors="replace")
+        if p.returncode:
+            raise UnpackError("%r failed (%d): %s" % (cmd,p.returncode,output.strip()))
+        return output
+
+    def unpack(self,path,destdir,basename,mime_type=None,lazy=False):
+        exe = self.find_executable()
+        outpath = os.path.join(destdir,basename)
+        t = time.time()
+        bytes_in = os.path.getsize(path)
+        (count,size) = self.parse_listing(self._run(self.list_command(exe,path)))
+        check_limits(path,count,size,bytes_in,**self.limits)
+        os.makedirs(outpath,exist_ok=True)
+        self._run(self.extract_command(exe,path,outpath))
+        _remove_links(outpath)
+        (count,bytes_out) = _tree_size(outpath)
+        return UnpackedFile(
+            outpath,path,mime_type,self.name,is_archive=True,
+            bytes_in=bytes_in,bytes_out=bytes_out,members=count,
+            elapsed=time.time() - t,tool=os.path.basename(exe))
+
+class UnrarUnpacker(ExternalUnpacker):
+
+    name = "unrar"
+    mime_types = ("application/vnd.rar","application/x-rar",
+                  "application/x-rar-compressed")
+    executables = ("unrar",)
+
+    def list_command(self,exe,path):
+        return [exe,"lt","-p-","--",path]
+
+    def parse_listing(self,output):
+        (count,size) = (0,0)
+        for m in re.finditer(r"^\s*Size:\s*(\d+)\s*$",output,re.M):
+            count += 1
+            size += int(m.group(1))
+        return (count,size)
+
+    def extract_command(self,exe,path,outpath):
+        return [exe,"x","-o+","-y","-p-","-idq","-mt%d" % (self.threads,),
+                "--",path,outpath + os.sep]
+
+class SevenZipUnpacker(ExternalUnpacker):
+    """Unpacks 7z archives, and other formats 7-Zip understands (rar, if unrar is not installed; iso, cab, cpio, etc)."""
+
+    name = "7z"
+    mime_types = ("application/x-7z-compressed","application/vnd.rar",
+                  "application/x-rar","application/x-rar-compressed",
+                  "application/x-iso9660-image","application/vnd.ms-cab-compressed",
+                  "application/x-cpio","application/x-arj",
+                  "application/x-lzh-compressed")
+    executables = ("7zz","7z","7za")
+
+    def list_command(self,exe,path):
+        return [exe,"l","-slt","--",path]
+
+    def parse_listing(self,output):
+        (count,size) = (0,0)
+        # Skip the archive's own properties, which precede the member list.
+        idx = output.find("\n----------")
+        if idx >= 0:
+            output = output[idx:]
+        for m in re.finditer(r"^Size = (\d*)\s*$",output,re.M):
+            count += 1
+            if m.group(1):
+                size += int(m.group(1))
+        return (count,size)
+
+    def extract_command(self,exe,path,outpath):
+        return [exe,"x","-y","-bd","-mmt=%d" % (self.threads,),
+                "-o" + outpath,"--",path]
@@ -0,0 +1,51 @@
+"""URL normalization, for recognizing different spellings of the same artifact URL."""
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+#
+# Hosts whose repository URLs may carry a trailing .git.
+#
+CODE_HOSTS = ("github.com","gitlab.com","bitbucket.org")
+
+#
+# Hosts whose paths are case-insensitive (DOIs and GitHub repository names are).
+#
+CASELESS_HOSTS = ("doi.org","dx.doi.org","github.com")
+
+#
+# Query parameters that never change what a URL refers to.
+#
+IGNORED_PARAMS = ("utm_source","utm_medium","utm_campaign","utm_term",
+                  "utm_content","fbclid","gclid")
+
+DEFAULT_PORTS = { "http":80,"https":443 }
+
+def normalize_url(url):
+    """Returns a normal form of `url`, such that URLs that name the same artifact (modulo scheme http/https, host case, a leading www., default ports, trailing slashes, a code host's .git suffix, tracking query parameters, query parameter order, and fragments) have the same normal form.  The result is a key, not necessarily a fetchable URL."""
+    url = url.strip()
+    try:
+        sp = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = sp.scheme.lower()
+    if not sp.netloc or not scheme in DEFAULT_PORTS:
+        return url
+    host = (sp.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    try:
+        port = sp.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc += ":%d" % (port,)
+    path = sp.path.rstrip("/")
+    if host in CODE_HOSTS and path.endswith(".git"):
+        path = path[:-4]
+    if host in CASELESS_HOSTS:
+        path = path.lower()
+    query = urlencode(sorted(
+        [(k,v) for (k,v) in parse_qsl(sp.query,keep_blank_values=True)
+         if not k.lower() in IGNORED_PARAMS]))
+    return urlunsplit(("https",netloc,path,query,""))
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(
+    0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","src"))
+
+from searcch.importer.util.config import get_config_parser
+
+@pytest.fixture
+def config(tmp_path):
+    """A config with the registered defaults, using a private tmpdir and no blob cache."""
+    config = get_config_parser()
+    config["DEFAULT"]["tmpdir"] = str(tmp_path)
+    config["retrieve"]["cache"] = "false"
+    config["retrieve"]["download_retries"] = "0"
+    return config
@@ -0,0 +1,102 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from searcch.importer.exceptions import ArchiveLimitError
+from searcch.importer.util.retrieve import RetrievedFile
+from searcch.importer.util.unpack import unpack_file
+from searcch.importer.util.unpack.archive import (
+    ArchiveView,safe_member_path,check_limits)
+
+def _tar(path,members):
+    with tarfile.open(path,"w") as tf:
+        for (name,data) in members:
+            ti = tarfile.TarInfo(name)
+            ti.size = len(data)
+            tf.addfile(ti,io.BytesIO(data))
+    return str(path)
+
+def _zip(path,members):
+    with zipfile.ZipFile(path,"w",zipfile.ZIP_DEFLATED) as zf:
+        for (name,data) in members:
+            zf.writestr(name,data)
+    return str(path)
+
+@pytest.mark.parametrize("name",[
+    "../evil","a/../../evil","/etc/passwd","..","", ".","a\\..\\..\\evil"])
+def test_safe_member_path_rejects_escapes(tmp_path,name):
+    with pytest.raises(ArchiveLimitError):
+        safe_member_path(str(tmp_path),name)
+
+@pytest.mark.parametrize("name,expected",[
+    ("a/b.txt","a/b.txt"),("./a/b.txt","a/b.txt"),("a/./c/../b.txt","a/b.txt")])
+def test_safe_member_path(tmp_path,name,expected):
+    assert safe_member_path(str(tmp_path),name) \
+      == os.path.join(str(tmp_path),*expected.split("/"))
+
+def test_check_limits():
+    check_limits("x",10,1000,100,max_members=10,max_size=1000)
+    with pytest.raises(ArchiveLimitError):
+        check_limits("x",11,1000,100,max_members=10)
+    with pytest.raises(ArchiveLimitError):
+        check_limits("x",10,1001,100,max_size=1000)
+    # Small archives are never rejected for their ratio.
+    check_limits("x",1,1048576,1,max_ratio=10)
+    with pytest.raises(ArchiveLimitError):
+        check_limits("x",1,2097152,1024,max_ratio=10)
+
+@pytest.mark.parametrize("maker",[_tar,_zip])
+def test_traversal_member_is_not_extracted(tmp_path,maker):
+    path = maker(tmp_path / "a",[("ok.txt",b"ok"),("../evil.txt",b"evil")])
+    dest = tmp_path / "out"
+    view = ArchiveView.open(path)
+    with pytest.raises(ArchiveLimitError):
+        view.extract_all(str(dest))
+    assert not (tmp_path / "evil.txt").exists()
+
+@pytest.mark.parametrize("maker",[_tar,_zip])
+def test_member_limit(tmp_path,maker):
+    path = maker(tmp_path / "a",[("%d.txt" % (i,),b"x") for i in range(5)])
+    assert len(ArchiveView.open(path,max_members=5).members()) == 5
+    with pytest.raises(ArchiveLimitError):
+        ArchiveView.open(path,max_members=4).members()
+
+@pytest.mark.parametrize("maker",[_tar,_zip])
+def test_compression_ratio_limit(tmp_path,maker):
+    # 4 MiB of zeros compresses to a few KiB in a zip; a tar is not
+    # compressed, so the bomb check only trips for the zip.
+    path = maker(tmp_path / "a",[("zeros",b"\0" * 4194304)])
+    view = ArchiveView.open(path,max_ratio=100)
+    if maker is _zip:
+        with pytest.raises(ArchiveLimitError):
+            view.extract_all(str(tmp_path / "out"))
+    else:
+        assert len(view.extract_all(str(tmp_path / "out"))) == 1
+
+def test_size_limit(tmp_path):
+    path = _zip(tmp_path / "a",[("a",b"x" * 600),("b",b"x" * 600)])
+    with pytest.raises(ArchiveLimitError):
+        ArchiveView.open(path,max_size=1000).extract_all(str(tmp_path / "out"))
+    assert not (tmp_path / "out").exists()
+
+@pytest.mark.parametrize("maker",[_tar,_zip])
+def test_lazy_members_extracted_on_demand(config,tmp_path,maker):
+    path = maker(tmp_path / "a",[
+        ("README.md",b"# readme"),("docs/paper.txt",b"paper"),
+        ("src/main.c",b"int main;")])
+    uf = unpack_file(path,str(tmp_path),"unpacked",config=config,lazy=True)
+    assert uf.lazy and uf.archive
+    assert os.path.isfile(os.path.join(uf.path,"README.md"))
+    assert not os.path.exists(os.path.join(uf.path,"docs","paper.txt"))
+    rf = RetrievedFile(None,str(tmp_path),path,unpacked_path=uf.path,
+                       archive=uf.archive)
+    assert set([m.name for m in rf.archive_members()]) \
+      == set(["README.md","docs/paper.txt","src/main.c"])
+    paths = rf.member_paths(["docs/paper.txt","../evil","missing.txt"])
+    assert list(paths.keys()) == ["docs/paper.txt"]
+    with open(paths["docs/paper.txt"],"rb") as f:
+        assert f.read() == b"paper"
+    assert not os.path.exists(os.path.join(uf.path,"src","main.c"))
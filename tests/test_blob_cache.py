@@ -0,0 +1,27 @@
+from searcch.importer.util.retrieve.cache import BlobCache
+
+URL = "https://example.org/a.tar.gz"
+
+def _cache(tmp_path,content=b"content"):
+    cache = BlobCache(str(tmp_path / "cache"))
+    path = tmp_path / "a"
+    path.write_bytes(content)
+    return (cache,str(path))
+
+def test_lookup_requires_validator(tmp_path):
+    (cache,path) = _cache(tmp_path)
+    headers = {"Content-Length":"7"}
+    cache.add(path,url=URL,headers=headers)
+    assert cache.lookup(URL,headers) is None
+
+def test_lookup_matches_validators(tmp_path):
+    (cache,path) = _cache(tmp_path)
+    headers = {"ETag":'"1"',"Content-Length":"7"}
+    digest = cache.add(path,url=URL,headers=headers)
+    assert cache.lookup(URL,headers) == digest
+    assert cache.lookup(URL,{"ETag":'"2"',"Content-Length":"7"}) is None
+    assert cache.lookup(URL,{"Content-Length":"7"}) is None
+    lm = {"Last-Modified":"Mon, 01 Jan 2024 00:00:00 GMT","Content-Length":"7"}
+    cache.add(path,url=URL,headers=lm)
+    assert cache.lookup(URL,lm) == digest
+    assert cache.lookup(URL,dict(lm,**{"Last-Modified":"Tue, 02 Jan 2024 00:00:00 GMT"})) is None
@@ -0,0 +1,73 @@
+import hashlib
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+from searcch.importer.db.model import Base,Artifact,ExtractionResult
+from searcch.importer.extractor import BaseKeywordExtractor
+from searcch.importer.importer import ImportSession,save_extraction_results
+
+@pytest.fixture
+def db(tmp_path):
+    engine = sa.create_engine("sqlite:///%s" % (tmp_path / "db.sqlite",))
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+def _import_session(config,db,**kwargs):
+    return ImportSession(config,db(),Artifact(title="t",url="https://x"),**kwargs)
+
+DIGEST = hashlib.sha256(b"content").digest()
+
+def test_store_and_lookup(config,db):
+    s = _import_session(config,db)
+    assert s.lookup_result("kw","1",DIGEST) is None
+    s.store_result("kw","1",DIGEST,["a"])
+    assert s.lookup_result("kw","1",DIGEST) == ["a"]
+    assert s.results == {(DIGEST,"kw","1"):["a"]}
+    s.save_results()
+    s.session.commit()
+
+    s = _import_session(config,db)
+    assert s.lookup_result("kw","1",DIGEST) == ["a"]
+    assert s.lookup_result("kw","2",DIGEST) is None
+    assert s.lookup_result("other","1",DIGEST) is None
+
+def test_save_ignores_duplicates(config,db):
+    (a,b) = (_import_session(config,db),_import_session(config,db))
+    a.store_result("kw","1",DIGEST,["a"])
+    b.store_result("kw","1",DIGEST,["b"])
+    a.save_results()
+    a.save_results()
+    a.session.commit()
+    save_extraction_results(b.session,b.results)
+    b.session.commit()
+    assert db().query(ExtractionResult).count() == 1
+    assert _import_session(config,db).lookup_result("kw","1",DIGEST) == ["a"]
+
+def test_result_cache_disabled(config,db):
+    config["extract"]["result_cache"] = "false"
+    s = _import_session(config,db)
+    s.store_result("kw","1",DIGEST,["a"])
+    assert s.lookup_result("kw","1",DIGEST) is None
+    assert s.results == dict()
+
+class CountingExtractor(BaseKeywordExtractor):
+    name = "counting"
+    version = "1"
+    computed = []
+
+    def compute_keywords(self,text):
+        self.computed.append(text)
+        return text.split()
+
+    def apply_keywords(self,keywords,source=None):
+        return bool(keywords)
+
+def test_extract_batch_memoizes(config,db):
+    for i in range(0,2):
+        s = _import_session(config,db)
+        CountingExtractor.extract_batch([CountingExtractor(config,s)])
+        s.save_results()
+        s.session.commit()
+    assert len(CountingExtractor.computed) == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from searcch.importer.db.model import Artifact
+from searcch.importer.extractor import BaseExtractor,get_extractor_stages
+
+def _extractor(name,reads,writes):
+    return type(name,(BaseExtractor,),dict(
+        name=name,reads=reads,writes=writes,extract=lambda self: None))(None,None)
+
+def _names(stages):
+    return [[ext.name for ext in stage] for stage in stages]
+
+def test_independent_extractors_share_a_stage():
+    exts = [_extractor("a",("files",),("file_members",)),
+            _extractor("b",("files",),("license",)),
+            _extractor("c",("meta",),("meta",))]
+    assert _names(get_extractor_stages(exts)) == [["a","b","c"]]
+
+def test_reader_follows_writer():
+    exts = [_extractor("basic",("files","file_members"),("file_members","general_text")),
+            _extractor("kw",("files","file_members","general_text"),("tags","meta")),
+            _extractor("md",("files","title"),("title",)),
+            _extractor("title",("title",),("description",))]
+    assert _names(get_extractor_stages(exts)) == [["basic","md"],["kw","title"]]
+
+def test_writers_of_the_same_resource_are_ordered():
+    exts = [_extractor("a",(),("license",)),_extractor("b",(),("license",))]
+    assert _names(get_extractor_stages(exts)) == [["a"],["b"]]
+
+def test_merged_resources_do_not_conflict():
+    exts = [_extractor("a",("files",),("authors","tags","meta")),
+            _extractor("b",("files",),("authors","tags","meta"))]
+    assert _names(get_extractor_stages(exts)) == [["a","b"]]
+
+def test_undeclared_extractor_runs_alone():
+    exts = [_extractor("a",("files",),("tags",)),_extractor("b",None,None),
+            _extractor("c",("files",),("tags",))]
+    assert _names(get_extractor_stages(exts)) == [["a"],["b"],["c"]]
+
+class FakeImportSession(object):
+
+    def __init__(self,artifact):
+        self.artifact = artifact
+
+def test_staged_authors_are_merged():
+    artifact = Artifact(affiliations=[])
+    (a,b) = (_extractor("a",(),("authors",)),_extractor("b",(),("authors",)))
+    a._session = b._session = FakeImportSession(artifact)
+    assert a.add_author(name="A",email="a@x")
+    assert not a.add_author(name="A",email="a@x")
+    assert b.add_author(name="A",email="a@x")
+    assert b.add_author(name="B",email="b@x")
+    # Nothing touches the artifact until merge.
+    assert artifact.affiliations == []
+    a.merge()
+    b.merge()
+    assert [(x.affiliation.person.name,x.affiliation.person.email)
+            for x in artifact.affiliations] == [("A","a@x"),("B","b@x")]
+
+def test_unavailable_resources_skip_extractor():
+    from searcch.importer.exceptions import ResourceUnavailableError
+    from searcch.importer.importer import _run_extractor
+
+    def extract():
+        raise ResourceUnavailableError("not staged")
+    _run_extractor(extract,"a")
+    def fail():
+        raise ValueError("bug")
+    with pytest.raises(ValueError):
+        _run_extractor(fail,"b")
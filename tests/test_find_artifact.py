@@ -0,0 +1,71 @@
+import os
+import datetime
+import importlib.util
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import sessionmaker
+
+import searcch.importer.importer as importer
+from searcch.importer.db.model import Base,Artifact
+from searcch.importer.importer import find_artifact
+
+@pytest.fixture(autouse=True)
+def no_importers(monkeypatch):
+    """Canonicalize URLs with the generic rules only, without loading the importers and their dependencies."""
+    monkeypatch.setattr(importer,"load_importers",lambda: None)
+    monkeypatch.setattr(importer,"__importers__",dict())
+    monkeypatch.setattr(importer,"__url_matcher__",None)
+
+@pytest.fixture
+def engine():
+    engine = sa.create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return engine
+
+def _artifact(session,url,canonical_url=None,days=0):
+    a = Artifact(url=url,canonical_url=canonical_url,title=url,
+                 ctime=datetime.datetime(2020,1,1) + datetime.timedelta(days=days))
+    session.add(a)
+    session.flush()
+    return a
+
+def test_find_by_canonical_url(engine):
+    session = sessionmaker(bind=engine)()
+    url = "https://Example.org/a/"
+    a = _artifact(session,url,canonical_url=importer.canonical_url(url))
+    assert find_artifact(session,url) is a
+    assert find_artifact(session,"https://example.org/b") is None
+
+def test_find_most_recent(engine):
+    session = sessionmaker(bind=engine)()
+    url = "https://example.org/a"
+    _artifact(session,url,canonical_url=importer.canonical_url(url))
+    b = _artifact(session,url,canonical_url=importer.canonical_url(url),days=1)
+    assert find_artifact(session,url) is b
+
+def test_find_artifact_without_canonical_url(engine):
+    session = sessionmaker(bind=engine)()
+    a = _artifact(session,"https://example.org/a")
+    assert find_artifact(session,"https://example.org/a") is a
+
+def test_migration_backfills_canonical_url(engine):
+    from alembic.runtime.migration import MigrationContext
+    from alembic.operations import Operations
+
+    path = os.path.join(
+        os.path.dirname(importer.__file__),"..","db","migration",
+        "alembic_migrations","versions","a1d5e3b7c9f4_backfill_canonical_url.py")
+    spec = importlib.util.spec_from_file_location("backfill",path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    session = sessionmaker(bind=engine)()
+    url = "https://Example.org/a/"
+    a = _artifact(session,url)
+    session.commit()
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            migration.upgrade()
+    session.expire_all()
+    assert a.canonical_url == importer.canonical_url(url)
+    assert find_artifact(session,"https://example.org/a") is a
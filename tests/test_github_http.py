@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("github")
+pytest.importorskip("giturlparse")
+pytest.importorskip("dateutil")
+
+import github.Requester
+
+from searcch.importer.util import http
+from searcch.importer.importer.github import SharedHTTPSRequestsConnection
+
+def test_pygithub_uses_shared_adapter(config):
+    adapter = http._get_adapter(config)
+    cnx = SharedHTTPSRequestsConnection("api.github.com",timeout=15)
+    assert cnx.session.get_adapter("https://api.github.com/") is adapter
+    assert github.Requester.Requester._Requester__httpsConnectionClass \
+      is SharedHTTPSRequestsConnection
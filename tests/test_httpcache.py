@@ -0,0 +1,44 @@
+import os
+import time
+
+import requests
+
+from searcch.importer.util.httpcache import ResponseCache
+
+def _request(url):
+    return requests.Request("GET",url).prepare()
+
+def _response(request,content):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers["ETag"] = '"%d"' % (len(content),)
+    response.url = request.url
+    response._content = content
+    return response
+
+def _index_entries(cache):
+    return sum([len(fns) for (d,ds,fns) in os.walk(os.path.join(cache.cache_dir,"index"))])
+
+def test_store_prunes_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path),max_size=2500)
+    for i in range(0,3):
+        req = _request("https://example.org/%d" % (i,))
+        cache.store(req,_response(req,bytes([i]) * 1000))
+        if i == 0:
+            # Make the first response the least recently used.
+            os.utime(cache._blob_path(cache._load_entry(cache.key(req))[0]["digest"]),
+                     (time.time() - 60,time.time() - 60))
+    assert cache.stats()["size"] <= 2500
+    assert cache.lookup(_request("https://example.org/0")) == (None,None)
+    assert cache.lookup(_request("https://example.org/2"))[1] is not None
+    assert _index_entries(cache) == 2
+
+def test_prune(tmp_path):
+    cache = ResponseCache(str(tmp_path),max_size=0)
+    for i in range(0,3):
+        req = _request("https://example.org/%d" % (i,))
+        cache.store(req,_response(req,bytes([i]) * 1000))
+    assert cache.prune(target=1000) == (2,2000)
+    assert _index_entries(cache) == 1
+    assert cache.prune(all=True) == (1,1000)
+    assert _index_entries(cache) == 0
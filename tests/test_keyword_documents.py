@@ -0,0 +1,63 @@
+import pytest
+
+from searcch.importer.extractor import BaseKeywordExtractor
+
+class KeywordExtractor(BaseKeywordExtractor):
+    name = "kw"
+
+    def compute_keywords(self,text):
+        return text.split()
+
+    def apply_keywords(self,keywords,source=None):
+        return bool(keywords)
+
+    def extract(self):
+        pass
+
+def _write(path,data):
+    path.write_bytes(data)
+    return str(path)
+
+@pytest.mark.parametrize("mime_type,accepted",[
+    ("text/plain",True),("text/markdown",True),("text",True),(None,True),
+    ("text/x-c",False),("text/html",False),("application/zip",False)])
+def test_document_mime_types(config,tmp_path,mime_type,accepted):
+    ext = KeywordExtractor(config,None)
+    path = _write(tmp_path / "a",b"some words")
+    assert bool(ext._file_document(path,mime_type,"a")) == accepted
+
+def test_document_size_limit(config,tmp_path):
+    config["extract"]["max_document_size"] = "10"
+    ext = KeywordExtractor(config,None)
+    assert ext._file_document(_write(tmp_path / "a",b"x" * 10),"text/plain","a")
+    assert ext._file_document(_write(tmp_path / "b",b"x" * 11),"text/plain","b") is None
+
+def test_document_invalid_utf8(config,tmp_path):
+    ext = KeywordExtractor(config,None)
+    path = _write(tmp_path / "a",b"caf\xe9 words")
+    (digest,to_text,source) = ext._file_document(path,"text/plain","a")
+    assert to_text() == u"caf\ufffd words"
+
+class FakeImportSession(object):
+
+    def __init__(self):
+        self.results = dict()
+
+    def lookup_result(self,extractor,version,digest):
+        return self.results.get(digest)
+
+    def store_result(self,extractor,version,digest,result):
+        self.results[digest] = result
+
+def test_unreadable_document_is_skipped(config):
+    session = FakeImportSession()
+    ext = KeywordExtractor(config,session)
+    def fail():
+        raise UnicodeDecodeError("utf-8",b"",0,1,"bad")
+    ext.collect_documents = lambda: [
+        (b"a",lambda: "some words","a"),(b"b",fail,"b")]
+    applied = []
+    ext.apply_keywords = lambda keywords,source=None: applied.append((source,keywords))
+    KeywordExtractor.extract_batch([ext])
+    assert applied == [("a",["some","words"]),("b",[])]
+    assert session.results == {b"a":dict(keywords=["some","words"])}
@@ -0,0 +1,85 @@
+import json
+
+from searcch.importer.server.notifier import BackendNotifier
+
+class FakeResponse(object):
+
+    def __init__(self,status_code):
+        self.status_code = status_code
+        self.ok = 200 <= status_code < 300
+        self.content = b""
+
+class FakeSession(object):
+    """Records PUT bodies, and answers with the queued status codes (then 200)."""
+
+    def __init__(self,codes=[]):
+        self.codes = list(codes)
+        self.bodies = []
+
+    def put(self,url,headers=None,data=None):
+        self.bodies.append(json.loads(data))
+        if self.codes:
+            code = self.codes.pop(0)
+            if isinstance(code,Exception):
+                raise code
+            return FakeResponse(code)
+        return FakeResponse(200)
+
+def _notifier(session,**kwargs):
+    kwargs.setdefault("backoff",0.001)
+    return BackendNotifier(session,**kwargs)
+
+def test_updates_are_coalesced():
+    session = FakeSession()
+    n = _notifier(session)
+    n.notify(1,"u",{},dict(status="running",progress=0.1),log="a",log_offset=0)
+    n.notify(1,"u",{},dict(progress=0.5),log="bc",log_offset=1)
+    n.notify(2,"u",{},dict(status="running"))
+    n.start()
+    assert n.flush(timeout=10)
+    assert session.bodies == [
+        dict(status="running",progress=0.5,log="abc",log_offset=0),
+        dict(status="running")]
+    stats = n.stats()
+    assert (stats["queued"],stats["coalesced"],stats["sent"]) == (3,1,2)
+
+def test_failed_update_is_retried():
+    session = FakeSession(codes=[503,ConnectionError("down")])
+    n = _notifier(session,retries=2)
+    n.start()
+    n.notify(1,"u",{},dict(progress=0.5),log="a",log_offset=0)
+    assert n.flush(timeout=10)
+    assert len(session.bodies) == 3
+    assert session.bodies[-1] == dict(progress=0.5,log="a",log_offset=0)
+    assert (n.stats()["retried"],n.stats()["sent"]) == (2,1)
+
+def test_rejected_update_is_not_retried():
+    session = FakeSession(codes=[400])
+    n = _notifier(session,retries=2)
+    n.start()
+    n.notify(1,"u",{},dict(progress=0.5))
+    assert n.flush(timeout=10)
+    assert len(session.bodies) == 1
+    assert n.stats()["dropped"] == 1
+
+def test_dropped_log_is_carried_forward():
+    session = FakeSession(codes=[503,503])
+    n = _notifier(session,retries=1)
+    n.start()
+    n.notify(1,"u",{},dict(progress=0.1),log="ab",log_offset=0)
+    assert n.flush(timeout=10)
+    assert n.stats()["dropped"] == 1
+    n.notify(1,"u",{},dict(progress=0.2),log="cd",log_offset=2)
+    assert n.flush(timeout=10)
+    assert session.bodies[-1] == dict(progress=0.2,log="abcd",log_offset=0)
+
+def test_final_update_is_retried_until_delivered():
+    session = FakeSession(codes=[503] * 5)
+    results = []
+    n = _notifier(session,retries=1)
+    n.start()
+    n.notify(1,"u",{},dict(status="failed"),final=True,
+             callback=lambda success,r: results.append(success))
+    assert n.flush(timeout=10)
+    assert len(session.bodies) == 6
+    assert results == [True]
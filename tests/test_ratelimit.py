@@ -0,0 +1,91 @@
+import pytest
+
+from searcch.importer.exceptions import RateLimitedError
+from searcch.importer.util import ratelimit
+from searcch.importer.util.ratelimit import RateLimiter
+
+class FakeClock(object):
+    """Stands in for the time module: sleep advances the clock instantly."""
+
+    def __init__(self,now=1000000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self,seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class FakeResponse(object):
+
+    def __init__(self,status_code,headers={}):
+        self.status_code = status_code
+        self.headers = dict(headers)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit,"time",clock)
+    monkeypatch.setattr(ratelimit.random,"uniform",lambda a,b: 0.0)
+    return clock
+
+def test_acquire_paces_requests(clock):
+    rl = RateLimiter(host_rates={"example.org":(2.0,2)})
+    assert rl.acquire("example.org") == 0.0
+    assert rl.acquire("example.org") == 0.0
+    assert rl.acquire("example.org") == pytest.approx(0.5)
+    assert rl.acquire("example.org") == pytest.approx(0.5)
+    assert clock.slept == [pytest.approx(0.5),pytest.approx(0.5)]
+    # Subdomains share their parent's rate; other hosts are unlimited.
+    assert rl.acquire("www.example.org") == 0.0
+    assert rl.acquire("other.org") == 0.0
+    s = rl.stats()["example.org"]
+    assert (s["requests"],s["waited"]) == (4,2)
+    assert s["wait_avg"] == pytest.approx(0.5)
+
+def test_observe_retry_after(clock):
+    rl = RateLimiter(max_retries=2)
+    r = FakeResponse(429,{"Retry-After":"7"})
+    assert rl.observe("example.org",r,attempt=0) == 7.0
+    assert rl.acquire("example.org") == pytest.approx(7.0)
+    assert rl.observe("example.org",r,attempt=2) is None
+    assert rl.observe("example.org",FakeResponse(200)) is None
+
+def test_observe_backoff(clock):
+    rl = RateLimiter(backoff_base=2.0,max_backoff=5.0)
+    assert rl.observe("example.org",FakeResponse(429),attempt=0) == 2.0
+    assert rl.observe("example.org",FakeResponse(429),attempt=4) == 5.0
+    # A 503 without Retry-After is not a rate limit.
+    assert rl.observe("example.org",FakeResponse(503),attempt=0) is None
+
+def test_observe_exhausted_window(clock):
+    rl = RateLimiter()
+    r = FakeResponse(403,{"X-RateLimit-Remaining":"0",
+                          "X-RateLimit-Reset":str(clock.now + 30)})
+    assert rl.observe("api.github.com",r) == pytest.approx(30.0)
+    assert rl.acquire("api.github.com") == pytest.approx(30.0)
+
+def test_max_wait(clock):
+    rl = RateLimiter(max_wait=10.0)
+    r = FakeResponse(403,{"X-RateLimit-Remaining":"0",
+                          "X-RateLimit-Reset":str(clock.now + 3600)})
+    # Not retried, and the host is not blocked past max_wait.
+    assert rl.observe("api.github.com",r) is None
+    assert rl.acquire("api.github.com") == 0.0
+    assert rl.observe("example.org",
+                      FakeResponse(429,{"Retry-After":"60"})) is None
+    assert rl.acquire("example.org") == 0.0
+
+def test_acquire_fails_fast_beyond_max_wait(clock):
+    rl = RateLimiter(host_rates={"example.org":(0.01,1)},max_wait=10.0)
+    assert rl.acquire("example.org") == 0.0
+    with pytest.raises(RateLimitedError) as e:
+        rl.acquire("example.org")
+    assert e.value.retry_after == pytest.approx(100.0)
+    assert clock.slept == []
+    assert rl.stats()["example.org"]["rejected"] == 1
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import http.server
+
+import pytest
+import requests
+
+from searcch.importer.util.retrieve import Retriever
+
+CONTENT = bytes(range(256)) * 64
+ETAG = '"v1"'
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Serves CONTENT with an ETag, honoring Range and If-Range like a real server; records each request's headers.  If the server's `truncate` count is set, that many responses are cut off halfway."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        (start,status) = (0,200)
+        rng = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if rng and (if_range is None or if_range == ETAG):
+            start = int(rng.split("=")[1].split("-")[0])
+            status = 206
+        body = CONTENT[start:]
+        self.send_response(status)
+        self.send_header("ETag",ETAG)
+        self.send_header("Content-Length",str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range","bytes %d-%d/%d" % (
+                start,len(CONTENT) - 1,len(CONTENT)))
+        self.end_headers()
+        if self.server.truncate:
+            self.server.truncate -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self,*args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1",0),StubHandler)
+    httpd.requests = []
+    httpd.truncate = 0
+    t = threading.Thread(target=httpd.serve_forever,daemon=True)
+    t.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def _download(config,server,partial):
+    url = "http://127.0.0.1:%d/file" % (server.server_address[1],)
+    return Retriever(config)._download_stream(requests.Session(),url,partial)
+
+def _check(result,partial):
+    (headers,size,digest) = result
+    assert size == len(CONTENT)
+    assert digest == hashlib.sha256(CONTENT).hexdigest()
+    with open(partial,"rb") as f:
+        assert f.read() == CONTENT
+
+def test_download_records_validator(config,server,tmp_path):
+    partial = str(tmp_path / "raw.partial")
+    _check(_download(config,server,partial),partial)
+    assert not "Range" in server.requests[0]
+    with open(partial + ".validator") as f:
+        assert f.read() == ETAG
+
+def test_resume_with_stored_validator(config,server,tmp_path):
+    partial = str(tmp_path / "raw.partial")
+    with open(partial,"wb") as f:
+        f.write(CONTENT[:1000])
+    with open(partial + ".validator","w") as f:
+        f.write(ETAG)
+    _check(_download(config,server,partial),partial)
+    assert len(server.requests) == 1
+    assert server.requests[0]["Range"] == "bytes=1000-"
+    assert server.requests[0]["If-Range"] == ETAG
+
+def test_resume_of_changed_resource_restarts(config,server,tmp_path):
+    partial = str(tmp_path / "raw.partial")
+    with open(partial,"wb") as f:
+        f.write(b"x" * 1000)
+    with open(partial + ".validator","w") as f:
+        f.write('"v0"')
+    _check(_download(config,server,partial),partial)
+    assert server.requests[0]["If-Range"] == '"v0"'
+
+def test_partial_without_validator_is_discarded(config,server,tmp_path):
+    partial = str(tmp_path / "raw.partial")
+    with open(partial,"wb") as f:
+        f.write(b"x" * 1000)
+    _check(_download(config,server,partial),partial)
+    assert len(server.requests) == 1
+    assert not "Range" in server.requests[0]
+    assert not "If-Range" in server.requests[0]
+
+def test_resume_after_dropped_connection(config,server,tmp_path,monkeypatch):
+    config["retrieve"]["download_retries"] = "1"
+    config["retrieve"]["chunk_size"] = "4096"
+    monkeypatch.setattr(Retriever,"_retry_delay",lambda *args: None)
+    server.truncate = 1
+    partial = str(tmp_path / "raw.partial")
+    _check(_download(config,server,partial),partial)
+    assert len(server.requests) == 2
+    assert not "Range" in server.requests[0]
+    assert server.requests[1]["Range"] == "bytes=%d-" % (len(CONTENT) // 2,)
+    assert server.requests[1]["If-Range"] == ETAG